@@ -1,10 +1,14 @@
-async function loadUsers() {
+let nextCursor = null;
+
+async function loadUsers(cursor = null) {
   try {
-    const response = await fetch(window.USERS_API);
+    const url = new URL(window.USERS_API, window.location.origin);
+    if (cursor) url.searchParams.set('cursor', cursor);
+    const response = await fetch(url);
     if (!response.ok) throw new Error('Network response was not ok');
-    const { users } = await response.json();
+    const { users, next_cursor } = await response.json();
     const tbody = document.querySelector('#usersTable tbody');
-    tbody.innerHTML = '';
+    if (!cursor) tbody.innerHTML = '';
     users.forEach(u => {
       const row = document.createElement('tr');
       row.innerHTML = `
@@ -17,9 +21,14 @@ async function loadUsers() {
         </td>`;
       tbody.appendChild(row);
     });
+    nextCursor = next_cursor;
+    document.getElementById('loadMoreUsers').hidden = !nextCursor;
   } catch (error) {
     console.error('Error loading users:', error);
   }
 }
 
-document.addEventListener('DOMContentLoaded', loadUsers);
\ No newline at end of file
+document.addEventListener('DOMContentLoaded', () => {
+  document.getElementById('loadMoreUsers').addEventListener('click', () => loadUsers(nextCursor));
+  loadUsers();
+});
\ No newline at end of file
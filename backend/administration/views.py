@@ -6,6 +6,7 @@ from django.views.decorators.csrf import csrf_exempt , csrf_protect
 import random
 from django.views.decorators.http import require_http_methods
 from lets_go.models import UsersData
+from lets_go.utils.pagination import paginate_keyset, PaginationError
 import base64
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.hashers import make_password
@@ -87,10 +88,20 @@ def user_list_view(request):
     return render(request, 'administration/users_list.html')
 # AJAX API: list users
 def api_users(request):
-    qs = UsersData.objects.all().values(
-        'id','name','email','status','driver_rating','passenger_rating','created_at'
-    )
-    return JsonResponse({'users': list(qs)})
+    fields = ['id','name','email','status','driver_rating','passenger_rating','created_at']
+    try:
+        users, next_cursor = paginate_keyset(
+            UsersData.objects.only(*fields),
+            ['created_at', 'pk'],
+            cursor=request.GET.get('cursor'),
+            limit=request.GET.get('limit'),
+        )
+    except PaginationError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'users': [{f: getattr(u, f) for f in fields} for u in users],
+        'next_cursor': next_cursor,
+    })
 # 2) Detail page
 def user_detail_view(request, user_id):
     # api_user_detail(request, user_id)
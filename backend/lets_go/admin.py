@@ -1,3 +1,27 @@
 from django.contrib import admin
+from django.core.exceptions import ValidationError
+
+from .models import PricingRuleSet
 
 # Register your models here.
+
+
+@admin.register(PricingRuleSet)
+class PricingRuleSetAdmin(admin.ModelAdmin):
+    list_display = ('version', 'name', 'is_active', 'published_at', 'created_at')
+    list_filter = ('is_active',)
+    readonly_fields = ('is_active', 'published_at', 'created_at')
+    actions = ['publish_rule_set']
+
+    @admin.action(description='Publish selected rule set')
+    def publish_rule_set(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, 'Select exactly one rule set to publish.', level='error')
+            return
+        rule_set = queryset.get()
+        try:
+            rule_set.publish()
+        except ValidationError as e:
+            self.message_user(request, f'Could not publish v{rule_set.version}: {e}', level='error')
+            return
+        self.message_user(request, f'Published pricing rules v{rule_set.version}.')
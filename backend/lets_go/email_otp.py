@@ -91,3 +91,49 @@ def send_email_otp_for_reset(recipient_email: str, otp_code: str) -> bool:
     except Exception as e:
         logger.error(f"Failed to send reset OTP email. Error: {e}")
         return False
+
+
+def send_bulk_emails(messages) -> int:
+    """
+    Sends several plain-text emails over a single SMTP connection.
+
+    A recipient refused by the server is logged and skipped, since sending
+    again would fail the same way. Any other failure (server unreachable,
+    login refused, connection dropped) is raised so the caller can retry.
+
+    Args:
+        messages: Iterable of (recipient_email, subject, body) tuples.
+
+    Returns:
+        int: Number of emails accepted by the server.
+
+    Raises:
+        OSError: If the SMTP server cannot be reached or the session fails
+            (smtplib.SMTPException is a subclass).
+    """
+    messages = [item for item in messages if item[0]]
+    if not messages:
+        return 0
+
+    sent = 0
+    try:
+        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+            server.starttls()
+            server.login(SENDER_EMAIL, SENDER_PASSWORD)
+            for recipient_email, subject, body in messages:
+                message = MIMEMultipart()
+                message["From"] = SENDER_EMAIL
+                message["To"] = recipient_email
+                message["Subject"] = subject
+                message.attach(MIMEText(body, "plain"))
+                try:
+                    server.send_message(message)
+                    sent += 1
+                except smtplib.SMTPRecipientsRefused as e:
+                    logger.error(f"Failed to send email to {recipient_email}. Error: {e}")
+    except OSError as e:
+        logger.error(f"Failed to send bulk emails after {sent} of {len(messages)}. Error: {e}")
+        raise
+
+    logger.info(f"Sent {sent} of {len(messages)} emails")
+    return sent
@@ -0,0 +1,18 @@
+"""
+Move trips to IN_PROGRESS and COMPLETED as their departure time passes
+"""
+from django.core.management.base import BaseCommand
+
+from lets_go.services.trip_lifecycle import advance_trip_lifecycle, DEFAULT_LIFECYCLE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Start and complete trips that are due (run periodically, e.g. every minute from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_LIFECYCLE_BATCH_SIZE,
+                            help='Trips updated per transaction')
+
+    def handle(self, *args, **options):
+        started, completed = advance_trip_lifecycle(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Started {started} trips, completed {completed} trips'))
@@ -0,0 +1,28 @@
+"""
+Apply pending chat and email side effects recorded in the outbox
+"""
+from django.core.management.base import BaseCommand
+
+from lets_go.services.outbox import drain_outbox, purge_processed_events, DEFAULT_OUTBOX_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Apply pending outbox events in batches until none are left (run frequently, e.g. every few seconds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_OUTBOX_BATCH_SIZE,
+                            help='Events applied per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        applied = failed = 0
+        while True:
+            done, errors = drain_outbox(batch_size)
+            applied += done
+            failed += errors
+            if done + errors < batch_size:
+                break
+        purged = purge_processed_events()
+        self.stdout.write(self.style.SUCCESS(
+            f'Applied {applied} outbox events ({failed} failed), purged {purged} old events'
+        ))
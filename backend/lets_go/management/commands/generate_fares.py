@@ -0,0 +1,56 @@
+"""
+Regenerate FareMatrix rows for routes from their stop geometry
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from lets_go.models import Route
+from lets_go.utils.fare_generator import (
+    compute_segment_fares,
+    current_segment_rules,
+    load_route_stops,
+    save_segment_fares,
+    stop_cumulative_km,
+)
+
+
+def _price_route(job):
+    """Worker: pure arithmetic on (route_id, stops, rules); no database access"""
+    route_id, stops, rules = job
+    return route_id, compute_segment_fares(stop_cumulative_km(stops), rules)
+
+
+class Command(BaseCommand):
+    help = 'Generate fares for every stop pair of each route from its stop distances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('route_ids', nargs='*', help='Route codes (e.g. R001); all active routes if omitted')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, default=200, help='Routes loaded per stops query')
+
+    def handle(self, *args, **options):
+        routes = Route.objects.filter(is_active=True)
+        if options['route_ids']:
+            routes = Route.objects.filter(route_id__in=options['route_ids'])
+        route_pks = list(routes.order_by('pk').values_list('pk', flat=True))
+
+        # Resolve the published rules once so every route in the run uses the same version
+        rules = current_segment_rules()
+        total_rows = 0
+        batch_size = options['batch_size']
+        # Workers only compute; the parent process owns the database connection and writes
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for offset in range(0, len(route_pks), batch_size):
+                stops_by_route = load_route_stops(route_pks[offset:offset + batch_size])
+                jobs = [
+                    (route_id, [(pk, order, float(lat), float(lng)) if lat is not None and lng is not None
+                                else (pk, order, None, None) for pk, order, lat, lng in stops], rules)
+                    for route_id, stops in stops_by_route.items() if len(stops) >= 2
+                ]
+                for route_id, fares in pool.map(_price_route, jobs, chunksize=16):
+                    total_rows += save_segment_fares(route_id, stops_by_route[route_id], fares, rules['version'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {total_rows} fares for {len(route_pks)} routes (pricing rules v{rules["version"]})'
+        ))
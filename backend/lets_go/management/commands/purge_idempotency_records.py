@@ -0,0 +1,14 @@
+"""
+Delete idempotency records whose replay window has passed
+"""
+from django.core.management.base import BaseCommand
+
+from lets_go.utils.idempotency import purge_expired_records
+
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records (run periodically, e.g. hourly from cron)'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_records()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency records'))
@@ -0,0 +1,14 @@
+"""
+Return the seats of expired booking-request holds to sale
+"""
+from django.core.management.base import BaseCommand
+
+from lets_go.services.seat_holds import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Release seat holds whose TTL has passed (run periodically, e.g. every minute from cron)'
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired seat holds'))
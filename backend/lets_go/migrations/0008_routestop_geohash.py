@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    from lets_go.utils.geo import geohash_encode
+
+    RouteStop = apps.get_model('lets_go', 'RouteStop')
+    stops = RouteStop.objects.exclude(latitude=None).exclude(longitude=None)
+    for stop in stops.iterator():
+        stop.geohash = geohash_encode(float(stop.latitude), float(stop.longitude))
+        stop.save(update_fields=['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0007_alter_booking_booking_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routestop',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Geohash cell of the coordinates, kept in sync on save', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='routestop',
+            index=models.Index(fields=['latitude', 'longitude'], name='lets_go_rou_latitud_0b0226_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
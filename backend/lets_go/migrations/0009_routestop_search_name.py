@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+def backfill_search_name(apps, schema_editor):
+    from lets_go.utils.stop_search import normalize_stop_name
+
+    RouteStop = apps.get_model('lets_go', 'RouteStop')
+    for stop in RouteStop.objects.iterator():
+        stop.search_name = normalize_stop_name(stop.stop_name)
+        stop.save(update_fields=['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0008_routestop_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routestop',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Case- and diacritic-folded stop name used for search, kept in sync on save', max_length=100),
+        ),
+        migrations.RunPython(backfill_search_name, migrations.RunPython.noop),
+    ]
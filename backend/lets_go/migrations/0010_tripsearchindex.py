@@ -0,0 +1,88 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:36
+
+import django.db.models.deletion
+from datetime import datetime
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_trip_search_index(apps, schema_editor):
+    Trip = apps.get_model('lets_go', 'Trip')
+    RouteStop = apps.get_model('lets_go', 'RouteStop')
+    TripSearchIndex = apps.get_model('lets_go', 'TripSearchIndex')
+
+    endpoints = {}
+    for stop in RouteStop.objects.order_by('route_id', 'stop_order').iterator():
+        first, _ = endpoints.get(stop.route_id, (stop, stop))
+        endpoints[stop.route_id] = (first, stop)
+
+    rows = []
+    for trip in Trip.objects.select_related('route', 'driver', 'vehicle').iterator():
+        first, last = endpoints.get(trip.route_id, (None, None))
+        departure_at = datetime.combine(trip.trip_date, trip.departure_time)
+        if timezone.is_naive(departure_at):
+            departure_at = timezone.make_aware(departure_at)
+        rows.append(TripSearchIndex(
+            trip_id=trip.pk,
+            route_id=trip.route_id,
+            trip_code=trip.trip_id,
+            trip_status=trip.trip_status,
+            trip_date=trip.trip_date,
+            departure_time=trip.departure_time,
+            departure_at=departure_at,
+            origin_name=first.stop_name if first else trip.route.route_name,
+            destination_name=last.stop_name if last else trip.route.route_name,
+            origin_latitude=first.latitude if first else None,
+            origin_longitude=first.longitude if first else None,
+            destination_latitude=last.latitude if last else None,
+            destination_longitude=last.longitude if last else None,
+            driver_name=trip.driver.name,
+            vehicle_model=f"{trip.vehicle.company_name} {trip.vehicle.model_number}" if trip.vehicle else 'Unknown Vehicle',
+            total_seats=trip.total_seats,
+            available_seats=trip.available_seats,
+            price_per_seat=trip.base_fare,
+            gender_preference=trip.gender_preference,
+            is_negotiable=trip.is_negotiable,
+        ))
+    TripSearchIndex.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0009_routestop_search_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripSearchIndex',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='lets_go.trip')),
+                ('trip_code', models.CharField(help_text='Copy of Trip.trip_id', max_length=50)),
+                ('trip_status', models.CharField(max_length=20)),
+                ('trip_date', models.DateField()),
+                ('departure_time', models.TimeField()),
+                ('departure_at', models.DateTimeField(help_text='Trip date and departure time combined')),
+                ('origin_name', models.CharField(max_length=100)),
+                ('destination_name', models.CharField(max_length=100)),
+                ('origin_latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('origin_longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('destination_latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('destination_longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('driver_name', models.CharField(max_length=100)),
+                ('vehicle_model', models.CharField(max_length=101)),
+                ('total_seats', models.IntegerField()),
+                ('available_seats', models.IntegerField()),
+                ('price_per_seat', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('gender_preference', models.CharField(max_length=10)),
+                ('is_negotiable', models.BooleanField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trip_search_rows', to='lets_go.route')),
+            ],
+            options={
+                'ordering': ['trip_date', 'departure_time'],
+                'indexes': [models.Index(fields=['trip_status', 'trip_date', 'departure_time'], name='lets_go_tri_trip_st_27b0e7_idx'), models.Index(fields=['route', 'trip_status'], name='lets_go_tri_route_i_e72592_idx'), models.Index(fields=['departure_at'], name='lets_go_tri_departu_153972_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_trip_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0010_tripsearchindex'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['passenger', 'booked_at'], name='lets_go_boo_passeng_726279_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['driver', 'created_at'], name='lets_go_tri_driver__9fdb8f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersdata',
+            index=models.Index(fields=['created_at'], name='lets_go_use_created_903105_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0011_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='leg_occupancy',
+            field=models.JSONField(blank=True, default=list, help_text='Confirmed seats per leg between consecutive stops, maintained by services.seats'),
+        ),
+    ]
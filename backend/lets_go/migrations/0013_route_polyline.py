@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:42
+
+from django.db import migrations, models
+
+
+def backfill_route_polyline(apps, schema_editor):
+    from lets_go.utils.polyline import simplify_polyline, encode_polyline, polyline_bounds
+
+    # Existing routes have no road geometry; use straight lines between their stops
+    Route = apps.get_model('lets_go', 'Route')
+    for route in Route.objects.iterator():
+        points = [
+            (float(lat), float(lng))
+            for lat, lng in route.route_stops.order_by('stop_order').values_list('latitude', 'longitude')
+            if lat is not None and lng is not None
+        ]
+        points = simplify_polyline(points)
+        if len(points) < 2:
+            continue
+        route.polyline = encode_polyline(points)
+        route.bbox_min_lat, route.bbox_max_lat, route.bbox_min_lng, route.bbox_max_lng = polyline_bounds(points)
+        route.save(update_fields=['polyline', 'bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0012_trip_leg_occupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='bbox_max_lat',
+            field=models.FloatField(blank=True, help_text='Northern edge of the polyline bounding box', null=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='bbox_max_lng',
+            field=models.FloatField(blank=True, help_text='Eastern edge of the polyline bounding box', null=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='bbox_min_lat',
+            field=models.FloatField(blank=True, help_text='Southern edge of the polyline bounding box', null=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='bbox_min_lng',
+            field=models.FloatField(blank=True, help_text='Western edge of the polyline bounding box', null=True),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='polyline',
+            field=models.TextField(blank=True, default='', help_text='Simplified road geometry in encoded polyline format'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(fields=['bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng'], name='lets_go_rou_bbox_mi_42bcab_idx'),
+        ),
+        migrations.RunPython(backfill_route_polyline, migrations.RunPython.noop),
+    ]
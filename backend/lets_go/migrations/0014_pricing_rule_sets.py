@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0013_route_polyline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farematrix',
+            name='pricing_rule_version',
+            field=models.PositiveIntegerField(default=0, help_text='Pricing rule set version these fares were generated with (0 = built-in defaults)'),
+        ),
+        migrations.CreateModel(
+            name='PricingRuleSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(help_text='Monotonic rule set version recorded on every quote', unique=True)),
+                ('name', models.CharField(help_text="Short label like 'October fuel prices'", max_length=100)),
+                ('rules', models.JSONField(help_text='Rule tables; see utils.pricing_rules.DEFAULT_RULES for the layout')),
+                ('is_active', models.BooleanField(default=False, help_text='Whether this is the published rule set')),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-version'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='single_active_pricing_rule_set')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0014_pricing_rule_sets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='seat_version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on every seat change; services.seats uses it for compare-and-swap updates'),
+        ),
+    ]
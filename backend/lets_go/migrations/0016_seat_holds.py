@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:00
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0015_trip_seat_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trip',
+            name='leg_occupancy',
+            field=models.JSONField(blank=True, default=list, help_text='Confirmed and held seats per leg between consecutive stops, maintained by services.seats'),
+        ),
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_stop_order', models.PositiveIntegerField(help_text='Pickup stop order of the held legs')),
+                ('to_stop_order', models.PositiveIntegerField(help_text='Drop-off stop order of the held legs')),
+                ('number_of_seats', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('expires_at', models.DateTimeField(help_text='When the seats return to sale if not confirmed')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat_hold', to='lets_go.booking')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='lets_go.trip')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='lets_go_sea_expires_217535_idx'), models.Index(fields=['trip', 'expires_at'], name='lets_go_sea_trip_id_f9ce3b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:01
+
+import lets_go.utils.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0016_seat_holds'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_id',
+            field=models.CharField(default=lets_go.utils.ids.new_booking_id, help_text='Unique booking identifier; generated ones are time-sortable like B01JB8Q2X7M4Z9K3V6T0P5R1N8C', max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='route',
+            name='route_id',
+            field=models.CharField(default=lets_go.utils.ids.new_route_id, help_text='Unique route identifier; generated ones are time-sortable like R01JB8Q2X7M4Z9K3V6T0P5R1N8C', max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='trip_id',
+            field=models.CharField(default=lets_go.utils.ids.new_trip_id, help_text='Unique trip identifier; generated ones are time-sortable like T01JB8Q2X7M4Z9K3V6T0P5R1N8C', max_length=50, unique=True),
+        ),
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Client-supplied Idempotency-Key header', max_length=255)),
+                ('scope', models.CharField(help_text='Request path the key was used on', max_length=255)),
+                ('request_hash', models.CharField(help_text='SHA-256 of method, path and body of the first request', max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, help_text='Response status; null while the first request is still running', null=True)),
+                ('response_body', models.TextField(blank=True, default='')),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(help_text='When the key may be reused')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='lets_go_ide_expires_3413c2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key'), name='unique_idempotency_key_per_scope')],
+            },
+        ),
+    ]
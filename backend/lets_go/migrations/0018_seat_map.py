@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0017_idempotency_and_sortable_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seathold',
+            name='seat_numbers',
+            field=models.JSONField(default=list, help_text='Seat numbers held in Trip.seat_map'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='seat_map',
+            field=models.BinaryField(blank=True, default=b'', help_text='Taken seat numbers per leg as bitmasks, maintained by services.seats'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='seat_numbers',
+            field=models.JSONField(default=list, help_text='Array of seat numbers booked; assigned from Trip.seat_map when the seats are reserved'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='seatassignment',
+            unique_together={('booking', 'seat_number')},
+        ),
+    ]
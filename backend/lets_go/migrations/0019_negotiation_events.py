@@ -0,0 +1,113 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_bargaining_history(apps, schema_editor):
+    """Turn each Trip.bargaining_history entry into a NegotiationEvent row"""
+    from datetime import datetime
+    from decimal import Decimal
+    from django.utils import timezone
+
+    Trip = apps.get_model('lets_go', 'Trip')
+    Booking = apps.get_model('lets_go', 'Booking')
+    UsersData = apps.get_model('lets_go', 'UsersData')
+    NegotiationEvent = apps.get_model('lets_go', 'NegotiationEvent')
+
+    user_ids = set(UsersData.objects.values_list('id', flat=True))
+    events = []
+    for trip in Trip.objects.only('id', 'created_at', 'bargaining_history').iterator():
+        if not trip.bargaining_history:
+            continue
+        offers = {}
+        for booking_id, passenger_id, offer in Booking.objects.filter(trip_id=trip.id).order_by('booked_at').values_list(
+            'id', 'passenger_id', 'passenger_offer'
+        ):
+            offers[(passenger_id, offer)] = booking_id
+        for entry in trip.bargaining_history:
+            try:
+                created_at = datetime.fromisoformat(entry.get('timestamp'))
+            except (TypeError, ValueError):
+                created_at = trip.created_at
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+            passenger_id = entry.get('passenger_id')
+            try:
+                passenger_id = int(passenger_id)
+            except (TypeError, ValueError):
+                passenger_id = None
+            proposed = entry.get('proposed_fare')
+            proposed = Decimal(str(proposed)).quantize(Decimal('0.01')) if proposed is not None else None
+            original = entry.get('original_fare')
+            original = Decimal(str(original)).quantize(Decimal('0.01')) if original is not None else None
+            events.append(NegotiationEvent(
+                trip_id=trip.id,
+                booking_id=offers.get((passenger_id, proposed)),
+                actor_id=passenger_id if passenger_id in user_ids else None,
+                actor_name=(entry.get('passenger_name') or '')[:100],
+                event_type='OFFER',
+                original_fare=original,
+                proposed_fare=proposed,
+                status=entry.get('status') or 'PENDING',
+                created_at=created_at,
+            ))
+        if len(events) >= 1000:
+            NegotiationEvent.objects.bulk_create(events)
+            events = []
+    NegotiationEvent.objects.bulk_create(events)
+
+
+def restore_bargaining_history(apps, schema_editor):
+    """Rebuild Trip.bargaining_history from the passenger offers"""
+    Trip = apps.get_model('lets_go', 'Trip')
+    NegotiationEvent = apps.get_model('lets_go', 'NegotiationEvent')
+
+    history = {}
+    for event in NegotiationEvent.objects.filter(event_type='OFFER').order_by('trip_id', 'created_at', 'pk').iterator():
+        history.setdefault(event.trip_id, []).append({
+            'timestamp': event.created_at.isoformat(),
+            'passenger_id': event.actor_id,
+            'passenger_name': event.actor_name,
+            'original_fare': float(event.original_fare) if event.original_fare is not None else None,
+            'proposed_fare': float(event.proposed_fare) if event.proposed_fare is not None else None,
+            'status': event.status,
+        })
+    for trip_id, entries in history.items():
+        Trip.objects.filter(pk=trip_id).update(bargaining_history=entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0018_seat_map'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NegotiationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor_name', models.CharField(blank=True, default='', help_text='Actor name when the event was recorded', max_length=100)),
+                ('event_type', models.CharField(choices=[('OFFER', 'Passenger Offer'), ('COUNTER_OFFER', 'Driver Counter Offer'), ('ACCEPTED', 'Accepted by Driver'), ('REJECTED', 'Rejected by Driver')], max_length=20)),
+                ('original_fare', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('proposed_fare', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('status', models.CharField(default='PENDING', help_text='Bargaining status after this step', max_length=20)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, help_text='Passenger or driver who made this step', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='negotiation_events', to='lets_go.usersdata')),
+                ('booking', models.ForeignKey(blank=True, help_text='Booking request negotiated; empty for entries migrated without one', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='negotiation_events', to='lets_go.booking')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='negotiation_events', to='lets_go.trip')),
+            ],
+            options={
+                'ordering': ['created_at', 'pk'],
+                'indexes': [models.Index(fields=['trip', 'created_at'], name='lets_go_neg_trip_id_03c475_idx'), models.Index(fields=['trip', 'booking', 'created_at'], name='lets_go_neg_trip_id_c26ff0_idx')],
+            },
+        ),
+        migrations.RunPython(copy_bargaining_history, restore_bargaining_history),
+        migrations.RemoveField(
+            model_name='trip',
+            name='bargaining_history',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:12
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0019_negotiation_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number_of_seats', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('total_fare', models.DecimalField(decimal_places=2, help_text='Fare quoted when joining', max_digits=10)),
+                ('status', models.CharField(choices=[('WAITING', 'Waiting'), ('PROMOTED', 'Promoted'), ('LEFT', 'Left')], default='WAITING', max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.OneToOneField(blank=True, help_text='Pending booking created on promotion', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='lets_go.booking')),
+                ('from_stop', models.ForeignKey(help_text='Pickup stop', on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_from', to='lets_go.routestop')),
+                ('passenger', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='lets_go.usersdata')),
+                ('to_stop', models.ForeignKey(help_text='Drop-off stop', on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_to', to='lets_go.routestop')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='lets_go.trip')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['trip', 'status', 'created_at', 'id'], name='waitlist_fifo_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'WAITING')), fields=('trip', 'passenger'), name='one_waiting_entry_per_passenger')],
+            },
+        ),
+    ]
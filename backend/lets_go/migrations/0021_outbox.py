@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0020_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('MEMBER_JOINED', 'Member joined chat'), ('MEMBER_LEFT', 'Member left chat'), ('SYSTEM_MESSAGE', 'System message'), ('CHAT_ARCHIVED', 'Chat archived'), ('EMAIL', 'Email')], max_length=20)),
+                ('payload', models.JSONField(default=dict, help_text='Event data, e.g. user_id and message')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, help_text='When the side effect was applied', null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_events', to='lets_go.trip')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='outbox_pending_idx'), models.Index(fields=['processed_at'], name='lets_go_out_process_2bee69_idx')],
+            },
+        ),
+    ]
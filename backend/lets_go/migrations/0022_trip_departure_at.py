@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+def fill_departure_at(apps, schema_editor):
+    """Combine trip_date and departure_time of existing trips"""
+    from lets_go.services.search_index import departure_datetime
+
+    Trip = apps.get_model('lets_go', 'Trip')
+    trips = []
+    for trip in Trip.objects.only('id', 'trip_date', 'departure_time').iterator():
+        trip.departure_at = departure_datetime(trip.trip_date, trip.departure_time)
+        trips.append(trip)
+        if len(trips) >= 1000:
+            Trip.objects.bulk_update(trips, ['departure_at'])
+            trips = []
+    Trip.objects.bulk_update(trips, ['departure_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0021_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='departure_at',
+            field=models.DateTimeField(editable=False, null=True, help_text='trip_date and departure_time combined; drives the lifecycle scheduler'),
+        ),
+        migrations.RunPython(fill_departure_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='trip',
+            name='departure_at',
+            field=models.DateTimeField(editable=False, help_text='trip_date and departure_time combined; drives the lifecycle scheduler'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['trip_status', 'departure_at'], name='lets_go_tri_trip_st_4f7644_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0022_trip_departure_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='fare_version',
+            field=models.PositiveIntegerField(default=0, help_text="Bumped whenever the route's fares or stops change; tags cached fare matrices"),
+        ),
+    ]
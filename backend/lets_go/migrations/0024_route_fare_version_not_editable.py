@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0023_route_fare_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='route',
+            name='fare_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Bumped whenever the route's fares or stops change; tags cached fare matrices"),
+        ),
+    ]
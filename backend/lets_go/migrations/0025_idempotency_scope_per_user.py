@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0024_route_fare_version_not_editable'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='idempotencyrecord',
+            name='scope',
+            field=models.CharField(help_text='Request path and calling user the key was used by', max_length=255),
+        ),
+    ]
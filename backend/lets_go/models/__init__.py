@@ -2,6 +2,11 @@ from .models_userdata import UsersData
 from .models_vehicle import Vehicle
 from .models_route import Route, RouteStop, FareMatrix
 from .models_trip import Trip, TripVehicleHistory, TripStopBreakdown
-from .models_booking import Booking, SeatAssignment
+from .models_booking import Booking, SeatAssignment, SeatHold, WaitlistEntry
 from .models_chat import TripChatGroup, ChatGroupMember, ChatMessage, MessageReadStatus
-from .models_payment import TripPayment, PaymentRefund
\ No newline at end of file
+from .models_payment import TripPayment, PaymentRefund
+from .models_search import TripSearchIndex
+from .models_pricing import PricingRuleSet
+from .models_idempotency import IdempotencyRecord
+from .models_negotiation import NegotiationEvent
+from .models_outbox import OutboxEvent
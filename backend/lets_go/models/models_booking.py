@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from ..services.seats import reserve_segment, release_segment, segment_free_seats, sync_seat_assignments
+from ..services.waitlist import promote_waitlist
+from ..services import outbox
+from ..utils.ids import new_booking_id
 
 class Booking(models.Model):
     """Model for passenger bookings with multiple seats"""
@@ -22,7 +26,8 @@ class Booking(models.Model):
     booking_id = models.CharField(
         max_length=50, 
         unique=True, 
-        help_text="Unique booking identifier like B001-2024-01-15-08:00-001"
+        default=new_booking_id,
+        help_text="Unique booking identifier; generated ones are time-sortable like B01JB8Q2X7M4Z9K3V6T0P5R1N8C"
     )
     trip = models.ForeignKey('Trip', on_delete=models.CASCADE, related_name='trip_bookings')
     passenger = models.ForeignKey('UsersData', on_delete=models.CASCADE, related_name='passenger_bookings')
@@ -49,7 +54,7 @@ class Booking(models.Model):
     )
     seat_numbers = models.JSONField(
         default=list,
-        help_text="Array of seat numbers booked"
+        help_text="Array of seat numbers booked; assigned from Trip.seat_map when the seats are reserved"
     )
     
     # Fare details
@@ -150,6 +155,7 @@ class Booking(models.Model):
             models.Index(fields=['booking_status']),
             models.Index(fields=['payment_status']),
             models.Index(fields=['booked_at']),
+            models.Index(fields=['passenger', 'booked_at']),
         ]
         ordering = ['-booked_at']
 
@@ -187,24 +193,28 @@ class Booking(models.Model):
         if self.from_stop.stop_order >= self.to_stop.stop_order:
             raise ValidationError('Pickup stop must come before drop-off stop.')
         
-        # Check if enough seats are available
-        if self.trip.available_seats < self.number_of_seats:
-            raise ValidationError(f'Only {self.trip.available_seats} seats available, but {self.number_of_seats} requested.')
+        # Check if enough seats are free on every leg between the two stops
+        free_seats = segment_free_seats(self.trip, self.from_stop.stop_order, self.to_stop.stop_order)
+        if free_seats < self.number_of_seats:
+            raise ValidationError(f'Only {free_seats} seats available, but {self.number_of_seats} requested.')
     
     def save(self, *args, **kwargs):
-        """Override save to update trip's available seats"""
-        if self.pk is None:  # New booking
-            # Only deduct seats if booking is confirmed, not for pending requests
-            if self.booking_status == 'CONFIRMED':
-                self.trip.available_seats -= self.number_of_seats
-                self.trip.save()
+        """Override save to occupy the booked legs of the trip"""
+        # Only occupy seats if booking is confirmed, not for pending requests
+        if self.pk is None and self.booking_status == 'CONFIRMED':  # New booking
+            # Seats and booking row commit together; SeatReservationError leaves neither behind
+            with transaction.atomic():
+                self.seat_numbers = reserve_segment(
+                    self.trip, self.from_stop.stop_order, self.to_stop.stop_order, self.number_of_seats,
+                    seat_numbers=self.seat_numbers or None,
+                )
+                super().save(*args, **kwargs)
+                sync_seat_assignments(self.trip)
                 
-                # Add passenger to chat group
-                try:
-                    self.trip.chat_group.add_member(self.passenger, 'PASSENGER')
-                    self.trip.chat_group.send_system_message(f"👋 {self.passenger.name} joined the trip!")
-                except:
-                    pass  # Chat group might not exist yet
+                # Add passenger to chat group (applied by drain_outbox)
+                outbox.enqueue(self.trip, outbox.MEMBER_JOINED, user_id=self.passenger_id, member_type='PASSENGER',
+                               message=f"👋 {self.passenger.name} joined the trip!")
+            return
         
         super().save(*args, **kwargs)
     
@@ -213,20 +223,30 @@ class Booking(models.Model):
         if not self.can_cancel:
             raise ValidationError('This booking cannot be cancelled.')
         
-        self.booking_status = 'CANCELLED'
-        self.cancelled_at = timezone.now()
-        self.save()
-        
-        # Update trip's available seats
-        self.trip.available_seats += self.number_of_seats
-        self.trip.save()
+        cancelled_at = timezone.now()
+        with transaction.atomic():
+            # Conditional update so concurrent cancels release the seats only once
+            cancelled = Booking.objects.filter(pk=self.pk, booking_status='CONFIRMED').update(
+                booking_status='CANCELLED',
+                cancelled_at=cancelled_at,
+                updated_at=cancelled_at,
+            )
+            if not cancelled:
+                raise ValidationError('This booking cannot be cancelled.')
+            
+            # Free the booked legs for other passengers
+            release_segment(self.trip, self.from_stop.stop_order, self.to_stop.stop_order, self.number_of_seats,
+                            seat_numbers=self.seat_numbers)
+            sync_seat_assignments(self.trip)
+            # Hand the freed seats to the waitlist before anyone else can take them
+            promote_waitlist(self.trip)
+            
+            # Remove from chat group (applied by drain_outbox)
+            outbox.enqueue(self.trip, outbox.MEMBER_LEFT, user_id=self.passenger_id,
+                           message=f"❌ {self.passenger.name} cancelled their booking")
         
-        # Remove from chat group
-        try:
-            self.trip.chat_group.remove_member(self.passenger)
-            self.trip.chat_group.send_system_message(f"❌ {self.passenger.name} cancelled their booking")
-        except:
-            pass
+        self.booking_status = 'CANCELLED'
+        self.cancelled_at = cancelled_at
     
     def complete_booking(self):
         """Mark booking as completed"""
@@ -290,7 +310,8 @@ class SeatAssignment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ['trip', 'seat_number']
+        # A seat is reused by riders on different legs, so seat numbers are unique per booking
+        unique_together = ['booking', 'seat_number']
         indexes = [
             models.Index(fields=['trip']),
             models.Index(fields=['booking']),
@@ -310,9 +331,14 @@ class SeatAssignment(models.Model):
         if self.seat_number > self.trip.total_seats:
             raise ValidationError({'seat_number': f'Seat number cannot exceed total seats ({self.trip.total_seats}).'})
         
-        # Check if seat is already assigned to another booking
+        # Check if seat is already assigned to another booking on an overlapping part of the route
         if self.pk is None:  # New assignment
-            if SeatAssignment.objects.filter(trip=self.trip, seat_number=self.seat_number).exists():
+            if SeatAssignment.objects.filter(
+                trip=self.trip,
+                seat_number=self.seat_number,
+                booking__from_stop__stop_order__lt=self.booking.to_stop.stop_order,
+                booking__to_stop__stop_order__gt=self.booking.from_stop.stop_order,
+            ).exclude(booking=self.booking).exists():
                 raise ValidationError({'seat_number': f'Seat {self.seat_number} is already assigned.'})
     
     def mark_as_occupied(self):
@@ -320,13 +346,12 @@ class SeatAssignment(models.Model):
         if not self.is_occupied:
             self.is_occupied = True
             self.occupied_at = timezone.now()
-            self.save()
-            
-            # Send notification to chat
-            try:
-                self.trip.chat_group.send_system_message(f"✅ {self.passenger_name} has boarded (Seat {self.seat_number})")
-            except:
-                pass
+            with transaction.atomic():
+                self.save()
+                
+                # Send notification to chat (applied by drain_outbox)
+                outbox.enqueue(self.trip, outbox.SYSTEM_MESSAGE,
+                               message=f"✅ {self.passenger_name} has boarded (Seat {self.seat_number})")
     
     def mark_as_unoccupied(self):
         """Mark seat as unoccupied"""
@@ -343,4 +368,76 @@ class SeatAssignment(models.Model):
             'phone': self.passenger_phone,
             'seat_number': self.seat_number,
             'is_occupied': self.is_occupied
-        } 
\ No newline at end of file
+        } 
+
+
+class SeatHold(models.Model):
+    """Seats held for a pending booking request until it is confirmed or the hold expires"""
+    trip = models.ForeignKey('Trip', on_delete=models.CASCADE, related_name='seat_holds')
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='seat_hold')
+    from_stop_order = models.PositiveIntegerField(help_text="Pickup stop order of the held legs")
+    to_stop_order = models.PositiveIntegerField(help_text="Drop-off stop order of the held legs")
+    number_of_seats = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    seat_numbers = models.JSONField(default=list, help_text="Seat numbers held in Trip.seat_map")
+    expires_at = models.DateTimeField(help_text="When the seats return to sale if not confirmed")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Sweeper and lazy release look up expired holds, globally or per trip
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['trip', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Hold {self.number_of_seats} seats on {self.trip_id} until {self.expires_at}"
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
+class WaitlistEntry(models.Model):
+    """Passenger waiting for seats on a trip; promoted to a held booking request in FIFO order"""
+    STATUS_CHOICES = [
+        ('WAITING', 'Waiting'),
+        ('PROMOTED', 'Promoted'),
+        ('LEFT', 'Left'),
+    ]
+
+    trip = models.ForeignKey('Trip', on_delete=models.CASCADE, related_name='waitlist_entries')
+    passenger = models.ForeignKey('UsersData', on_delete=models.CASCADE, related_name='waitlist_entries')
+    from_stop = models.ForeignKey('RouteStop', on_delete=models.CASCADE, related_name='waitlist_from',
+                                  help_text="Pickup stop")
+    to_stop = models.ForeignKey('RouteStop', on_delete=models.CASCADE, related_name='waitlist_to',
+                                help_text="Drop-off stop")
+    number_of_seats = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    total_fare = models.DecimalField(max_digits=10, decimal_places=2, help_text="Fare quoted when joining")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='WAITING')
+    booking = models.OneToOneField(
+        Booking,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='waitlist_entry',
+        help_text="Pending booking created on promotion"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Promotion scans a trip's waiting entries oldest first
+            models.Index(fields=['trip', 'status', 'created_at', 'id'], name='waitlist_fifo_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['trip', 'passenger'],
+                condition=models.Q(status='WAITING'),
+                name='one_waiting_entry_per_passenger',
+            ),
+        ]
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"{self.passenger.name} waiting for {self.number_of_seats} seats on {self.trip_id}"
@@ -0,0 +1,32 @@
+from django.db import models
+
+class IdempotencyRecord(models.Model):
+    """Outcome of a write request, replayed when a client retries with the same Idempotency-Key"""
+    key = models.CharField(max_length=255, help_text="Client-supplied Idempotency-Key header")
+    scope = models.CharField(max_length=255, help_text="Request path and calling user the key was used by")
+    request_hash = models.CharField(max_length=64, help_text="SHA-256 of method, path and body of the first request")
+    status_code = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        help_text="Response status; null while the first request is still running"
+    )
+    response_body = models.TextField(blank=True, default='')
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(help_text="When the key may be reused")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key_per_scope'),
+        ]
+        indexes = [
+            # Purge of expired records
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} [{self.key}] -> {self.status_code or 'in progress'}"
+
+    @property
+    def is_complete(self):
+        return self.status_code is not None
@@ -0,0 +1,54 @@
+from django.db import models
+from django.utils import timezone
+
+class NegotiationEvent(models.Model):
+    """One step of a fare negotiation on a trip (append-only; replaces Trip.bargaining_history)"""
+    EVENT_TYPE_CHOICES = [
+        ('OFFER', 'Passenger Offer'),
+        ('COUNTER_OFFER', 'Driver Counter Offer'),
+        ('ACCEPTED', 'Accepted by Driver'),
+        ('REJECTED', 'Rejected by Driver'),
+    ]
+    
+    trip = models.ForeignKey('Trip', on_delete=models.CASCADE, related_name='negotiation_events')
+    booking = models.ForeignKey(
+        'Booking',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='negotiation_events',
+        help_text="Booking request negotiated; empty for entries migrated without one"
+    )
+    actor = models.ForeignKey(
+        'UsersData',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='negotiation_events',
+        help_text="Passenger or driver who made this step"
+    )
+    actor_name = models.CharField(max_length=100, blank=True, default='', help_text="Actor name when the event was recorded")
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    original_fare = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    proposed_fare = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    status = models.CharField(max_length=20, default='PENDING', help_text="Bargaining status after this step")
+    note = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Trip history pages, newest first, optionally for one booking
+            models.Index(fields=['trip', 'created_at']),
+            models.Index(fields=['trip', 'booking', 'created_at']),
+        ]
+        ordering = ['created_at', 'pk']
+
+    def __str__(self):
+        return f"{self.event_type} on Trip {self.trip_id} at {self.created_at}"
+
+    def save(self, *args, **kwargs):
+        """Insert only; negotiation history is never rewritten"""
+        if not self._state.adding:
+            raise ValueError('NegotiationEvent rows are append-only')
+        super().save(*args, **kwargs)
+
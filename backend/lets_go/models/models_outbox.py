@@ -0,0 +1,30 @@
+from django.db import models
+
+class OutboxEvent(models.Model):
+    """Side effect of a booking or trip change, written in the same transaction and applied later by drain_outbox"""
+    EVENT_TYPE_CHOICES = [
+        ('MEMBER_JOINED', 'Member joined chat'),
+        ('MEMBER_LEFT', 'Member left chat'),
+        ('SYSTEM_MESSAGE', 'System message'),
+        ('CHAT_ARCHIVED', 'Chat archived'),
+        ('EMAIL', 'Email'),
+    ]
+
+    trip = models.ForeignKey('Trip', on_delete=models.CASCADE, related_name='outbox_events')
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    payload = models.JSONField(default=dict, help_text="Event data, e.g. user_id and message")
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True, help_text="When the side effect was applied")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The drain reads unprocessed events in insertion order
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='outbox_pending_idx'),
+            # Purge of old processed events
+            models.Index(fields=['processed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} for {self.trip_id} ({'done' if self.processed_at else 'pending'})"
@@ -0,0 +1,45 @@
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from ..utils.pricing_rules import compile_rules, mark_pricing_rules_changed
+
+class PricingRuleSet(models.Model):
+    """Versioned pricing parameters (fuel rates, multipliers, bands, discounts)"""
+    version = models.PositiveIntegerField(unique=True, help_text="Monotonic rule set version recorded on every quote")
+    name = models.CharField(max_length=100, help_text="Short label like 'October fuel prices'")
+    rules = models.JSONField(help_text="Rule tables; see utils.pricing_rules.DEFAULT_RULES for the layout")
+    is_active = models.BooleanField(default=False, help_text="Whether this is the published rule set")
+    notes = models.TextField(null=True, blank=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The partial unique index also serves the is_active=True lookup on every reload
+        constraints = [
+            models.UniqueConstraint(
+                fields=['is_active'],
+                condition=models.Q(is_active=True),
+                name='single_active_pricing_rule_set',
+            ),
+        ]
+        ordering = ['-version']
+
+    def __str__(self):
+        return f"Pricing rules v{self.version}: {self.name}"
+
+    def clean(self):
+        """Validate that the rule tables compile"""
+        try:
+            compile_rules(self.version or 0, self.rules)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValidationError({'rules': f'Invalid pricing rules: {e}'})
+
+    def publish(self):
+        """Make this the active rule set; workers switch within PRICING_RULES_CHECK_SECONDS"""
+        self.clean()
+        with transaction.atomic():
+            PricingRuleSet.objects.filter(is_active=True).exclude(pk=self.pk).update(is_active=False)
+            self.is_active = True
+            self.published_at = timezone.now()
+            self.save(update_fields=['is_active', 'published_at'])
+            transaction.on_commit(mark_pricing_rules_changed)
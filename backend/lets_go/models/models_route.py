@@ -1,10 +1,16 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from ..utils.geo import geohash_encode
+from ..utils.polyline import normalize_points, simplify_polyline, encode_polyline, polyline_bounds
+from ..utils.stop_search import normalize_stop_name, stop_name_index
+from ..utils.fare_cache import bump_fare_matrix_version
+from ..utils.ids import new_route_id
+from ..services.search_index import refresh_route_search_index
 
 class Route(models.Model):
     """Model for predefined bus/shuttle routes"""
-    route_id = models.CharField(max_length=50, unique=True, help_text="Unique route identifier like R001")
+    route_id = models.CharField(max_length=50, unique=True, default=new_route_id, help_text="Unique route identifier; generated ones are time-sortable like R01JB8Q2X7M4Z9K3V6T0P5R1N8C")
     route_name = models.CharField(max_length=100, help_text="Display name for the route")
     route_description = models.TextField(null=True, blank=True, help_text="Detailed description of the route")
     total_distance_km = models.DecimalField(
@@ -21,7 +27,17 @@ class Route(models.Model):
         validators=[MinValueValidator(1)],
         help_text="Estimated travel time in minutes"
     )
+    polyline = models.TextField(
+        blank=True,
+        default='',
+        help_text="Simplified road geometry in encoded polyline format"
+    )
+    bbox_min_lat = models.FloatField(null=True, blank=True, help_text="Southern edge of the polyline bounding box")
+    bbox_max_lat = models.FloatField(null=True, blank=True, help_text="Northern edge of the polyline bounding box")
+    bbox_min_lng = models.FloatField(null=True, blank=True, help_text="Western edge of the polyline bounding box")
+    bbox_max_lng = models.FloatField(null=True, blank=True, help_text="Eastern edge of the polyline bounding box")
     is_active = models.BooleanField(default=True, help_text="Whether this route is available for booking")
+    fare_version = models.PositiveIntegerField(default=0, editable=False, help_text="Bumped whenever the route's fares or stops change; tags cached fare matrices")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -30,6 +46,7 @@ class Route(models.Model):
             models.Index(fields=['route_id']),
             models.Index(fields=['is_active']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['bbox_min_lat', 'bbox_max_lat', 'bbox_min_lng', 'bbox_max_lng']),
         ]
         ordering = ['route_name']
 
@@ -51,6 +68,20 @@ class Route(models.Model):
         """Get last stop"""
         return self.stops.last()
     
+    def set_polyline(self, raw_points):
+        """
+        Store the road geometry of the route (simplified and encoded) with its bounding box
+        
+        Accepts [{'lat': .., 'lng': ..}, ...] or [[lat, lng], ...]; does not save.
+        """
+        points = simplify_polyline(normalize_points(raw_points))
+        if len(points) < 2:
+            self.polyline = ''
+            self.bbox_min_lat = self.bbox_max_lat = self.bbox_min_lng = self.bbox_max_lng = None
+            return
+        self.polyline = encode_polyline(points)
+        self.bbox_min_lat, self.bbox_max_lat, self.bbox_min_lng, self.bbox_max_lng = polyline_bounds(points)
+    
     def clean(self):
         """Validate route data"""
         if self.total_distance_km and self.total_distance_km <= 0:
@@ -58,11 +89,28 @@ class Route(models.Model):
         
         if self.estimated_duration_minutes and self.estimated_duration_minutes <= 0:
             raise ValidationError({'estimated_duration_minutes': 'Duration must be greater than 0.'})
+    
+    def save(self, *args, **kwargs):
+        """Override save so a stale instance cannot roll back fare_version"""
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # fare_version only moves through bump_fare_matrix_version's F() update
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'fare_version'
+            ]
+        super().save(*args, **kwargs)
 
 class RouteStop(models.Model):
     """Model for stops along a route"""
     route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='route_stops')
     stop_name = models.CharField(max_length=100, help_text="Name of the stop")
+    search_name = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        db_index=True,
+        help_text="Case- and diacritic-folded stop name used for search, kept in sync on save"
+    )
     stop_order = models.IntegerField(
         validators=[MinValueValidator(1)],
         help_text="Order of this stop in the route (1, 2, 3, ...)"
@@ -81,6 +129,13 @@ class RouteStop(models.Model):
         blank=True,
         help_text="GPS longitude coordinate"
     )
+    geohash = models.CharField(
+        max_length=12,
+        blank=True,
+        default='',
+        db_index=True,
+        help_text="Geohash cell of the coordinates, kept in sync on save"
+    )
     address = models.TextField(null=True, blank=True, help_text="Full address of the stop")
     estimated_time_from_start = models.IntegerField(
         null=True, 
@@ -97,6 +152,7 @@ class RouteStop(models.Model):
         indexes = [
             models.Index(fields=['route', 'stop_order']),
             models.Index(fields=['is_active']),
+            models.Index(fields=['latitude', 'longitude']),
         ]
         ordering = ['route', 'stop_order']
 
@@ -115,6 +171,30 @@ class RouteStop(models.Model):
         if self.pk is None:  # New instance
             if RouteStop.objects.filter(route=self.route, stop_order=self.stop_order).exists():
                 raise ValidationError({'stop_order': f'Stop order {self.stop_order} already exists for this route.'})
+    
+    def save(self, *args, **kwargs):
+        """Override save to keep the geohash cell and search name in sync"""
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geohash_encode(float(self.latitude), float(self.longitude))
+        else:
+            self.geohash = ''
+        self.search_name = normalize_stop_name(self.stop_name)
+        if 'update_fields' in kwargs and kwargs['update_fields'] is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'geohash', 'search_name'}
+        super().save(*args, **kwargs)
+        
+        stop_name_index.expire()
+        refresh_route_search_index(self.route_id)
+        bump_fare_matrix_version(self.route_id)
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to refresh search rows and cached fares of this route"""
+        route_id = self.route_id
+        result = super().delete(*args, **kwargs)
+        stop_name_index.expire()
+        refresh_route_search_index(route_id)
+        bump_fare_matrix_version(route_id)
+        return result
 
 class FareMatrix(models.Model):
     """Model for fare calculation between different stops"""
@@ -155,6 +235,10 @@ class FareMatrix(models.Model):
         validators=[MinValueValidator(0.01)],
         help_text="Fare during off-peak hours"
     )
+    pricing_rule_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Pricing rule set version these fares were generated with (0 = built-in defaults)"
+    )
     is_active = models.BooleanField(default=True, help_text="Whether this fare is active")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -185,6 +269,18 @@ class FareMatrix(models.Model):
         if self.base_fare <= 0 or self.peak_fare <= 0 or self.off_peak_fare <= 0:
             raise ValidationError('All fares must be greater than 0.')
     
+    def save(self, *args, **kwargs):
+        """Override save to invalidate the route's cached fare matrix"""
+        super().save(*args, **kwargs)
+        bump_fare_matrix_version(self.route_id)
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to invalidate the route's cached fare matrix"""
+        route_id = self.route_id
+        result = super().delete(*args, **kwargs)
+        bump_fare_matrix_version(route_id)
+        return result
+    
     def get_fare(self, is_peak_hour=False):
         """Get appropriate fare based on time"""
         if is_peak_hour:
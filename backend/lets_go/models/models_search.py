@@ -0,0 +1,50 @@
+from django.db import models
+
+class TripSearchIndex(models.Model):
+    """Denormalized read model of trips for the search endpoints"""
+    trip = models.OneToOneField(
+        'Trip',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_index'
+    )
+    route = models.ForeignKey('Route', on_delete=models.CASCADE, related_name='trip_search_rows')
+    trip_code = models.CharField(max_length=50, help_text="Copy of Trip.trip_id")
+    trip_status = models.CharField(max_length=20)
+    
+    # Timing
+    trip_date = models.DateField()
+    departure_time = models.TimeField()
+    departure_at = models.DateTimeField(help_text="Trip date and departure time combined")
+    
+    # Route endpoints
+    origin_name = models.CharField(max_length=100)
+    destination_name = models.CharField(max_length=100)
+    origin_latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
+    origin_longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    destination_latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
+    destination_longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    
+    # Driver and vehicle display data
+    driver_name = models.CharField(max_length=100)
+    vehicle_model = models.CharField(max_length=101)
+    
+    # Capacity and pricing
+    total_seats = models.IntegerField()
+    available_seats = models.IntegerField()
+    price_per_seat = models.DecimalField(max_digits=10, decimal_places=2)
+    gender_preference = models.CharField(max_length=10)
+    is_negotiable = models.BooleanField()
+    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trip_status', 'trip_date', 'departure_time']),
+            models.Index(fields=['route', 'trip_status']),
+            models.Index(fields=['departure_at']),
+        ]
+        ordering = ['trip_date', 'departure_time']
+
+    def __str__(self):
+        return f"Search row for Trip {self.trip_code}: {self.origin_name} → {self.destination_name}"
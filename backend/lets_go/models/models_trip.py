@@ -1,8 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import timedelta
+from ..services.search_index import refresh_trip_search_index, departure_datetime
+from ..services import outbox
+from ..services.seat_holds import release_trip_holds
+from ..services.waitlist import close_waitlists
+from ..utils.ids import new_trip_id
 
 class Trip(models.Model):
     """Model for individual bus/shuttle trips"""
@@ -16,7 +21,8 @@ class Trip(models.Model):
     trip_id = models.CharField(
         max_length=50, 
         unique=True, 
-        help_text="Unique trip identifier like T001-2024-01-15-08:00"
+        default=new_trip_id,
+        help_text="Unique trip identifier; generated ones are time-sortable like T01JB8Q2X7M4Z9K3V6T0P5R1N8C"
     )
     route = models.ForeignKey('Route', on_delete=models.CASCADE, related_name='trips')
     vehicle = models.ForeignKey('Vehicle', on_delete=models.SET_NULL, null=True, blank=True)
@@ -25,6 +31,10 @@ class Trip(models.Model):
     # Trip timing
     trip_date = models.DateField(help_text="Date of the trip")
     departure_time = models.TimeField(help_text="Scheduled departure time")
+    departure_at = models.DateTimeField(
+        editable=False,
+        help_text="trip_date and departure_time combined; drives the lifecycle scheduler"
+    )
     estimated_arrival_time = models.TimeField(help_text="Expected arrival time")
     actual_departure_time = models.TimeField(null=True, blank=True, help_text="Actual departure time")
     actual_arrival_time = models.TimeField(null=True, blank=True, help_text="Actual arrival time")
@@ -49,6 +59,20 @@ class Trip(models.Model):
         validators=[MinValueValidator(0.01)],
         help_text="Base fare for this trip"
     )
+    leg_occupancy = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Confirmed and held seats per leg between consecutive stops, maintained by services.seats"
+    )
+    seat_map = models.BinaryField(
+        default=b'',
+        blank=True,
+        help_text="Taken seat numbers per leg as bitmasks, maintained by services.seats"
+    )
+    seat_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Incremented on every seat change; services.seats uses it for compare-and-swap updates"
+    )
     
     # Enhanced fare calculation fields
     total_distance_km = models.DecimalField(
@@ -96,11 +120,6 @@ class Trip(models.Model):
         blank=True,
         help_text="Minimum fare driver is willing to accept"
     )
-    bargaining_history = models.JSONField(
-        default=list,
-        blank=True,
-        help_text="History of price negotiations for this trip"
-    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -114,8 +133,11 @@ class Trip(models.Model):
             models.Index(fields=['trip_date']),
             models.Index(fields=['departure_time']),
             models.Index(fields=['trip_status']),
+            # advance_trip_lifecycle picks due trips by status and departure
+            models.Index(fields=['trip_status', 'departure_at']),
             models.Index(fields=['route', 'trip_date']),
             models.Index(fields=['driver']),
+            models.Index(fields=['driver', 'created_at']),
             models.Index(fields=['vehicle']),
         ]
         ordering = ['trip_date', 'departure_time']
@@ -171,11 +193,26 @@ class Trip(models.Model):
             if self.departure_time >= self.estimated_arrival_time:
                 raise ValidationError('Departure time must be before estimated arrival time.')
     
+    # Columns owned by services.seats (compare-and-swap on seat_version)
+    SEAT_FIELDS = ('available_seats', 'leg_occupancy', 'seat_map', 'seat_version')
+    
     def save(self, *args, **kwargs):
-        """Override save to ensure available_seats doesn't exceed total_seats"""
+        """Override save to cap available_seats, keep departure_at in step and refresh the search index row"""
         if self.available_seats > self.total_seats:
             self.available_seats = self.total_seats
+        if self.trip_date and self.departure_time:
+            self.departure_at = departure_datetime(self.trip_date, self.departure_time)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'trip_date', 'departure_time'} & set(update_fields):
+            kwargs['update_fields'] = list(update_fields) + ['departure_at']
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # A full save of an instance loaded before a booking must not roll back its seat counts
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SEAT_FIELDS
+            ]
         super().save(*args, **kwargs)
+        refresh_trip_search_index([self.pk])
     
     def start_trip(self):
         """Start the trip"""
@@ -185,13 +222,11 @@ class Trip(models.Model):
         self.trip_status = 'IN_PROGRESS'
         self.actual_departure_time = timezone.now().time()
         self.started_at = timezone.now()
-        self.save()
-        
-        # Send system message to chat
-        try:
-            self.chat_group.send_system_message("🚌 Trip has started!")
-        except:
-            pass  # Chat group might not exist yet
+        with transaction.atomic():
+            self.save()
+            
+            # Send system message to chat (applied by drain_outbox)
+            outbox.enqueue(self, outbox.SYSTEM_MESSAGE, message="🚌 Trip has started!")
     
     def complete_trip(self):
         """Complete the trip"""
@@ -201,14 +236,11 @@ class Trip(models.Model):
         self.trip_status = 'COMPLETED'
         self.actual_arrival_time = timezone.now().time()
         self.completed_at = timezone.now()
-        self.save()
-        
-        # Archive chat group
-        try:
-            self.chat_group.archive()
-            self.chat_group.send_system_message("✅ Trip completed! This chat will be archived.")
-        except:
-            pass
+        with transaction.atomic():
+            self.save()
+            
+            # Archive chat group (applied by drain_outbox)
+            outbox.enqueue(self, outbox.CHAT_ARCHIVED, message="✅ Trip completed! This chat will be archived.")
     
     def cancel_trip(self, reason=None):
         """Cancel the trip"""
@@ -218,13 +250,15 @@ class Trip(models.Model):
         self.trip_status = 'CANCELLED'
         self.cancellation_reason = reason
         self.cancelled_at = timezone.now()
-        self.save()
-        
-        # Send cancellation message to chat
-        try:
-            self.chat_group.send_system_message(f"❌ Trip cancelled: {reason or 'No reason provided'}")
-        except:
-            pass
+        with transaction.atomic():
+            self.save()
+            
+            # Held seats and the waitlist end with the trip
+            release_trip_holds(self)
+            close_waitlists([self.pk])
+            
+            # Send cancellation message to chat (applied by drain_outbox)
+            outbox.enqueue(self, outbox.SYSTEM_MESSAGE, message=f"❌ Trip cancelled: {reason or 'No reason provided'}")
 
 class TripVehicleHistory(models.Model):
     """Model to preserve vehicle data even when vehicle is deleted"""
@@ -0,0 +1 @@
+# Services package for lets_go app 
@@ -0,0 +1,178 @@
+"""
+Driver decisions on pending booking requests, applied in bulk
+
+All decisions for a trip run in one transaction: the pending bookings and
+their seat holds are locked, every seat change is applied with a single
+compare-and-swap on the trip row (services.seats.apply_seat_changes), the
+bookings are written with one bulk update, settled offers are logged with
+one insert of negotiation events, and the chat side effects are written to
+the outbox (services.outbox) with one more insert. Approvals that no longer
+fit are left pending and reported per booking instead of failing the whole
+batch. Seats freed by rejections are offered to the trip's waitlist before
+the batch commits.
+"""
+from typing import Dict, List, Sequence
+
+from django.db import transaction
+from django.utils import timezone
+
+from .seats import SeatChange, apply_seat_changes, sync_seat_assignments
+from .waitlist import promote_waitlist
+from . import outbox
+
+APPROVE = 'approve'
+REJECT = 'reject'
+DECISIONS = (APPROVE, REJECT)
+
+# Largest number of decisions accepted in one request
+MAX_BOOKING_DECISIONS = 100
+
+# Bargaining states that a driver decision settles
+OPEN_BARGAINING_STATUSES = ('PENDING', 'COUNTER_OFFER')
+
+
+def respond_to_booking_requests(trip, decisions: Sequence[Dict]) -> List[Dict]:
+    """
+    Approve or reject pending bookings of a trip
+
+    Rejections are applied before approvals, so seats they free can be
+    given to approvals in the same batch; approvals are then served in the
+    order given. An approval whose hold is still live keeps the held seats.
+
+    Args:
+        trip: Trip the bookings belong to; its seat fields are updated in place
+        decisions: [{'booking_id': ..., 'decision': 'approve' | 'reject', 'note': optional driver response}]
+
+    Returns:
+        One outcome per decision, in request order, with 'status' one of
+        confirmed, rejected, no_seats, not_pending, not_found or invalid_decision
+    """
+    from ..models import Booking, NegotiationEvent, SeatHold
+
+    now = timezone.now()
+    outcomes = [{'booking_id': item.get('booking_id'), 'decision': item.get('decision')} for item in decisions]
+    booking_ids = [outcome['booking_id'] for outcome in outcomes]
+
+    with transaction.atomic():
+        # Locked rows: a concurrent confirm, cancel or hold sweep waits for this batch
+        bookings = {
+            booking.booking_id: booking
+            for booking in Booking.objects.select_for_update(of=('self',)).filter(
+                trip=trip, booking_id__in=booking_ids
+            ).select_related('from_stop', 'to_stop', 'passenger')
+        }
+        holds = {
+            hold.booking_id: hold
+            for hold in SeatHold.objects.select_for_update().filter(
+                booking__in=[booking for booking in bookings.values() if booking.booking_status == 'PENDING']
+            )
+        }
+
+        seen = set()
+        rejected, approved = [], []
+        for outcome, item in zip(outcomes, decisions):
+            booking = bookings.get(outcome['booking_id'])
+            if outcome['decision'] not in DECISIONS:
+                outcome['status'] = 'invalid_decision'
+            elif booking is None:
+                outcome['status'] = 'not_found'
+            elif booking.booking_status != 'PENDING' or booking.pk in seen:
+                outcome['status'] = 'not_pending'
+            else:
+                seen.add(booking.pk)
+                booking.driver_response = item.get('note') or booking.driver_response
+                (approved if outcome['decision'] == APPROVE else rejected).append((outcome, booking))
+
+        changes = []
+        released_holds = []
+        for outcome, booking in rejected:
+            hold = holds.get(booking.pk)
+            if hold is not None:
+                changes.append(SeatChange(hold.from_stop_order, hold.to_stop_order, -hold.number_of_seats,
+                                          hold.seat_numbers))
+                released_holds.append(hold.pk)
+        frees_seats = bool(changes)
+        reservations = []
+        for outcome, booking in approved:
+            hold = holds.get(booking.pk)
+            if hold is not None:
+                released_holds.append(hold.pk)
+                if hold.expires_at > now:
+                    outcome['seat_numbers'] = hold.seat_numbers
+                    continue
+                # The hold lapsed without being swept: free it and book again below
+                changes.append(SeatChange(hold.from_stop_order, hold.to_stop_order, -hold.number_of_seats,
+                                          hold.seat_numbers))
+            change = SeatChange(booking.from_stop.stop_order, booking.to_stop.stop_order, booking.number_of_seats)
+            changes.append(change)
+            reservations.append((outcome, change))
+        if changes:
+            apply_seat_changes(trip, changes, strict=False)
+        for outcome, change in reservations:
+            if change.error is None:
+                outcome['seat_numbers'] = change.result
+            else:
+                outcome['status'] = 'no_seats'
+                outcome['error'] = change.error.message
+                outcome['available_seats'] = change.error.available
+
+        decided = []
+        settled = []
+        for outcome, booking in approved:
+            if outcome.get('status') == 'no_seats':
+                continue
+            outcome['status'] = 'confirmed'
+            booking.booking_status = 'CONFIRMED'
+            booking.seat_numbers = outcome['seat_numbers']
+            if booking.bargaining_status in OPEN_BARGAINING_STATUSES:
+                booking.bargaining_status = 'ACCEPTED'
+                settled.append(booking)
+            decided.append(booking)
+        for outcome, booking in rejected:
+            outcome['status'] = 'rejected'
+            booking.booking_status = 'CANCELLED'
+            booking.cancelled_at = now
+            if booking.bargaining_status in OPEN_BARGAINING_STATUSES:
+                booking.bargaining_status = 'REJECTED'
+                settled.append(booking)
+            decided.append(booking)
+        for booking in decided:
+            booking.updated_at = now
+
+        if released_holds:
+            SeatHold.objects.filter(pk__in=released_holds).delete()
+        Booking.objects.bulk_update(decided, [
+            'booking_status', 'bargaining_status', 'seat_numbers', 'driver_response', 'cancelled_at', 'updated_at',
+        ])
+        sync_seat_assignments(trip)
+        if frees_seats:
+            # Seats given up by rejections go to the waitlist once approvals are served
+            promote_waitlist(trip)
+        if settled:
+            NegotiationEvent.objects.bulk_create([
+                NegotiationEvent(
+                    trip=trip,
+                    booking=booking,
+                    actor_id=trip.driver_id,
+                    actor_name=trip.driver.name,
+                    event_type=booking.bargaining_status,
+                    original_fare=booking.original_fare,
+                    proposed_fare=booking.passenger_offer,
+                    status=booking.bargaining_status,
+                    note=booking.driver_response,
+                    created_at=now,
+                )
+                for booking in settled
+            ])
+
+        # Chat membership and join messages for every confirmed passenger, in one insert
+        outbox.enqueue_many(trip, outbox.MEMBER_JOINED, [
+            {
+                'user_id': booking.passenger_id,
+                'member_type': 'PASSENGER',
+                'message': f"👋 {booking.passenger.name} joined the trip!",
+            }
+            for booking in decided if booking.booking_status == 'CONFIRMED'
+        ])
+
+    return outcomes
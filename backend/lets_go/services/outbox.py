@@ -0,0 +1,230 @@
+"""
+Transactional outbox for the chat and email side effects of bookings and trips
+
+Lifecycle methods (Booking.save/cancel_booking, Trip.start_trip/
+complete_trip/cancel_trip, SeatAssignment.mark_as_occupied, driver
+decisions, waitlist promotion and the trip lifecycle scheduler) no longer
+touch the trip chat or send mail themselves. They insert an OutboxEvent in
+the transaction that makes the change, so an event exists exactly when its
+change committed and the request pays for one small insert instead of the
+chat fan-out.
+
+drain_outbox (run by the drain_outbox management command) applies pending
+events in batches: missing chat groups are created with one insert,
+membership changes are applied with one update per chat group, all system
+messages of the batch are inserted at once and emails share one SMTP
+connection. Chat rows and the processed mark commit together. If a batch
+fails, its events are retried one by one so a bad event cannot hold up the
+rest; an event is given up after MAX_OUTBOX_ATTEMPTS failures. An SMTP
+outage fails the events it could not mail, so they are sent on a later run.
+"""
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, Sequence, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MEMBER_JOINED = 'MEMBER_JOINED'
+MEMBER_LEFT = 'MEMBER_LEFT'
+SYSTEM_MESSAGE = 'SYSTEM_MESSAGE'
+CHAT_ARCHIVED = 'CHAT_ARCHIVED'
+EMAIL = 'EMAIL'
+
+DEFAULT_OUTBOX_BATCH_SIZE = 500
+
+# Failures after which an event is left for inspection instead of retried
+MAX_OUTBOX_ATTEMPTS = 5
+
+# Processed events are kept this long (settings.OUTBOX_RETENTION_DAYS) for auditing
+DEFAULT_OUTBOX_RETENTION_DAYS = 7
+
+
+def enqueue(trip, event_type: str, **payload):
+    """
+    Record a side effect of a change to the trip
+
+    Call inside the transaction making the change.
+
+    Args:
+        trip: Trip the event belongs to
+        event_type: One of MEMBER_JOINED, MEMBER_LEFT, SYSTEM_MESSAGE, CHAT_ARCHIVED, EMAIL
+        **payload: user_id and member_type for membership events, message
+            for chat events, recipient/subject/body for EMAIL
+
+    Returns:
+        The OutboxEvent
+    """
+    from ..models import OutboxEvent
+
+    return OutboxEvent.objects.create(trip=trip, event_type=event_type, payload=payload)
+
+
+def enqueue_many(trip, event_type: str, payloads: Iterable[Dict]):
+    """Record several events of one type with a single insert"""
+    from ..models import OutboxEvent
+
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(trip=trip, event_type=event_type, payload=payload) for payload in payloads
+    ])
+
+
+def enqueue_for_trips(trip_ids: Iterable[int], event_type: str, **payload):
+    """Record the same event for several trips (by primary key) with a single insert"""
+    from ..models import OutboxEvent
+
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(trip_id=trip_id, event_type=event_type, payload=payload) for trip_id in trip_ids
+    ])
+
+
+def chat_groups_for_trips(trip_ids) -> Dict:
+    """Chat group of each trip by trip pk, creating the missing ones with one insert"""
+    from ..models import Trip, RouteStop, TripChatGroup
+
+    trip_ids = set(trip_ids)
+    groups = {group.trip_id: group for group in TripChatGroup.objects.filter(trip_id__in=trip_ids)}
+    missing = trip_ids - groups.keys()
+    if not missing:
+        return groups
+
+    trips = list(Trip.objects.filter(pk__in=missing).select_related('route'))
+    # First and last stop name of each route, from one ordered query
+    ends = {}
+    for route_id, stop_name in RouteStop.objects.filter(
+        route_id__in={trip.route_id for trip in trips}
+    ).order_by('route_id', 'stop_order').values_list('route_id', 'stop_name'):
+        ends.setdefault(route_id, [stop_name, stop_name])[1] = stop_name
+    TripChatGroup.objects.bulk_create([
+        TripChatGroup(
+            trip=trip,
+            group_name=f"Trip {trip.trip_id} - {trip.route.route_name}",
+            group_description="Group chat for trip from {} to {}".format(*ends.get(trip.route_id, [None, None])),
+            created_by_id=trip.driver_id,
+        )
+        for trip in trips
+    ], ignore_conflicts=True)
+    groups.update({group.trip_id: group for group in TripChatGroup.objects.filter(trip_id__in=missing)})
+    return groups
+
+
+def apply_outbox_events(events: Sequence) -> None:
+    """Apply events in order: chat membership, archiving and messages in bulk, then emails"""
+    from ..models import TripChatGroup, ChatGroupMember, ChatMessage
+
+    now = timezone.now()
+    groups = chat_groups_for_trips({event.trip_id for event in events if event.event_type != EMAIL})
+
+    # Last membership change per (group, user) wins; None means the user left
+    membership: Dict[int, Dict[int, str]] = {}
+    archived = set()
+    messages = []
+    emails = []
+    for event in events:
+        payload = event.payload
+        if event.event_type == EMAIL:
+            emails.append((payload['recipient'], payload['subject'], payload['body']))
+            continue
+        group = groups[event.trip_id]
+        if event.event_type == MEMBER_JOINED:
+            membership.setdefault(group.pk, {})[payload['user_id']] = payload.get('member_type', 'PASSENGER')
+        elif event.event_type == MEMBER_LEFT:
+            membership.setdefault(group.pk, {})[payload['user_id']] = None
+        elif event.event_type == CHAT_ARCHIVED:
+            archived.add(group.pk)
+        if payload.get('message'):
+            messages.append(ChatMessage(
+                chat_group=group,
+                sender_id=group.created_by_id,
+                message_type='SYSTEM',
+                message_text=payload['message'],
+                message_data={'is_system': True},
+            ))
+
+    for group_id, changes in membership.items():
+        joined = {user_id: member_type for user_id, member_type in changes.items() if member_type is not None}
+        left = [user_id for user_id, member_type in changes.items() if member_type is None]
+        if joined:
+            ChatGroupMember.objects.bulk_create([
+                ChatGroupMember(chat_group_id=group_id, user_id=user_id, member_type=member_type)
+                for user_id, member_type in joined.items()
+            ], ignore_conflicts=True)
+            # Passengers who left earlier and booked again
+            ChatGroupMember.objects.filter(chat_group_id=group_id, user_id__in=joined, is_active=False).update(
+                is_active=True, left_at=None
+            )
+        if left:
+            ChatGroupMember.objects.filter(chat_group_id=group_id, user_id__in=left, is_active=True).update(
+                is_active=False, left_at=now
+            )
+    if archived:
+        TripChatGroup.objects.filter(pk__in=archived).update(is_active=False, archived_at=now)
+    if messages:
+        ChatMessage.objects.bulk_create(messages)
+
+    if emails:
+        # Last, so a failed chat write above does not send the mail twice on retry.
+        # SMTP errors propagate and roll back the chat writes with the events.
+        from ..email_otp import send_bulk_emails
+        send_bulk_emails(emails)
+
+
+def drain_outbox(batch_size: int = DEFAULT_OUTBOX_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    Apply one batch of pending outbox events, oldest first
+
+    Events locked by a concurrent drain are skipped.
+
+    Args:
+        batch_size: Most events taken in this call
+
+    Returns:
+        (events applied, events that failed)
+    """
+    from ..models import OutboxEvent
+
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=MAX_OUTBOX_ATTEMPTS)
+            .order_by('pk')[:batch_size]
+        )
+        if not events:
+            return 0, 0
+
+        failed = 0
+        try:
+            with transaction.atomic():
+                apply_outbox_events(events)
+            done = events
+        except Exception:
+            logger.exception(f"Outbox batch of {len(events)} events failed; retrying one by one")
+            done = []
+            for event in events:
+                try:
+                    with transaction.atomic():
+                        apply_outbox_events([event])
+                    done.append(event)
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Outbox event {event.pk} ({event.event_type}) failed: {e}")
+                    OutboxEvent.objects.filter(pk=event.pk).update(attempts=F('attempts') + 1, last_error=str(e))
+
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in done]).update(
+            processed_at=timezone.now(), attempts=F('attempts') + 1
+        )
+    return len(done), failed
+
+
+def purge_processed_events(older_than: timedelta = None) -> int:
+    """Delete events processed more than the retention period ago; returns the number deleted"""
+    from django.conf import settings
+    from ..models import OutboxEvent
+
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'OUTBOX_RETENTION_DAYS', DEFAULT_OUTBOX_RETENTION_DAYS))
+    deleted, _ = OutboxEvent.objects.filter(processed_at__lte=timezone.now() - older_than).delete()
+    return deleted
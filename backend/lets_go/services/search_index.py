@@ -0,0 +1,119 @@
+"""
+Maintenance of the TripSearchIndex read model
+"""
+from datetime import datetime
+from typing import Iterable
+
+from django.utils import timezone
+
+
+def departure_datetime(trip_date, departure_time):
+    """Aware datetime of a trip's scheduled departure"""
+    departure = datetime.combine(trip_date, departure_time)
+    if timezone.is_naive(departure):
+        departure = timezone.make_aware(departure)
+    return departure
+
+
+def refresh_trip_search_index(trip_ids: Iterable[int]) -> int:
+    """
+    Rebuild the search rows for the given trip primary keys
+
+    Uses one query for the trips, one for their route endpoints and one upsert,
+    regardless of how many trips are refreshed.
+
+    Args:
+        trip_ids: Primary keys of trips whose search rows are stale
+
+    Returns:
+        Number of rows written
+    """
+    from ..models import Trip, RouteStop, TripSearchIndex
+
+    trip_ids = list(trip_ids)
+    if not trip_ids:
+        return 0
+
+    trips = list(
+        Trip.objects.filter(pk__in=trip_ids)
+        .select_related('route', 'driver', 'vehicle')
+        .only(
+            'id', 'trip_id', 'trip_status', 'trip_date', 'departure_time',
+            'total_seats', 'available_seats', 'base_fare', 'gender_preference', 'is_negotiable',
+            'route__id', 'route__route_name',
+            'driver__id', 'driver__name',
+            'vehicle__id', 'vehicle__company_name', 'vehicle__model_number',
+        )
+    )
+    if not trips:
+        return 0
+
+    # First and last stop of every route involved, in a single ordered query
+    endpoints = {}
+    stops = RouteStop.objects.filter(
+        route_id__in={trip.route_id for trip in trips}
+    ).order_by('route_id', 'stop_order').values('route_id', 'stop_name', 'latitude', 'longitude')
+    for stop in stops:
+        first, _ = endpoints.get(stop['route_id'], (stop, stop))
+        endpoints[stop['route_id']] = (first, stop)
+
+    rows = []
+    for trip in trips:
+        first, last = endpoints.get(trip.route_id, (None, None))
+        vehicle = trip.vehicle
+        rows.append(TripSearchIndex(
+            trip_id=trip.pk,
+            route_id=trip.route_id,
+            trip_code=trip.trip_id,
+            trip_status=trip.trip_status,
+            trip_date=trip.trip_date,
+            departure_time=trip.departure_time,
+            departure_at=departure_datetime(trip.trip_date, trip.departure_time),
+            origin_name=first['stop_name'] if first else trip.route.route_name,
+            destination_name=last['stop_name'] if last else trip.route.route_name,
+            origin_latitude=first['latitude'] if first else None,
+            origin_longitude=first['longitude'] if first else None,
+            destination_latitude=last['latitude'] if last else None,
+            destination_longitude=last['longitude'] if last else None,
+            driver_name=trip.driver.name,
+            vehicle_model=f"{vehicle.company_name} {vehicle.model_number}" if vehicle else 'Unknown Vehicle',
+            total_seats=trip.total_seats,
+            available_seats=trip.available_seats,
+            price_per_seat=trip.base_fare,
+            gender_preference=trip.gender_preference,
+            is_negotiable=trip.is_negotiable,
+        ))
+
+    TripSearchIndex.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['trip'],
+        update_fields=[
+            'route', 'trip_code', 'trip_status', 'trip_date', 'departure_time', 'departure_at',
+            'origin_name', 'destination_name',
+            'origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude',
+            'driver_name', 'vehicle_model',
+            'total_seats', 'available_seats', 'price_per_seat', 'gender_preference', 'is_negotiable',
+            'updated_at',
+        ],
+    )
+    return len(rows)
+
+
+def refresh_route_search_index(route_id: int) -> int:
+    """Rebuild the search rows of every trip on a route (after its stops change)"""
+    from ..models import Trip
+
+    return refresh_trip_search_index(
+        Trip.objects.filter(route_id=route_id).values_list('pk', flat=True)
+    )
+
+
+def update_search_index_seats(trip_id: int, available_seats: int) -> int:
+    """Copy a trip's new available_seats to its search row (seat changes touch nothing else)"""
+    from ..models import TripSearchIndex
+
+    return TripSearchIndex.objects.filter(trip_id=trip_id).update(
+        available_seats=available_seats,
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,142 @@
+"""
+Temporary seat holds for booking requests awaiting driver approval or payment
+
+A hold occupies its legs in Trip.leg_occupancy exactly like a confirmed
+booking, so every availability check counts it and two passengers cannot
+negotiate for the same last seat. Expired holds are released by the
+release_seat_holds command and by the booking paths right before they check
+capacity (segment_free_seats); read-only endpoints treat them as free with
+expired_hold_masks and write nothing. Releasing deletes the hold row before
+freeing its legs, so a hold is freed at most once; seats freed by expired
+holds are offered to the trip's waitlist (services.waitlist) in the same
+transaction.
+"""
+from datetime import timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .seats import reserve_segment, release_segment, leg_range, seats_mask
+from .waitlist import promote_waitlist
+
+DEFAULT_SEAT_HOLD_TTL_SECONDS = 10 * 60
+
+
+def seat_hold_ttl() -> timedelta:
+    """How long a booking request keeps its seats (settings.SEAT_HOLD_TTL_SECONDS)"""
+    return timedelta(seconds=getattr(settings, 'SEAT_HOLD_TTL_SECONDS', DEFAULT_SEAT_HOLD_TTL_SECONDS))
+
+
+def place_hold(booking, ttl: Optional[timedelta] = None):
+    """
+    Hold seats for a pending booking
+
+    Args:
+        booking: Saved PENDING Booking with trip, stops and number_of_seats
+        ttl: Hold duration (defaults to seat_hold_ttl())
+
+    Returns:
+        The SeatHold
+
+    Raises:
+        SeatReservationError: If the legs no longer have enough free seats
+    """
+    from ..models import SeatHold
+
+    from_order = booking.from_stop.stop_order
+    to_order = booking.to_stop.stop_order
+    with transaction.atomic():
+        seat_numbers = reserve_segment(booking.trip, from_order, to_order, booking.number_of_seats)
+        return SeatHold.objects.create(
+            trip=booking.trip,
+            booking=booking,
+            from_stop_order=from_order,
+            to_stop_order=to_order,
+            number_of_seats=booking.number_of_seats,
+            seat_numbers=seat_numbers,
+            expires_at=timezone.now() + (ttl or seat_hold_ttl()),
+        )
+
+
+def release_hold(hold) -> bool:
+    """Return a hold's seats to sale; False if it was already released"""
+    from ..models import SeatHold
+
+    with transaction.atomic():
+        deleted, _ = SeatHold.objects.filter(pk=hold.pk).delete()
+        if deleted:
+            release_segment(hold.trip, hold.from_stop_order, hold.to_stop_order, hold.number_of_seats,
+                            seat_numbers=hold.seat_numbers)
+    return bool(deleted)
+
+
+def release_expired_holds(trip=None, now=None) -> int:
+    """
+    Release expired holds, of one trip or of every trip
+
+    Args:
+        trip: Trip instance to sweep (all trips if None); its seat fields are updated in place
+        now: Expiry cut-off (defaults to the current time)
+
+    Returns:
+        Number of holds released
+    """
+    from ..models import SeatHold
+
+    expired = SeatHold.objects.filter(expires_at__lte=now or timezone.now())
+    if trip is not None:
+        expired = expired.filter(trip=trip)
+    released = 0
+    freed_trips = {}
+    for hold in expired.select_related('trip').order_by('trip_id', 'pk'):
+        if trip is not None:
+            # Release through the caller's instance so it sees the new counts
+            hold.trip = trip
+        if release_hold(hold):
+            released += 1
+            freed_trips[hold.trip_id] = hold.trip
+    for freed_trip in freed_trips.values():
+        # Once per trip, after all its expired holds are freed
+        promote_waitlist(freed_trip)
+    return released
+
+
+def release_trip_holds(trip) -> int:
+    """
+    Release every hold of a trip that is no longer sold, e.g. when it is cancelled
+
+    The freed seats are not offered to the waitlist.
+
+    Returns:
+        Number of holds released
+    """
+    from ..models import SeatHold
+
+    released = 0
+    for hold in SeatHold.objects.filter(trip=trip).order_by('pk'):
+        # Release through the caller's instance so it sees the new counts
+        hold.trip = trip
+        released += release_hold(hold)
+    return released
+
+
+def expired_hold_masks(trip, leg_count: int, now=None) -> List[int]:
+    """
+    Seats of a trip's expired holds as one bitmask per leg, without releasing them
+
+    For read-only availability: clearing these bits from the seat map shows
+    what the next booking will see once the holds are released.
+    """
+    from ..models import SeatHold
+
+    masks = [0] * leg_count
+    for from_order, to_order, seat_numbers in SeatHold.objects.filter(
+        trip=trip, expires_at__lte=now or timezone.now()
+    ).values_list('from_stop_order', 'to_stop_order', 'seat_numbers'):
+        start, end = leg_range(from_order, to_order)
+        held = seats_mask(seat_numbers or [])
+        for leg in range(start, min(end, leg_count)):
+            masks[leg] |= held
+    return masks
@@ -0,0 +1,492 @@
+"""
+Per-leg seat occupancy for trips with partial-route bookings
+
+A trip over stops 1..n has n-1 legs; leg i (0-based) runs from stop i+1 to
+stop i+2. A booking from stop a to stop b occupies legs [a-1, b-1), so a seat
+freed at stop b can be sold again from b onwards. Seats held for pending
+booking requests (services.seat_holds) occupy legs the same way.
+
+Trip.seat_map records which seat numbers are taken on each leg: one
+little-endian bitmask of ceil(total_seats / 8) bytes per leg, where bit k-1
+is seat k. It is written in the same compare-and-swap update as the counts,
+so seat numbers are assigned without ever handing one seat to two riders.
+"""
+from typing import Iterable, List, Optional, Sequence
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Compare-and-swap retries before a seat change gives up under contention
+MAX_SEAT_UPDATE_ATTEMPTS = 20
+
+
+class SegmentTree:
+    """Range-add / range-max tree over leg occupancy counts"""
+
+    def __init__(self, counts: Sequence[int]):
+        self.size = len(counts)
+        self._max = [0] * (4 * max(self.size, 1))
+        self._pending = [0] * (4 * max(self.size, 1))
+        if self.size:
+            self._build(1, 0, self.size - 1, counts)
+
+    def _build(self, node, lo, hi, counts):
+        if lo == hi:
+            self._max[node] = counts[lo]
+            return
+        mid = (lo + hi) // 2
+        self._build(2 * node, lo, mid, counts)
+        self._build(2 * node + 1, mid + 1, hi, counts)
+        self._max[node] = max(self._max[2 * node], self._max[2 * node + 1])
+
+    def _add(self, node, lo, hi, start, end, delta):
+        if end < lo or hi < start:
+            return
+        if start <= lo and hi <= end:
+            self._max[node] += delta
+            self._pending[node] += delta
+            return
+        mid = (lo + hi) // 2
+        self._add(2 * node, lo, mid, start, end, delta)
+        self._add(2 * node + 1, mid + 1, hi, start, end, delta)
+        self._max[node] = self._pending[node] + max(self._max[2 * node], self._max[2 * node + 1])
+
+    def _query(self, node, lo, hi, start, end):
+        if end < lo or hi < start:
+            return float('-inf')
+        if start <= lo and hi <= end:
+            return self._max[node]
+        mid = (lo + hi) // 2
+        return self._pending[node] + max(
+            self._query(2 * node, lo, mid, start, end),
+            self._query(2 * node + 1, mid + 1, hi, start, end),
+        )
+
+    def add(self, start: int, end: int, delta: int):
+        """Add delta to every leg in [start, end)"""
+        if start < end:
+            self._add(1, 0, self.size - 1, start, end - 1, delta)
+
+    def max(self, start: int = 0, end: int = None) -> int:
+        """Largest occupancy over legs [start, end)"""
+        end = self.size if end is None else end
+        if start >= end:
+            return 0
+        return int(self._query(1, 0, self.size - 1, start, end - 1))
+
+    def counts(self) -> List[int]:
+        """Flatten back to one count per leg"""
+        return [self.max(i, i + 1) for i in range(self.size)]
+
+
+def leg_range(from_stop_order: int, to_stop_order: int):
+    """Return the [start, end) leg indexes covered by a ride between two stops"""
+    return from_stop_order - 1, to_stop_order - 1
+
+
+def _leg_count(trip) -> int:
+    return max(trip.route.route_stops.count() - 1, 0)
+
+
+def rebuild_leg_occupancy(trip) -> List[int]:
+    """
+    Recompute a trip's per-leg occupancy from its confirmed bookings and seat holds
+
+    Args:
+        trip: Trip instance (not saved)
+
+    Returns:
+        Occupancy count per leg
+    """
+    tree = SegmentTree([0] * _leg_count(trip))
+    confirmed = trip.trip_bookings.filter(booking_status='CONFIRMED').values_list(
+        'from_stop__stop_order', 'to_stop__stop_order', 'number_of_seats'
+    )
+    for from_order, to_order, seats in confirmed:
+        tree.add(*leg_range(from_order, to_order), seats)
+    # Every unreleased hold counts, expired or not, since releasing it subtracts it again
+    held = trip.seat_holds.values_list('from_stop_order', 'to_stop_order', 'number_of_seats')
+    for from_order, to_order, seats in held:
+        tree.add(*leg_range(from_order, to_order), seats)
+    return tree.counts()
+
+
+def seat_map_width(total_seats: int) -> int:
+    """Bytes per leg in a seat map"""
+    return (total_seats + 7) // 8
+
+
+def decode_seat_map(data, total_seats: int) -> List[int]:
+    """Split a stored seat map into one taken-seat bitmask per leg"""
+    data = bytes(data or b'')
+    width = seat_map_width(total_seats)
+    return [int.from_bytes(data[i:i + width], 'little') for i in range(0, len(data), width)]
+
+
+def encode_seat_map(masks: Sequence[int], total_seats: int) -> bytes:
+    width = seat_map_width(total_seats)
+    return b''.join(mask.to_bytes(width, 'little') for mask in masks)
+
+
+def all_seats_mask(total_seats: int) -> int:
+    """Bitmask with every seat of the trip set"""
+    return (1 << total_seats) - 1
+
+
+def seats_mask(seat_numbers: Iterable[int]) -> int:
+    mask = 0
+    for seat in seat_numbers:
+        mask |= 1 << (seat - 1)
+    return mask
+
+
+def mask_seats(mask: int) -> List[int]:
+    """Seat numbers set in a bitmask, ascending"""
+    seats = []
+    seat = 1
+    while mask:
+        if mask & 1:
+            seats.append(seat)
+        mask >>= 1
+        seat += 1
+    return seats
+
+
+def taken_mask(masks: Sequence[int], from_stop_order: int, to_stop_order: int) -> int:
+    """Seats taken on any leg between two stops"""
+    start, end = leg_range(from_stop_order, to_stop_order)
+    taken = 0
+    for mask in masks[start:end]:
+        taken |= mask
+    return taken
+
+
+def choose_seats(taken: int, total_seats: int, count: int) -> Optional[List[int]]:
+    """
+    Pick seats for a booking, keeping a group together
+
+    Args:
+        taken: Bitmask of seats taken on any of the booking's legs
+        total_seats: Trip capacity
+        count: Seats wanted
+
+    Returns:
+        The lowest block of count adjacent free seats, else the lowest free
+        seats, or None if fewer than count are free
+    """
+    free = all_seats_mask(total_seats) & ~taken
+    block = (1 << count) - 1
+    for start in range(total_seats - count + 1):
+        if (free >> start) & block == block:
+            return list(range(start + 1, start + count + 1))
+    seats = mask_seats(free)
+    return seats[:count] if len(seats) >= count else None
+
+
+def rebuild_seat_map(trip, total_seats: int, persist: bool = True) -> List[int]:
+    """
+    Recompute per-leg seat masks from confirmed bookings and seat holds
+
+    Bookings and holds made before seat maps existed have no seat numbers;
+    they are given seats here (in pickup order) and, with persist, saved, so
+    the map and the seat numbers agree from then on.
+
+    Returns:
+        Taken-seat bitmask per leg
+    """
+    from ..models import Booking, SeatHold
+
+    masks = [0] * _leg_count(trip)
+    unassigned = []
+    bookings = trip.trip_bookings.filter(booking_status='CONFIRMED').select_related('from_stop', 'to_stop')
+    holds = trip.seat_holds.all()
+    riders = [
+        (booking.from_stop.stop_order, booking.to_stop.stop_order, booking) for booking in bookings
+    ] + [(hold.from_stop_order, hold.to_stop_order, hold) for hold in holds]
+    for from_order, to_order, rider in riders:
+        if rider.seat_numbers:
+            mask = seats_mask(seat for seat in rider.seat_numbers if 1 <= seat <= total_seats)
+            start, end = leg_range(from_order, to_order)
+            for leg in range(start, end):
+                masks[leg] |= mask
+        else:
+            unassigned.append((from_order, to_order, rider))
+    for from_order, to_order, rider in sorted(unassigned, key=lambda item: item[0]):
+        seats = choose_seats(taken_mask(masks, from_order, to_order), total_seats, rider.number_of_seats) or []
+        rider.seat_numbers = seats
+        start, end = leg_range(from_order, to_order)
+        for leg in range(start, end):
+            masks[leg] |= seats_mask(seats)
+    if unassigned and persist:
+        Booking.objects.bulk_update([r for _, _, r in unassigned if isinstance(r, Booking)], ['seat_numbers'])
+        SeatHold.objects.bulk_update([r for _, _, r in unassigned if isinstance(r, SeatHold)], ['seat_numbers'])
+    return masks
+
+
+def occupancy_tree(trip) -> SegmentTree:
+    """Load the occupancy tree of a trip, rebuilding stale or missing counts"""
+    counts = trip.leg_occupancy or []
+    if len(counts) != _leg_count(trip):
+        counts = rebuild_leg_occupancy(trip)
+    return SegmentTree(counts)
+
+
+def segment_free_seats(trip, from_stop_order: int, to_stop_order: int) -> int:
+    """
+    Seats free on every leg between two stops
+
+    Args:
+        trip: Trip instance
+        from_stop_order: Pickup stop order
+        to_stop_order: Drop-off stop order
+
+    Expired holds of the trip are released first (and their seats offered to
+    the waitlist), so call this from paths that go on to book, not from GETs.
+
+    Returns:
+        total_seats minus the peak occupancy over [from, to)
+    """
+    from .seat_holds import release_expired_holds
+
+    # Expired holds go back on sale before anyone is told the trip is full
+    release_expired_holds(trip)
+    tree = occupancy_tree(trip)
+    return max(trip.total_seats - tree.max(*leg_range(from_stop_order, to_stop_order)), 0)
+
+
+class SeatReservationError(ValidationError):
+    """A seat change could not be applied; available is the free seat count seen, if known"""
+
+    def __init__(self, message, code='seats_unavailable', available=None):
+        super().__init__(message, code=code)
+        self.available = available
+
+
+class SeatChange:
+    """One occupancy change in a batch: seats > 0 occupies, seats < 0 frees"""
+
+    __slots__ = ('from_stop_order', 'to_stop_order', 'seats', 'seat_numbers', 'result', 'error')
+
+    def __init__(self, from_stop_order: int, to_stop_order: int, seats: int,
+                 seat_numbers: Optional[Sequence[int]] = None):
+        self.from_stop_order = from_stop_order
+        self.to_stop_order = to_stop_order
+        self.seats = seats
+        self.seat_numbers = seat_numbers
+        # Seat numbers taken or freed, or the SeatReservationError that stopped the change
+        self.result = None
+        self.error = None
+
+
+def _plan(change: SeatChange, tree: SegmentTree, masks: List[int], total_seats: int) -> List[int]:
+    """Apply one change to the in-memory tree and masks; raises SeatReservationError if it does not fit"""
+    start, end = leg_range(change.from_stop_order, change.to_stop_order)
+    if change.seats > 0:
+        free = total_seats - tree.max(start, end)
+        if free < change.seats:
+            raise SeatReservationError(
+                f'Only {max(free, 0)} seats available between these stops',
+                available=max(free, 0),
+            )
+        taken = taken_mask(masks, change.from_stop_order, change.to_stop_order)
+        if change.seat_numbers:
+            chosen = sorted(change.seat_numbers)
+            if len(chosen) != change.seats or any(seat < 1 or seat > total_seats for seat in chosen) \
+                    or taken & seats_mask(chosen):
+                raise SeatReservationError('The selected seats are not available', code='seats_taken')
+        else:
+            chosen = choose_seats(taken, total_seats, change.seats)
+            if chosen is None:
+                raise SeatReservationError('No seat numbers are free between these stops', available=0)
+        bits = seats_mask(chosen)
+        for leg in range(start, end):
+            masks[leg] |= bits
+    else:
+        chosen = sorted(change.seat_numbers or [])
+        bits = seats_mask(chosen)
+        for leg in range(start, end):
+            masks[leg] &= ~bits
+    tree.add(start, end, change.seats)
+    return chosen
+
+
+def apply_seat_changes(trip, changes: Sequence[SeatChange], strict: bool = True) -> Sequence[SeatChange]:
+    """
+    Apply seat changes to a trip with one compare-and-swap on Trip.seat_version
+
+    Reads the current counts and map, computes the new ones and writes them
+    with UPDATE ... WHERE seat_version = <version read>, retrying if another
+    request changed the seats in between. Only the seat columns are written,
+    no row lock is held while computing, and the capacity check always runs
+    against the state being replaced, so concurrent bookings cannot oversell.
+
+    Changes are applied in order, so a batch that frees seats first can
+    reuse them later in the same write.
+
+    Args:
+        trip: Trip instance; its seat fields are updated in place
+        changes: SeatChange list
+        strict: Raise on the first change that does not fit; otherwise record
+            it in change.error, skip it and apply the rest
+
+    Returns:
+        The changes, with result (seat numbers) or error filled in
+    """
+    from ..models import Trip
+    from .search_index import update_search_index_seats
+
+    leg_count = _leg_count(trip)
+    for _ in range(MAX_SEAT_UPDATE_ATTEMPTS):
+        current = Trip.objects.filter(pk=trip.pk).values(
+            'total_seats', 'leg_occupancy', 'seat_map', 'seat_version'
+        ).get()
+        total_seats = current['total_seats']
+        counts = current['leg_occupancy'] or []
+        if len(counts) != leg_count:
+            counts = rebuild_leg_occupancy(trip)
+        masks = decode_seat_map(current['seat_map'], total_seats)
+        if len(masks) != leg_count:
+            masks = rebuild_seat_map(trip, total_seats)
+        tree = SegmentTree(counts)
+        for change in changes:
+            change.result, change.error = None, None
+            try:
+                change.result = _plan(change, tree, masks, total_seats)
+            except SeatReservationError as error:
+                if strict:
+                    raise
+                change.error = error
+        if changes and all(change.error is not None for change in changes):
+            # Nothing fits: leave the trip row and its version untouched
+            return changes
+        seat_map = encode_seat_map(masks, total_seats)
+        # Counts rebuilt after a booking was already cancelled must not go negative
+        leg_occupancy = [max(count, 0) for count in tree.counts()]
+        # The scalar tracks seats free for the whole route
+        available_seats = max(total_seats - max(leg_occupancy, default=0), 0)
+        with transaction.atomic():
+            updated = Trip.objects.filter(pk=trip.pk, seat_version=current['seat_version']).update(
+                leg_occupancy=leg_occupancy,
+                seat_map=seat_map,
+                available_seats=available_seats,
+                seat_version=F('seat_version') + 1,
+                updated_at=timezone.now(),
+            )
+            if updated:
+                # update() bypasses Trip.save, so keep the search row in step here
+                update_search_index_seats(trip.pk, available_seats)
+                trip.leg_occupancy = leg_occupancy
+                trip.seat_map = seat_map
+                trip.available_seats = available_seats
+                trip.seat_version = current['seat_version'] + 1
+                return changes
+    raise SeatReservationError(
+        'Seats on this trip are changing too quickly; please try again',
+        code='seat_contention',
+    )
+
+
+def _apply(trip, from_stop_order, to_stop_order, seats, seat_numbers=None) -> List[int]:
+    """Apply a single seat change; returns the seat numbers taken or freed"""
+    change = SeatChange(from_stop_order, to_stop_order, seats, seat_numbers)
+    apply_seat_changes(trip, [change])
+    return change.result
+
+
+def reserve_segment(trip, from_stop_order: int, to_stop_order: int, seats: int,
+                    seat_numbers: Optional[Sequence[int]] = None) -> List[int]:
+    """
+    Occupy seats on the legs between two stops
+
+    Re-checks capacity on the affected legs against the stored counts and
+    persists the new counts together with the whole-route available_seats
+    and the seat map.
+
+    Args:
+        seat_numbers: Specific seats wanted; by default adjacent free seats are assigned
+
+    Returns:
+        The seat numbers taken
+
+    Raises:
+        SeatReservationError: If any leg in the range lacks enough free seats
+    """
+    return _apply(trip, from_stop_order, to_stop_order, seats, seat_numbers)
+
+
+def release_segment(trip, from_stop_order: int, to_stop_order: int, seats: int,
+                    seat_numbers: Sequence[int] = ()) -> List[int]:
+    """Free seats (and their seat numbers) previously occupied with reserve_segment"""
+    return _apply(trip, from_stop_order, to_stop_order, -seats, seat_numbers)
+
+
+def load_seat_map(trip) -> List[int]:
+    """
+    Taken-seat bitmask per leg, for reading availability
+
+    A trip without a stored map (none booked yet) gets one built in memory
+    from its bookings and holds; nothing is written, the first seat change
+    stores it.
+    """
+    masks = decode_seat_map(trip.seat_map, trip.total_seats)
+    if not masks:
+        masks = rebuild_seat_map(trip, trip.total_seats, persist=False)
+    return masks
+
+
+def sync_seat_assignments(trip):
+    """
+    Make a trip's SeatAssignment rows match the seat numbers of its confirmed bookings
+
+    Missing rows are inserted with one bulk_create and stale ones removed
+    with one delete, so the cost does not grow with queries per seat.
+    """
+    from ..models import SeatAssignment
+
+    bookings = trip.trip_bookings.filter(booking_status='CONFIRMED').select_related('passenger')
+    wanted = {(booking.pk, seat): booking for booking in bookings for seat in booking.seat_numbers}
+    existing = {
+        (booking_id, seat): pk
+        for pk, booking_id, seat in SeatAssignment.objects.filter(trip_id=trip.pk).values_list(
+            'pk', 'booking_id', 'seat_number'
+        )
+    }
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    if stale:
+        SeatAssignment.objects.filter(pk__in=stale).delete()
+    missing = [
+        SeatAssignment(
+            trip_id=trip.pk,
+            booking=booking,
+            seat_number=seat,
+            passenger=booking.passenger,
+            passenger_name=booking.passenger.name,
+            passenger_phone=f"****{booking.passenger.phone_no[-4:]}" if booking.passenger.phone_no else None,
+            passenger_gender=booking.passenger.gender or None,
+        )
+        for (booking_pk, seat), booking in wanted.items()
+        if (booking_pk, seat) not in existing
+    ]
+    # A concurrent sync may insert the same rows; (booking, seat_number) is unique
+    SeatAssignment.objects.bulk_create(missing, ignore_conflicts=True)
+
+
+def reset_trip_seats(trip, total_seats: int):
+    """Set a trip's capacity and clear its occupancy (only valid while it has no bookings)"""
+    from ..models import Trip
+    from .search_index import update_search_index_seats
+
+    with transaction.atomic():
+        Trip.objects.filter(pk=trip.pk).update(
+            total_seats=total_seats,
+            available_seats=total_seats,
+            leg_occupancy=[],
+            seat_map=b'',
+            seat_version=F('seat_version') + 1,
+            updated_at=timezone.now(),
+        )
+        update_search_index_seats(trip.pk, total_seats)
+    trip.refresh_from_db(fields=['total_seats', 'available_seats', 'leg_occupancy', 'seat_map', 'seat_version'])
+    return trip
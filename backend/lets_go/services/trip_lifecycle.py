@@ -0,0 +1,102 @@
+"""
+Scheduled trip status changes, applied in bulk outside the request path
+
+Read endpoints used to move each trip they returned to IN_PROGRESS or
+COMPLETED, turning GETs into row writes. advance_trip_lifecycle (run by the
+advance_trip_lifecycle management command) does it instead: trips due to
+start or finish are found on the (trip_status, departure_at) index, locked,
+moved with one UPDATE per transition and given their chat message through
+the outbox in the same transaction. Each UPDATE is conditional on the old
+status, so running it twice, or from two workers, changes and announces a
+trip once.
+
+A scheduled trip starts START_LEAD before departure and any trip still
+scheduled or in progress is completed COMPLETE_AFTER its departure.
+"""
+from datetime import timedelta
+from typing import Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import outbox
+from .search_index import refresh_trip_search_index
+from .waitlist import close_waitlists
+
+DEFAULT_TRIP_START_LEAD_MINUTES = 2 * 60
+DEFAULT_TRIP_COMPLETE_AFTER_MINUTES = 8 * 60
+
+DEFAULT_LIFECYCLE_BATCH_SIZE = 500
+
+
+def trip_start_lead() -> timedelta:
+    """How long before departure a trip is marked in progress (settings.TRIP_START_LEAD_MINUTES)"""
+    return timedelta(minutes=getattr(settings, 'TRIP_START_LEAD_MINUTES', DEFAULT_TRIP_START_LEAD_MINUTES))
+
+
+def trip_complete_after() -> timedelta:
+    """How long after departure a trip is marked completed (settings.TRIP_COMPLETE_AFTER_MINUTES)"""
+    return timedelta(minutes=getattr(settings, 'TRIP_COMPLETE_AFTER_MINUTES', DEFAULT_TRIP_COMPLETE_AFTER_MINUTES))
+
+
+def _transition(queryset, to_status: str, now, batch_size: int, event_type: str, message: str, **values) -> int:
+    """Move one batch of due trips to to_status; returns the number moved"""
+    with transaction.atomic():
+        trip_ids = list(
+            queryset.select_for_update(skip_locked=True).order_by('departure_at', 'pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not trip_ids:
+            return 0
+        # The rows are locked, so the conditional update moves exactly these trips
+        queryset.filter(pk__in=trip_ids).update(trip_status=to_status, updated_at=now, **values)
+        outbox.enqueue_for_trips(trip_ids, event_type, message=message)
+        # A trip under way no longer takes passengers from its waitlist
+        close_waitlists(trip_ids)
+        refresh_trip_search_index(trip_ids)
+    return len(trip_ids)
+
+
+def advance_trip_lifecycle(now=None, batch_size: int = DEFAULT_LIFECYCLE_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    Start and complete every trip that is due
+
+    Args:
+        now: Reference time (defaults to the current time)
+        batch_size: Trips moved per transaction
+
+    Returns:
+        (trips started, trips completed)
+    """
+    from ..models import Trip
+
+    now = now or timezone.now()
+    finish_before = now - trip_complete_after()
+    started = completed = 0
+
+    # Completion first, so a trip overdue for both goes straight to COMPLETED
+    while True:
+        moved = _transition(
+            Trip.objects.filter(trip_status__in=('SCHEDULED', 'IN_PROGRESS'), departure_at__lte=finish_before),
+            'COMPLETED', now, batch_size,
+            outbox.CHAT_ARCHIVED, "✅ Trip completed! This chat will be archived.",
+            completed_at=now,
+        )
+        completed += moved
+        if moved < batch_size:
+            break
+
+    while True:
+        moved = _transition(
+            Trip.objects.filter(trip_status='SCHEDULED', departure_at__lte=now + trip_start_lead(),
+                                departure_at__gt=finish_before),
+            'IN_PROGRESS', now, batch_size,
+            outbox.SYSTEM_MESSAGE, "🚌 Trip has started!",
+            started_at=now,
+        )
+        started += moved
+        if moved < batch_size:
+            break
+
+    return started, completed
@@ -0,0 +1,192 @@
+"""
+Per-trip FIFO waitlist with automatic promotion
+
+When a trip has no seats for a passenger's segment they can join its
+waitlist. Every path that frees seats (a cancelled booking, a rejected or
+expired request) calls promote_waitlist inside the transaction that freed
+them, so the seats go to the waitlist before anyone else can book them.
+Promotion turns waiting entries into PENDING booking requests with a seat
+hold, exactly like a request placed by the passenger, and leaves the
+driver's approval step unchanged.
+
+Each call examines at most WAITLIST_SCAN_LIMIT entries, oldest first, so
+the work per release is bounded however long the waitlist grows. Entries
+are served in order but an entry that does not fit (more seats, or other
+legs) does not block smaller requests behind it. Seats for every promoted
+entry are taken with one compare-and-swap, bookings and holds are written
+with one insert each, and the passengers' emails are written to the outbox
+(services.outbox) in one more insert.
+"""
+from typing import List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from .seats import SeatChange, apply_seat_changes, sync_seat_assignments
+from . import outbox
+
+# Waiting entries examined per release; bounds the work a cancellation does
+WAITLIST_SCAN_LIMIT = 20
+
+
+def join_waitlist(trip, passenger, from_stop, to_stop, number_of_seats: int, total_fare):
+    """
+    Add a passenger to a trip's waitlist and promote at once if seats are free
+
+    Args:
+        trip: Trip to wait for
+        passenger: UsersData joining
+        from_stop: Pickup RouteStop
+        to_stop: Drop-off RouteStop
+        number_of_seats: Seats wanted
+        total_fare: Fare quoted now, charged if promoted
+
+    Returns:
+        The WaitlistEntry, already PROMOTED if seats were free and nobody was ahead
+
+    Raises:
+        IntegrityError: If the passenger is already waiting for this trip
+    """
+    from ..models import WaitlistEntry
+
+    with transaction.atomic():
+        entry = WaitlistEntry.objects.create(
+            trip=trip,
+            passenger=passenger,
+            from_stop=from_stop,
+            to_stop=to_stop,
+            number_of_seats=number_of_seats,
+            total_fare=total_fare,
+        )
+        promote_waitlist(trip)
+    entry.refresh_from_db(fields=['status', 'booking', 'promoted_at'])
+    return entry
+
+
+def waitlist_position(entry) -> Optional[int]:
+    """1-based position among the trip's waiting entries, or None if the entry is not waiting"""
+    from django.db.models import Q
+    from ..models import WaitlistEntry
+
+    if entry.status != 'WAITING':
+        return None
+    ahead = WaitlistEntry.objects.filter(trip_id=entry.trip_id, status='WAITING').filter(
+        Q(created_at__lt=entry.created_at) | Q(created_at=entry.created_at, pk__lt=entry.pk)
+    ).count()
+    return ahead + 1
+
+
+def leave_waitlist(entry) -> bool:
+    """Take a waiting entry off the waitlist; False if it was no longer waiting"""
+    from ..models import WaitlistEntry
+
+    return bool(WaitlistEntry.objects.filter(pk=entry.pk, status='WAITING').update(status='LEFT'))
+
+
+def close_waitlists(trip_ids) -> int:
+    """Take every waiting entry of trips that will not run or have left off the waitlist"""
+    from ..models import WaitlistEntry
+
+    return WaitlistEntry.objects.filter(trip_id__in=list(trip_ids), status='WAITING').update(status='LEFT')
+
+
+def promote_waitlist(trip, limit: int = WAITLIST_SCAN_LIMIT) -> List:
+    """
+    Give freed seats to the oldest waiting entries of a trip
+
+    Call inside the transaction that released the seats. Entries locked by a
+    concurrent promotion are skipped rather than waited for. Only scheduled
+    trips promote; a cancelled, started or completed trip keeps its seats free.
+
+    Args:
+        trip: Trip whose seats were freed; its seat fields are updated in place
+        limit: Most entries examined in this call
+
+    Returns:
+        The promoted WaitlistEntry objects, each with its new pending booking
+    """
+    from ..models import Booking, SeatHold, WaitlistEntry
+    from .seat_holds import seat_hold_ttl
+
+    if trip.trip_status != 'SCHEDULED':
+        return []
+
+    with transaction.atomic():
+        entries = list(
+            WaitlistEntry.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(trip=trip, trip__trip_status='SCHEDULED', status='WAITING')
+            .select_related('from_stop', 'to_stop', 'passenger')
+            .order_by('created_at', 'pk')[:limit]
+        )
+        if not entries:
+            return []
+
+        changes = [
+            SeatChange(entry.from_stop.stop_order, entry.to_stop.stop_order, entry.number_of_seats)
+            for entry in entries
+        ]
+        apply_seat_changes(trip, changes, strict=False)
+        promoted = [(entry, change) for entry, change in zip(entries, changes) if change.error is None]
+        if not promoted:
+            return []
+
+        now = timezone.now()
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                trip=trip,
+                passenger=entry.passenger,
+                from_stop=entry.from_stop,
+                to_stop=entry.to_stop,
+                number_of_seats=entry.number_of_seats,
+                seat_numbers=change.result,
+                total_fare=entry.total_fare,
+                original_fare=entry.total_fare,
+                booking_status='PENDING',
+                bargaining_status='NO_NEGOTIATION',
+                negotiation_notes='Promoted from waitlist',
+            )
+            for entry, change in promoted
+        ])
+        expires_at = now + seat_hold_ttl()
+        SeatHold.objects.bulk_create([
+            SeatHold(
+                trip=trip,
+                booking=booking,
+                from_stop_order=change.from_stop_order,
+                to_stop_order=change.to_stop_order,
+                number_of_seats=change.seats,
+                seat_numbers=change.result,
+                expires_at=expires_at,
+            )
+            for booking, (entry, change) in zip(bookings, promoted)
+        ])
+        for booking, (entry, change) in zip(bookings, promoted):
+            entry.status = 'PROMOTED'
+            entry.booking = booking
+            entry.promoted_at = now
+        promoted_entries = [entry for entry, change in promoted]
+        WaitlistEntry.objects.bulk_update(promoted_entries, ['status', 'booking', 'promoted_at'])
+        sync_seat_assignments(trip)
+
+        # Emailed by drain_outbox, off the path of the request that freed the seats
+        outbox.enqueue_many(trip, outbox.EMAIL, [
+            {
+                'recipient': entry.passenger.email,
+                'subject': 'A seat opened up on your trip',
+                'body': promotion_email_body(trip, entry, expires_at),
+            }
+            for entry in promoted_entries
+        ])
+    return promoted_entries
+
+
+def promotion_email_body(trip, entry, hold_expires_at) -> str:
+    """Email telling a promoted passenger their booking request is waiting for the driver"""
+    return (
+        f"Dear {entry.passenger.name},\n\n"
+        f"Seats opened up on trip {trip.trip_id} and your waitlist request for "
+        f"{entry.number_of_seats} seat(s) from {entry.from_stop.stop_name} to {entry.to_stop.stop_name} "
+        f"is now a booking request ({entry.booking.booking_id}) awaiting the driver's approval.\n\n"
+        f"The seats are held for you until {hold_expires_at:%Y-%m-%d %H:%M} UTC.\n\n"
+        f"Regards,\nLetsGo"
+    )
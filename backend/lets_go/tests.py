@@ -1,3 +1,969 @@
-from django.test import TestCase
+import json
+import pickle
+import threading
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock, skipIf
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import (
+    UsersData, Vehicle, Route, RouteStop, Trip, TripStopBreakdown, Booking, SeatAssignment, SeatHold,
+    WaitlistEntry, OutboxEvent, PricingRuleSet,
+)
+from .services import outbox
+from .services.booking_requests import respond_to_booking_requests
+from .services.seat_holds import place_hold, release_hold
+from .services.seats import SeatReservationError
+from .services.trip_lifecycle import advance_trip_lifecycle, trip_complete_after
+from .services.waitlist import join_waitlist, promote_waitlist, waitlist_position, WAITLIST_SCAN_LIMIT
+from .utils.distances import along_route_matrix, cumulative_distances
+from .utils.fare_cache import fare_matrix_cache
+from .utils.fare_generator import compute_segment_fares, generate_fare_matrix
+from .utils.fare_table import FareTable, build_fare_table
+from .utils.geo import MAX_COVER_CELLS, bounding_box, find_nearby_stops, geohash_cover, geohash_encode
+from .utils.money import Money
+from .utils.pagination import MAX_PAGE_SIZE, PaginationError, encode_cursor, paginate_keyset
+from .utils.peak_calendar import PeakCalendar
+from .utils.polyline import decode_polyline, match_corridor, match_route_corridors
+from .utils.pricing_rules import DEFAULT_RULES, pricing_rules
+from .utils.stop_search import StopNameIndex, stop_name_filter
+from .views_rideposting import TRIP_PAGE_ORDERING
+
+
+def _supports_concurrent_writers():
+    """Threads need their own connections to a shared, lock-aware database"""
+    if connection.vendor != 'sqlite':
+        return True
+    options = connection.settings_dict.get('OPTIONS', {})
+    return not connection.is_in_memory_db() and options.get('transaction_mode') == 'IMMEDIATE'
+
+
+@skipIf(not _supports_concurrent_writers(), 'Needs a database that accepts concurrent writers')
+class ConcurrentSeatReservationTests(TransactionTestCase):
+    """Parallel bookings must never confirm more seats than a leg has"""
+
+    def setUp(self):
+        self.driver = UsersData.objects.create(
+            name='Driver', username='driver', email='driver@example.com', password='password1',
+            address='Islamabad', phone_no='+923001234567', cnic_no='12345-1234567-1', gender='male',
+        )
+        self.vehicle = Vehicle.objects.create(
+            owner=self.driver, model_number='Corolla', company_name='Toyota', plate_number='ABC-123',
+            vehicle_type='FW', seats=4, fuel_type='Petrol',
+        )
+        self.route = Route.objects.create(route_id='R-SEATS', route_name='Seat test route')
+        self.stops = [
+            RouteStop.objects.create(route=self.route, stop_name=f'Stop {order}', stop_order=order,
+                                     latitude=33.6 + order / 10, longitude=73.0 + order / 10)
+            for order in range(1, 4)
+        ]
+        self.trip = Trip.objects.create(
+            trip_id='T-SEATS', route=self.route, vehicle=self.vehicle, driver=self.driver,
+            trip_date=date.today() + timedelta(days=1), departure_time=time(8, 0),
+            estimated_arrival_time=time(10, 0), total_seats=4, available_seats=4, base_fare=200,
+        )
+        self.passengers = [
+            UsersData.objects.create(
+                name=f'Passenger {i}', username=f'passenger{i}', email=f'p{i}@example.com',
+                password='password1', address='Lahore', phone_no=f'+9230000000{i:02d}',
+                cnic_no=f'12345-12345{i:02d}-1', gender='male',
+            )
+            for i in range(12)
+        ]
+
+    def _book_in_parallel(self, requests):
+        """Run (passenger, from_index, to_index) bookings at once; return (confirmed, rejected)"""
+        barrier = threading.Barrier(len(requests))
+        outcomes = []
+        lock = threading.Lock()
+
+        def book(passenger, from_index, to_index):
+            try:
+                barrier.wait()
+                trip = Trip.objects.get(pk=self.trip.pk)
+                Booking.objects.create(
+                    booking_id=f'B-{passenger.pk}-{from_index}', trip=trip, passenger=passenger,
+                    from_stop=self.stops[from_index], to_stop=self.stops[to_index],
+                    number_of_seats=1, total_fare=200, booking_status='CONFIRMED',
+                )
+                result = 'confirmed'
+            except SeatReservationError:
+                result = 'rejected'
+            except Exception as e:
+                result = e
+            finally:
+                connection.close()
+            with lock:
+                outcomes.append(result)
+
+        threads = [threading.Thread(target=book, args=request) for request in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        self.assertEqual(errors, [])
+        return outcomes.count('confirmed'), outcomes.count('rejected')
+
+    def test_parallel_bookings_do_not_overbook(self):
+        confirmed, rejected = self._book_in_parallel([(p, 0, 2) for p in self.passengers])
+
+        self.trip.refresh_from_db()
+        self.assertEqual(confirmed, 4)
+        self.assertEqual(rejected, 8)
+        self.assertEqual(Booking.objects.filter(trip=self.trip, booking_status='CONFIRMED').count(), 4)
+        self.assertEqual(self.trip.leg_occupancy, [4, 4])
+        self.assertEqual(self.trip.available_seats, 0)
+        self.assertEqual(self.trip.search_index.available_seats, 0)
+        seat_numbers = Booking.objects.filter(trip=self.trip, booking_status='CONFIRMED').values_list('seat_numbers', flat=True)
+        self.assertEqual(sorted(seat for seats in seat_numbers for seat in seats), [1, 2, 3, 4])
+        self.assertEqual(SeatAssignment.objects.filter(trip=self.trip).count(), 4)
+
+    def test_parallel_bookings_on_separate_legs_share_seats(self):
+        requests = [(p, 0, 1) for p in self.passengers[:6]] + [(p, 1, 2) for p in self.passengers[6:]]
+        confirmed, rejected = self._book_in_parallel(requests)
+
+        self.trip.refresh_from_db()
+        self.assertEqual(confirmed, 8)
+        self.assertEqual(rejected, 4)
+        self.assertEqual(self.trip.leg_occupancy, [4, 4])
+
+
+class ListEndpointQueryCountTests(TestCase):
+    """Trip list endpoints must run a fixed number of queries however many trips a page holds"""
+
+    def setUp(self):
+        self.driver = UsersData.objects.create(
+            name='Driver', username='driver', email='driver@example.com', password='password1',
+            address='Islamabad', phone_no='+923001234567', cnic_no='12345-1234567-1', gender='male',
+        )
+        self.passenger = UsersData.objects.create(
+            name='Passenger', username='passenger', email='passenger@example.com', password='password1',
+            address='Lahore', phone_no='+923007654321', cnic_no='12345-7654321-1', gender='male',
+        )
+        self.vehicle = Vehicle.objects.create(
+            owner=self.driver, model_number='Corolla', company_name='Toyota', plate_number='ABC-123',
+            vehicle_type='FW', seats=4, fuel_type='Petrol',
+        )
+
+    def _create_trips(self, count):
+        """Trips on their own three-stop routes, each with breakdowns and a confirmed booking"""
+        for _ in range(count):
+            number = Trip.objects.count() + 1
+            route = Route.objects.create(route_id=f'R-LIST-{number}', route_name=f'List route {number}')
+            stops = [
+                RouteStop.objects.create(route=route, stop_name=f'Stop {number}.{order}', stop_order=order,
+                                         latitude=33.6 + order / 10, longitude=73.0 + order / 10)
+                for order in range(1, 4)
+            ]
+            trip = Trip.objects.create(
+                trip_id=f'T-LIST-{number}', route=route, vehicle=self.vehicle, driver=self.driver,
+                trip_date=date.today() + timedelta(days=2), departure_time=time(8, 0),
+                estimated_arrival_time=time(10, 0), total_seats=4, available_seats=4, base_fare=200,
+            )
+            for from_stop, to_stop in zip(stops, stops[1:]):
+                TripStopBreakdown.objects.create(
+                    trip=trip, from_stop_order=from_stop.stop_order, to_stop_order=to_stop.stop_order,
+                    from_stop_name=from_stop.stop_name, to_stop_name=to_stop.stop_name,
+                    distance_km=10, duration_minutes=15, price=100,
+                )
+            Booking.objects.create(
+                trip=trip, passenger=self.passenger, from_stop=stops[0], to_stop=stops[2],
+                number_of_seats=1, total_fare=200, booking_status='CONFIRMED',
+            )
+
+    def _assert_constant_queries(self, url, queries, key):
+        for count in (2, 6):
+            self._create_trips(count - Trip.objects.count())
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()[key]), count)
+
+    def test_all_trips(self):
+        self._assert_constant_queries('/lets_go/all_trips/', 2, 'trips')
+
+    def test_search_rides(self):
+        trip_date = date.today() + timedelta(days=2)
+        self._assert_constant_queries(f'/lets_go/rides/search/?date={trip_date.isoformat()}&min_seats=1', 1, 'rides')
+
+    def test_get_user_rides(self):
+        self._assert_constant_queries(f'/lets_go/users/{self.driver.id}/rides/', 4, 'rides')
+
+
+class SingleTripFixture:
+    """A four-seat trip over three stops and a pool of passengers"""
+
+    def setUp(self):
+        self.driver = UsersData.objects.create(
+            name='Driver', username='driver', email='driver@example.com', password='password1',
+            address='Islamabad', phone_no='+923001234567', cnic_no='12345-1234567-1', gender='male',
+        )
+        self.vehicle = Vehicle.objects.create(
+            owner=self.driver, model_number='Corolla', company_name='Toyota', plate_number='ABC-123',
+            vehicle_type='FW', seats=4, fuel_type='Petrol',
+        )
+        self.passengers = [
+            UsersData.objects.create(
+                name=f'Passenger {i}', username=f'passenger{i}', email=f'p{i}@example.com',
+                password='password1', address='Lahore', phone_no=f'+9230000000{i:02d}',
+                cnic_no=f'12345-12345{i:02d}-1', gender='male',
+            )
+            for i in range(8)
+        ]
+        self.trip, self.stops = self._create_trip()
+
+    def _create_trip(self):
+        number = Trip.objects.count() + 1
+        route = Route.objects.create(route_id=f'R-FIXTURE-{number}', route_name=f'Fixture route {number}')
+        stops = [
+            RouteStop.objects.create(route=route, stop_name=f'Stop {number}.{order}', stop_order=order,
+                                     latitude=33.6 + order / 10, longitude=73.0 + order / 10)
+            for order in range(1, 4)
+        ]
+        trip = Trip.objects.create(
+            trip_id=f'T-FIXTURE-{number}', route=route, vehicle=self.vehicle, driver=self.driver,
+            trip_date=date.today() + timedelta(days=2), departure_time=time(8, 0),
+            estimated_arrival_time=time(10, 0), total_seats=4, available_seats=4, base_fare=200,
+        )
+        return trip, stops
+
+    def _request(self, passenger, seats, trip=None, stops=None):
+        """A pending booking request holding its seats"""
+        trip, stops = trip or self.trip, stops or self.stops
+        booking = Booking.objects.create(
+            trip=trip, passenger=passenger, from_stop=stops[0], to_stop=stops[2],
+            number_of_seats=seats, total_fare=200 * seats, booking_status='PENDING',
+        )
+        hold = place_hold(booking)
+        return booking, hold
+
+    def _wait(self, passenger, seats, trip=None, stops=None):
+        trip, stops = trip or self.trip, stops or self.stops
+        return join_waitlist(trip, passenger, stops[0], stops[2], seats, 200 * seats)
+
+
+class WaitlistPromotionTests(SingleTripFixture, TestCase):
+    """Freed seats go to waiting passengers in FIFO order, with bounded work per release"""
+
+    def test_rejection_promotes_in_fifo_order(self):
+        booking, _ = self._request(self.passengers[0], 4)
+        first = self._wait(self.passengers[1], 3)
+        second = self._wait(self.passengers[2], 2)
+        third = self._wait(self.passengers[3], 1)
+        self.assertEqual([waitlist_position(entry) for entry in (first, second, third)], [1, 2, 3])
+
+        respond_to_booking_requests(self.trip, [{'booking_id': booking.booking_id, 'decision': 'reject'}])
+
+        # The 2-seat entry does not fit after the first; it stays first in line without blocking the third
+        for entry in (first, second, third):
+            entry.refresh_from_db()
+        self.assertEqual([first.status, second.status, third.status], ['PROMOTED', 'WAITING', 'PROMOTED'])
+        self.assertEqual(waitlist_position(second), 1)
+        for entry in (first, third):
+            self.assertEqual(entry.booking.booking_status, 'PENDING')
+            self.assertEqual(entry.booking.seat_hold.seat_numbers, entry.booking.seat_numbers)
+        self.assertEqual(sorted(first.booking.seat_numbers + third.booking.seat_numbers), [1, 2, 3, 4])
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.available_seats, 0)
+        self.assertEqual(OutboxEvent.objects.filter(trip=self.trip, event_type='EMAIL').count(), 2)
+
+    def test_join_promotes_at_once_when_seats_are_free(self):
+        entry = self._wait(self.passengers[0], 2)
+
+        self.assertEqual(entry.status, 'PROMOTED')
+        self.assertEqual(len(entry.booking.seat_numbers), 2)
+        self.assertIsNone(waitlist_position(entry))
+
+    def test_promotion_examines_a_bounded_number_of_entries(self):
+        for waiting in (WAITLIST_SCAN_LIMIT + 5, WAITLIST_SCAN_LIMIT * 3):
+            trip, stops = self._create_trip()
+            _, hold = self._request(self.passengers[0], 4, trip, stops)
+            passengers = UsersData.objects.bulk_create([
+                UsersData(
+                    name=f'Waiting {trip.pk}.{i}', username=f'waiting{trip.pk}_{i}', email=f'w{trip.pk}_{i}@example.com',
+                    password='password1', address='Lahore', phone_no=f'+923{trip.pk:03d}{i:06d}',
+                    cnic_no=f'{trip.pk:05d}-{i:07d}-1', gender='male',
+                )
+                for i in range(waiting)
+            ])
+            WaitlistEntry.objects.bulk_create([
+                WaitlistEntry(trip=trip, passenger=passenger, from_stop=stops[0], to_stop=stops[2],
+                              number_of_seats=1, total_fare=200)
+                for passenger in passengers
+            ])
+            release_hold(hold)
+            with self.assertNumQueries(15):
+                promoted = promote_waitlist(trip)
+            self.assertEqual(len(promoted), 4)
+            self.assertEqual(WaitlistEntry.objects.filter(trip=trip, status='WAITING').count(), waiting - 4)
+
+    def test_cancelled_trip_releases_holds_and_closes_waitlist(self):
+        self._request(self.passengers[0], 4)
+        entry = self._wait(self.passengers[1], 1)
+
+        self.trip.cancel_trip('Vehicle broke down')
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'LEFT')
+        self.assertFalse(SeatHold.objects.filter(trip=self.trip).exists())
+        self.assertEqual(promote_waitlist(self.trip), [])
+        self.assertFalse(OutboxEvent.objects.filter(trip=self.trip, event_type='EMAIL').exists())
+
+    def test_started_trip_does_not_promote(self):
+        _, hold = self._request(self.passengers[0], 4)
+        entry = self._wait(self.passengers[1], 1)
+        Trip.objects.filter(pk=self.trip.pk).update(trip_status='IN_PROGRESS')
+        self.trip.refresh_from_db()
+
+        release_hold(hold)
+
+        self.assertEqual(promote_waitlist(self.trip), [])
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'WAITING')
+
+    def test_waitlist_lookup_rejects_non_integer_passenger_id(self):
+        response = self.client.get(f'/lets_go/trips/{self.trip.trip_id}/waitlist/?passenger_id=abc')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+class OutboxEmailTests(SingleTripFixture, TestCase):
+    """Emails that could not be sent stay in the outbox for a later drain"""
+
+    def _email(self, recipient):
+        return outbox.enqueue(self.trip, outbox.EMAIL, recipient=recipient, subject='Trip update', body='Hello')
+
+    def test_smtp_outage_leaves_events_pending(self):
+        events = [self._email('a@example.com'), self._email('b@example.com')]
+
+        with mock.patch('lets_go.email_otp.smtplib.SMTP', side_effect=ConnectionRefusedError('SMTP down')), \
+                self.assertLogs('lets_go', level='ERROR'):
+            self.assertEqual(outbox.drain_outbox(), (0, 2))
+
+        for event in events:
+            event.refresh_from_db()
+            self.assertIsNone(event.processed_at)
+            self.assertEqual(event.attempts, 1)
+            self.assertIn('SMTP down', event.last_error)
+
+        with mock.patch('lets_go.email_otp.smtplib.SMTP') as smtp:
+            self.assertEqual(outbox.drain_outbox(), (2, 0))
+        self.assertEqual(smtp.return_value.__enter__.return_value.send_message.call_count, 2)
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+
+
+class SeatHoldAvailabilityTests(SingleTripFixture, TestCase):
+    """Reading availability shows expired holds as free without releasing them"""
+
+    def test_available_seats_ignores_expired_holds_without_writing(self):
+        _, live = self._request(self.passengers[0], 1)
+        _, expired = self._request(self.passengers[1], 2)
+        SeatHold.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        response = self.client.get(f'/lets_go/trips/{self.trip.pk}/available-seats/?from_stop_order=1&to_stop_order=3')
+
+        body = response.json()
+        self.assertEqual(body['booked_seats'], live.seat_numbers)
+        self.assertEqual(body['segment_free_seats'], 3)
+        self.assertTrue(SeatHold.objects.filter(pk=expired.pk).exists())
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.available_seats, 1)
+
+    def test_available_seats_of_an_unbooked_trip_writes_nothing(self):
+        self.assertFalse(self.trip.seat_map)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/lets_go/trips/{self.trip.pk}/available-seats/')
+
+        self.assertEqual(response.json()['available_seats'], [1, 2, 3, 4])
+        writes = [query['sql'] for query in queries if not query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+
+class BookingRequestDecisionTests(SingleTripFixture, TestCase):
+    """Driver decisions applied in one batch by services.booking_requests"""
+
+    def _pending(self, passenger, seats):
+        """A pending booking request whose seats are not held"""
+        return Booking.objects.create(
+            trip=self.trip, passenger=passenger, from_stop=self.stops[0], to_stop=self.stops[2],
+            number_of_seats=seats, total_fare=200 * seats, booking_status='PENDING',
+        )
+
+    def _decide(self, *decisions):
+        return respond_to_booking_requests(self.trip, [
+            {'booking_id': booking.booking_id, 'decision': decision} for booking, decision in decisions
+        ])
+
+    def test_mixed_batch_gives_rejected_seats_to_approvals(self):
+        rejected, _ = self._request(self.passengers[0], 2)
+        held, hold = self._request(self.passengers[1], 2)
+        unheld = self._pending(self.passengers[2], 1)
+
+        outcomes = self._decide((held, 'approve'), (rejected, 'reject'), (unheld, 'approve'))
+
+        self.assertEqual([outcome['status'] for outcome in outcomes], ['confirmed', 'rejected', 'confirmed'])
+        self.assertEqual(outcomes[0]['seat_numbers'], hold.seat_numbers)
+        for booking in (rejected, held, unheld):
+            booking.refresh_from_db()
+        self.assertEqual([rejected.booking_status, held.booking_status, unheld.booking_status],
+                         ['CANCELLED', 'CONFIRMED', 'CONFIRMED'])
+        self.assertFalse(SeatHold.objects.filter(trip=self.trip).exists())
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.available_seats, 1)
+        self.assertEqual(SeatAssignment.objects.filter(trip=self.trip).count(), 3)
+        self.assertEqual(OutboxEvent.objects.filter(trip=self.trip, event_type='MEMBER_JOINED').count(), 2)
+
+    def test_approval_without_free_seats_stays_pending(self):
+        self._request(self.passengers[0], 4)
+        booking = self._pending(self.passengers[1], 1)
+
+        outcome, = self._decide((booking, 'approve'))
+
+        self.assertEqual(outcome['status'], 'no_seats')
+        self.assertEqual(outcome['available_seats'], 0)
+        booking.refresh_from_db()
+        self.assertEqual(booking.booking_status, 'PENDING')
+        self.assertFalse(OutboxEvent.objects.filter(trip=self.trip, event_type='MEMBER_JOINED').exists())
+
+    def test_lapsed_hold_is_reserved_again(self):
+        booking, hold = self._request(self.passengers[0], 2)
+        SeatHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        outcome, = self._decide((booking, 'approve'))
+
+        self.assertEqual(outcome['status'], 'confirmed')
+        self.assertEqual(len(outcome['seat_numbers']), 2)
+        self.assertFalse(SeatHold.objects.filter(pk=hold.pk).exists())
+        self.trip.refresh_from_db()
+        # The lapsed hold's seats were freed once and taken once
+        self.assertEqual(self.trip.available_seats, 2)
+        self.assertEqual(max(self.trip.leg_occupancy), 2)
+
+    def test_repeated_booking_is_decided_once(self):
+        booking, _ = self._request(self.passengers[0], 1)
+
+        outcomes = self._decide((booking, 'approve'), (booking, 'reject'))
+
+        self.assertEqual([outcome['status'] for outcome in outcomes], ['confirmed', 'not_pending'])
+        booking.refresh_from_db()
+        self.assertEqual(booking.booking_status, 'CONFIRMED')
+
+
+class FareMatrixCacheTests(SingleTripFixture, TestCase):
+    """Cached fare matrices follow the route's fare_version column"""
+
+    def setUp(self):
+        super().setUp()
+        fare_matrix_cache.clear()
+
+    def test_matrix_is_reused_until_the_route_version_moves(self):
+        route_id = self.trip.route_id
+        matrix = fare_matrix_cache.get(route_id)
+
+        with self.assertNumQueries(1):
+            self.assertIs(fare_matrix_cache.get(route_id), matrix)
+
+        # A bump committed by another worker reaches this one through the database
+        Route.objects.filter(pk=route_id).update(fare_version=F('fare_version') + 1)
+        self.assertIsNot(fare_matrix_cache.get(route_id), matrix)
+
+    def test_stop_change_bumps_the_route_version(self):
+        before = Route.objects.get(pk=self.trip.route_id).fare_version
+
+        self.stops[1].stop_name = 'Renamed stop'
+        self.stops[1].save()
+
+        self.assertEqual(Route.objects.get(pk=self.trip.route_id).fare_version, before + 1)
+
+    def test_full_save_of_a_stale_route_keeps_the_version(self):
+        route = Route.objects.get(pk=self.trip.route_id)
+        self.stops[1].stop_name = 'Renamed stop'
+        self.stops[1].save()
+        bumped = Route.objects.get(pk=route.pk).fare_version
+
+        route.route_description = 'Edited after the stop change'
+        route.save()
+
+        route.refresh_from_db()
+        self.assertEqual(route.fare_version, bumped)
+        self.assertEqual(route.route_description, 'Edited after the stop change')
+
+
+class PricingRuleReloadTests(TestCase):
+    """Workers pick up a published rule set from the database"""
+
+    def setUp(self):
+        pricing_rules.expire()
+
+    def tearDown(self):
+        # The published set is rolled back; do not let later tests quote with it
+        pricing_rules.expire()
+
+    def test_rule_set_published_elsewhere_is_picked_up_after_the_check_interval(self):
+        self.assertEqual(pricing_rules.current().version, 0)
+        rules = dict(DEFAULT_RULES, peak_multiplier='1.50')
+
+        # Published by another worker: nothing reaches this one but the row itself
+        PricingRuleSet.objects.create(version=2, name='Higher peak', rules=rules, is_active=True,
+                                      published_at=timezone.now())
+
+        with self.settings(PRICING_RULES_CHECK_SECONDS=60), self.assertNumQueries(0):
+            self.assertEqual(pricing_rules.current().version, 0)
+        with self.settings(PRICING_RULES_CHECK_SECONDS=0):
+            self.assertEqual(pricing_rules.current().version, 2)
+            with self.assertNumQueries(1):
+                self.assertEqual(pricing_rules.current().version, 2)
+
+
+class StopNameIndexTests(SingleTripFixture, TestCase):
+    """The autocomplete trie follows stop writes made by any worker"""
+
+    def setUp(self):
+        super().setUp()
+        self.index = StopNameIndex()
+
+    def test_stop_added_elsewhere_is_found_after_the_check_interval(self):
+        self.assertEqual(self.index.autocomplete('faiz'), [])
+
+        # Written by another worker: only the database changes
+        RouteStop.objects.bulk_create([
+            RouteStop(route=self.trip.route, stop_name='Faizabad Interchange', search_name='faizabad interchange',
+                      stop_order=4, latitude=33.66, longitude=73.08),
+        ])
+
+        with self.settings(STOP_INDEX_CHECK_SECONDS=60), self.assertNumQueries(0):
+            self.assertEqual(self.index.autocomplete('faiz'), [])
+        with self.settings(STOP_INDEX_CHECK_SECONDS=0):
+            self.assertEqual([match['name'] for match in self.index.autocomplete('faiz')], ['Faizabad Interchange'])
+
+    def test_inactive_stops_are_not_suggested(self):
+        self.index.autocomplete('stop')
+        stop = self.stops[0]
+        stop.stop_name = 'Zero Point'
+        stop.is_active = False
+        stop.save()
+        self.index.expire()
+
+        self.assertEqual(self.index.autocomplete('zero'), [])
+
+    def test_fallback_for_common_words_matches_like_the_index(self):
+        for order, name in enumerate(['Faizabad Interchange', 'Old Faizabad', 'Interchange Faizabad Road',
+                                      'Bfaiz Interchange'], start=4):
+            RouteStop.objects.create(route=self.trip.route, stop_name=name, stop_order=order,
+                                     latitude=33.6, longitude=73.0)
+        stops = RouteStop.objects.all()
+
+        for query in ('faiz', 'inter faiz', 'faizabad old', 'stop'):
+            with self.subTest(query=query), self.settings(STOP_INDEX_CHECK_SECONDS=0):
+                indexed = set(stops.filter(**stop_name_filter('search_name', query)).values_list('pk', flat=True))
+                with mock.patch('lets_go.utils.stop_search.MAX_MATCHED_NAMES', 0):
+                    fallback = stops.filter(**stop_name_filter('search_name', query))
+                    self.assertIn('search_name__regex', stop_name_filter('search_name', query))
+                    self.assertEqual(set(fallback.values_list('pk', flat=True)), indexed)
+        self.assertEqual(stops.filter(**stop_name_filter('search_name', 'inter faiz')).count(), 2)
+
+
+class QuoteFaresBatchTests(SingleTripFixture, TestCase):
+    """Malformed batch quote requests are rejected with 400"""
+
+    def setUp(self):
+        super().setUp()
+        generate_fare_matrix(self.trip.route)
+
+    def _post(self, body):
+        return self.client.post('/lets_go/fares/quote/', body, content_type='application/json')
+
+    def test_body_and_items_must_be_objects(self):
+        for body in ('[1, 2]', '5', '{"quotes": [1]}', '{"quotes": "ab"}'):
+            with self.subTest(body=body):
+                self.assertEqual(self._post(body).status_code, 400)
+
+    def test_trip_seat_count_is_validated(self):
+        for seats in ('"two"', '0', '5'):
+            with self.subTest(seats=seats):
+                response = self._post(f'{{"trip_id": "{self.trip.trip_id}", "number_of_seats": {seats}}}')
+                self.assertEqual(response.status_code, 400)
+
+        response = self._post(f'{{"trip_id": "{self.trip.trip_id}", "number_of_seats": 2}}')
+        quotes = response.json()['quotes']
+        self.assertEqual(len(quotes), 3)
+        self.assertTrue(all(quote['number_of_seats'] == 2 and 'error' not in quote for quote in quotes))
+
+    def test_item_over_trip_capacity_gets_an_error(self):
+        response = self._post(json.dumps({'quotes': [
+            {'trip_id': self.trip.trip_id, 'from_stop_order': 1, 'to_stop_order': 3, 'number_of_seats': 5},
+            {'trip_id': self.trip.trip_id, 'from_stop_order': 1, 'to_stop_order': 3, 'number_of_seats': 4},
+        ]}))
+
+        over, full = response.json()['quotes']
+        self.assertEqual(over['error'], 'Trip has only 4 seats')
+        self.assertNotIn('error', full)
+
+
+class TripLifecycleTests(SingleTripFixture, TestCase):
+    """The scheduler moves due trips with conditional updates and leaves cancelled ones alone"""
+
+    def test_due_trips_start_then_complete_and_cancelled_trips_stay(self):
+        cancelled, _ = self._create_trip()
+        cancelled.cancel_trip('Driver unavailable')
+        departure = self.trip.departure_at
+
+        self.assertEqual(advance_trip_lifecycle(now=departure - timedelta(hours=1)), (1, 0))
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.trip_status, 'IN_PROGRESS')
+        self.assertIsNotNone(self.trip.started_at)
+        # Running again changes and announces nothing
+        self.assertEqual(advance_trip_lifecycle(now=departure - timedelta(hours=1)), (0, 0))
+        self.assertEqual(OutboxEvent.objects.filter(trip=self.trip, event_type='SYSTEM_MESSAGE').count(), 1)
+
+        self.assertEqual(advance_trip_lifecycle(now=departure + trip_complete_after()), (0, 1))
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.trip_status, 'COMPLETED')
+        self.assertTrue(OutboxEvent.objects.filter(trip=self.trip, event_type='CHAT_ARCHIVED').exists())
+
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.trip_status, 'CANCELLED')
+        self.assertFalse(OutboxEvent.objects.filter(trip=cancelled, event_type='CHAT_ARCHIVED').exists())
+
+    def test_overdue_scheduled_trip_goes_straight_to_completed(self):
+        self.assertEqual(advance_trip_lifecycle(now=self.trip.departure_at + trip_complete_after()), (0, 1))
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.trip_status, 'COMPLETED')
+
+
+class PeakCalendarBoundaryTests(TestCase):
+    """Default peak windows are half-open and evaluated in Asia/Karachi time"""
+
+    def setUp(self):
+        self.calendar = PeakCalendar()
+        self.karachi = ZoneInfo('Asia/Karachi')
+
+    def _local(self, hour, minute):
+        # A Wednesday, so the weekday windows apply
+        return datetime(2026, 10, 14, hour, minute, tzinfo=self.karachi)
+
+    def test_window_ends_are_not_peak(self):
+        for hour, minute, peak in [(7, 0, True), (8, 59, True), (9, 0, False),
+                                   (17, 0, True), (18, 59, True), (19, 0, False)]:
+            with self.subTest(time=f'{hour:02d}:{minute:02d}'):
+                self.assertIs(self.calendar.is_peak(self._local(hour, minute)), peak)
+                self.assertIs(self.calendar.is_peak(time(hour, minute)), peak)
+
+    def test_utc_times_are_converted_to_karachi_time(self):
+        utc = dt_timezone.utc
+        # 09:00 and 19:00 UTC are 14:00 and 00:00 in Karachi
+        self.assertFalse(self.calendar.is_peak(datetime(2026, 10, 14, 9, 0, tzinfo=utc)))
+        self.assertFalse(self.calendar.is_peak(datetime(2026, 10, 14, 19, 0, tzinfo=utc)))
+        # 03:59 and 04:00 UTC are 08:59 and 09:00 in Karachi
+        self.assertTrue(self.calendar.is_peak(datetime(2026, 10, 14, 3, 59, tzinfo=utc)))
+        self.assertFalse(self.calendar.is_peak(datetime(2026, 10, 14, 4, 0, tzinfo=utc)))
+
+
+class IdempotencyScopeTests(SingleTripFixture, TestCase):
+    """Idempotency keys are scoped to the calling user as well as the endpoint"""
+
+    def _join(self, passenger, key):
+        return self.client.post(
+            f'/lets_go/trips/{self.trip.trip_id}/waitlist/',
+            json.dumps({'passenger_id': passenger.pk, 'from_stop_order': 1, 'to_stop_order': 3, 'number_of_seats': 1}),
+            content_type='application/json',
+            headers={'Idempotency-Key': key},
+        )
+
+    def test_same_key_from_two_users_runs_twice(self):
+        first = self._join(self.passengers[0], 'retry-1')
+        second = self._join(self.passengers[1], 'retry-1')
+
+        self.assertLess(first.status_code, 300)
+        self.assertLess(second.status_code, 300)
+        self.assertNotIn('Idempotent-Replayed', second)
+        self.assertEqual(WaitlistEntry.objects.filter(trip=self.trip).count(), 2)
+
+        retry = self._join(self.passengers[0], 'retry-1')
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+
+
+class RouteDistanceTests(TestCase):
+    """Leg, cumulative and along-route distances feed the fare matrix"""
+
+    def test_along_route_matrix_holds_forward_distances(self):
+        matrix = along_route_matrix(cumulative_distances([1.5, 2.0, 0.5]))
+
+        self.assertEqual([list(row) for row in matrix], [
+            [0.0, 1.5, 3.5, 4.0],
+            [0.0, 0.0, 2.0, 2.5],
+            [0.0, 0.0, 0.0, 0.5],
+            [0.0, 0.0, 0.0, 0.0],
+        ])
+
+    def test_segment_fares_price_every_forward_pair(self):
+        rows = compute_segment_fares([0.0, 1.5, 3.5, 4.0])
+
+        self.assertEqual([(i, j) for i, j, *_ in rows], [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)])
+        self.assertEqual([str(row[2]) for row in rows], ['1.50', '3.50', '4.00', '2.00', '2.50', '0.50'])
+
+
+class KeysetPaginationTests(SingleTripFixture, TestCase):
+    """Cursor pages follow the ordering exactly, ties broken by pk"""
+
+    def setUp(self):
+        super().setUp()
+        # Same date and time as the fixture trip, so only pk orders them
+        self.trips = [self.trip] + [self._create_trip()[0] for _ in range(4)]
+
+    def _walk(self, queryset, ordering, limit):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = paginate_keyset(queryset, ordering, cursor=cursor, limit=str(limit))
+            seen.append([row.pk for row in rows])
+            if cursor is None:
+                return seen
+
+    def test_pages_cover_every_row_once_in_order(self):
+        pages = self._walk(Trip.objects.all(), TRIP_PAGE_ORDERING, 2)
+
+        self.assertEqual(pages, [[t.pk for t in self.trips[0:2]], [t.pk for t in self.trips[2:4]], [self.trips[4].pk]])
+
+    def test_descending_ordering(self):
+        pages = self._walk(Trip.objects.all(), ['-trip_date', '-pk'], 3)
+
+        self.assertEqual(sum(pages, []), [t.pk for t in reversed(self.trips)])
+
+    def test_rows_inserted_before_the_cursor_do_not_shift_later_pages(self):
+        rows, cursor = paginate_keyset(Trip.objects.all(), TRIP_PAGE_ORDERING, limit='2')
+        earlier, _ = self._create_trip()
+        Trip.objects.filter(pk=earlier.pk).update(trip_date=date.today())
+
+        rows, _ = paginate_keyset(Trip.objects.all(), TRIP_PAGE_ORDERING, cursor=cursor, limit='2')
+
+        self.assertEqual([row.pk for row in rows], [t.pk for t in self.trips[2:4]])
+
+    def test_invalid_parameters(self):
+        for kwargs in ({'limit': '0'}, {'limit': 'ten'}, {'limit': str(MAX_PAGE_SIZE + 1)},
+                       {'cursor': 'not-a-cursor'}, {'cursor': encode_cursor(['2026-01-01'])}):
+            with self.subTest(**kwargs), self.assertRaises(PaginationError):
+                paginate_keyset(Trip.objects.all(), TRIP_PAGE_ORDERING, **kwargs)
+
+
+class GeohashSearchTests(SingleTripFixture, TestCase):
+    """Geohash cells narrow stop searches without dropping stops inside the radius"""
+
+    def test_geohash_encode_known_point(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(self.stops[0].geohash, geohash_encode(33.7, 73.1))
+
+    def test_cover_contains_every_point_of_the_box(self):
+        for radius_km in (0.05, 1, 15, 120):
+            min_lat, max_lat, min_lng, max_lng = bounding_box(33.7, 73.1, radius_km)
+            cover = geohash_cover(min_lat, max_lat, min_lng, max_lng)
+            with self.subTest(radius_km=radius_km):
+                self.assertLessEqual(len(cover), MAX_COVER_CELLS)
+                for lat in (min_lat, (min_lat + max_lat) / 2, max_lat):
+                    for lng in (min_lng, (min_lng + max_lng) / 2, max_lng):
+                        cell = geohash_encode(lat, lng)
+                        self.assertTrue(any(cell.startswith(prefix) for prefix in cover), (lat, lng))
+
+    def test_nearby_stops_within_radius_nearest_first(self):
+        stops = find_nearby_stops(33.74, 73.14, 10)
+
+        self.assertEqual([stop['id'] for stop in stops], [self.stops[0].pk, self.stops[1].pk])
+        self.assertLess(stops[0]['distance_km'], stops[1]['distance_km'])
+        self.assertEqual([stop['id'] for stop in find_nearby_stops(33.74, 73.14, 10, limit=1)], [self.stops[0].pk])
+        self.assertEqual(find_nearby_stops(33.74, 73.14, 1), [])
+
+    def test_inactive_routes_are_skipped(self):
+        Route.objects.filter(pk=self.trip.route_id).update(is_active=False)
+
+        self.assertEqual(find_nearby_stops(33.7, 73.1, 1), [])
+        self.assertEqual(len(find_nearby_stops(33.7, 73.1, 1, active_only=False)), 1)
+
+
+class CorridorMatchTests(TestCase):
+    """Routes match when their road passes the pickup and then the drop-off"""
+
+    # East along 33.6N, then north along 73.1E
+    ROAD = [[33.6, 73.0], [33.6, 73.05], [33.6, 73.1], [33.65, 73.1], [33.7, 73.1]]
+    PICKUP = (33.601, 73.03)
+    DROPOFF = (33.68, 73.101)
+
+    def _route(self, route_id, points, is_active=True):
+        route = Route(route_id=route_id, route_name=route_id, is_active=is_active)
+        route.set_polyline(points)
+        route.save()
+        return route
+
+    def test_set_polyline_simplifies_and_stores_bounds(self):
+        route = self._route('R-ROAD', self.ROAD)
+
+        self.assertEqual(decode_polyline(route.polyline), [(33.6, 73.0), (33.6, 73.1), (33.7, 73.1)])
+        self.assertEqual((route.bbox_min_lat, route.bbox_max_lat, route.bbox_min_lng, route.bbox_max_lng),
+                         (33.6, 33.7, 73.0, 73.1))
+
+    def test_match_corridor_projects_both_ends_in_route_order(self):
+        encoded = self._route('R-ROAD', self.ROAD).polyline
+
+        match = match_corridor(encoded, self.PICKUP, self.DROPOFF, 0.5)
+
+        self.assertAlmostEqual(match['pickup_distance_km'], 0.111, places=2)
+        self.assertAlmostEqual(match['dropoff_distance_km'], 0.093, places=2)
+        self.assertLess(match['pickup_along_km'], match['dropoff_along_km'])
+        self.assertAlmostEqual(match['walk_distance_km'],
+                               match['pickup_distance_km'] + match['dropoff_distance_km'])
+
+    def test_match_corridor_rejects_wrong_direction_and_far_points(self):
+        encoded = self._route('R-ROAD', self.ROAD).polyline
+
+        self.assertIsNone(match_corridor(encoded, self.DROPOFF, self.PICKUP, 0.5))
+        self.assertIsNone(match_corridor(encoded, (33.65, 73.05), self.DROPOFF, 0.5))
+        self.assertIsNone(match_corridor(encoded, self.PICKUP, self.DROPOFF, 0.05))
+
+    def test_match_route_corridors_returns_active_matching_routes(self):
+        road = self._route('R-ROAD', self.ROAD)
+        self._route('R-REVERSED', list(reversed(self.ROAD)))
+        self._route('R-INACTIVE', self.ROAD, is_active=False)
+        self._route('R-FAR', [[31.5, 74.3], [31.6, 74.4]])
+        Route.objects.create(route_id='R-NO-ROAD', route_name='No road')
+
+        matches = match_route_corridors(self.PICKUP, self.DROPOFF, 0.5)
+
+        self.assertEqual(list(matches), [road.pk])
+        self.assertEqual(matches[road.pk], match_corridor(road.polyline, self.PICKUP, self.DROPOFF, 0.5))
+
+
+class FareTableTests(TestCase):
+    """Every forward stop pair maps to its own slot of the triangular arrays"""
+
+    STOP_NAMES = {1: 'A', 2: 'B', 3: 'C', 4: 'D', 5: 'E'}
+
+    def _rows(self, pairs):
+        return [(i, j, 10 * i + j, 100 * i + j, 110 * i + j, 90 * i + j, i) for i, j in pairs]
+
+    def test_each_pair_has_its_own_slot(self):
+        pairs = [(i, j) for i in range(1, 6) for j in range(i + 1, 6)]
+        table = build_fare_table(self._rows(pairs), self.STOP_NAMES, origin=(33.6, 73.0))
+
+        self.assertEqual((table.stop_count, len(table), list(table)), (5, 10, pairs))
+        self.assertEqual(sorted(table._index(i, j) for i, j in pairs), list(range(10)))
+        for i, j in pairs:
+            with self.subTest(pair=(i, j)):
+                self.assertEqual(table.distance(i, j), 10 * i + j)
+                self.assertEqual(table.rule_version(i, j), i)
+                self.assertEqual(table.fare(i, j, peak=True), Money.of(110 * i + j))
+                self.assertEqual(table.fare(i, j, peak=False), Money.of(90 * i + j))
+                self.assertEqual(table[(i, j)], {
+                    'base_fare': 100 * i + j, 'peak_fare': 110 * i + j, 'off_peak_fare': 90 * i + j,
+                    'distance_km': 10 * i + j, 'pricing_rule_version': i,
+                    'from_stop_name': self.STOP_NAMES[i], 'to_stop_name': self.STOP_NAMES[j],
+                })
+
+    def test_missing_backward_and_out_of_range_pairs(self):
+        table = build_fare_table(self._rows([(1, 3), (3, 1), (2, 4)]), self.STOP_NAMES)
+
+        self.assertEqual(list(table), [(1, 3), (2, 4)])
+        for key in ((1, 2), (3, 1), (2, 2), (0, 1), (4, 6)):
+            with self.subTest(key=key):
+                self.assertNotIn(key, table)
+                self.assertIsNone(table.get(key))
+                self.assertIsNone(table.fare(*key, peak=True))
+                self.assertEqual((table.distance(*key), table.rule_version(*key)), (0, 0))
+        self.assertNotIn('1-3', table)
+        with self.assertRaises(ValueError):
+            FareTable(3).set(3, 1, 1.0, Money(1), Money(1), Money(1))
+
+    def test_pickle_round_trip(self):
+        table = build_fare_table(self._rows([(1, 2), (1, 3), (2, 3)]), self.STOP_NAMES, origin=(33.6, 73.0))
+
+        restored = pickle.loads(pickle.dumps(table))
+
+        self.assertEqual(dict(restored), dict(table))
+        self.assertEqual((restored.stop_count, restored.origin), (5, (33.6, 73.0)))
+
+
+class NegotiationEventMigrationTests(TransactionTestCase):
+    """0019 moves Trip.bargaining_history entries into NegotiationEvent rows"""
+
+    before = [('lets_go', '0018_seat_map')]
+    after = [('lets_go', '0019_negotiation_events')]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self._migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('lets_go'))
+
+    def test_history_entries_become_offer_events(self):
+        apps = self._migrate(self.before)
+        UsersData = apps.get_model('lets_go', 'UsersData')
+        driver, passenger = [
+            UsersData.objects.create(
+                name=name, username=name.lower(), email=f'{name.lower()}@example.com', password='password1',
+                address='Islamabad', phone_no=phone, cnic_no=cnic, gender='male',
+            )
+            for name, phone, cnic in (('Driver', '+923001234567', '12345-1234567-1'),
+                                      ('Passenger', '+923007654321', '12345-7654321-1'))
+        ]
+        vehicle = apps.get_model('lets_go', 'Vehicle').objects.create(
+            owner=driver, model_number='Corolla', company_name='Toyota', plate_number='ABC-123',
+            vehicle_type='FW', seats=4, fuel_type='Petrol',
+        )
+        route = apps.get_model('lets_go', 'Route').objects.create(route_id='R-MIGRATION', route_name='Migration')
+        stops = [
+            apps.get_model('lets_go', 'RouteStop').objects.create(
+                route=route, stop_name=f'Stop {order}', stop_order=order, latitude=33.6, longitude=73.0 + order / 10,
+            )
+            for order in (1, 2)
+        ]
+        history = [
+            {'timestamp': '2026-10-01T09:00:00+05:00', 'passenger_id': passenger.pk, 'passenger_name': 'Passenger',
+             'original_fare': 200, 'proposed_fare': 150.5, 'status': 'PENDING'},
+            {'timestamp': 'not a date', 'passenger_id': '999', 'passenger_name': 'Deleted user',
+             'original_fare': 200, 'proposed_fare': None},
+        ]
+        trip = apps.get_model('lets_go', 'Trip').objects.create(
+            trip_id='T-MIGRATION', route=route, vehicle=vehicle, driver=driver,
+            trip_date=date.today() + timedelta(days=2), departure_time=time(8, 0),
+            estimated_arrival_time=time(10, 0), total_seats=4, available_seats=4, base_fare=200,
+            bargaining_history=history,
+        )
+        booking = apps.get_model('lets_go', 'Booking').objects.create(
+            trip=trip, passenger=passenger, from_stop=stops[0], to_stop=stops[1],
+            number_of_seats=1, total_fare=200, passenger_offer='150.50', booking_status='PENDING',
+        )
+
+        apps = self._migrate(self.after)
+
+        events = list(apps.get_model('lets_go', 'NegotiationEvent').objects.order_by('pk').values(
+            'trip_id', 'booking_id', 'actor_id', 'actor_name', 'event_type', 'original_fare', 'proposed_fare',
+            'status', 'created_at',
+        ))
+        self.assertEqual(len(events), 2)
+        offer, orphan = events
+        self.assertEqual(
+            (offer['trip_id'], offer['booking_id'], offer['actor_id'], offer['actor_name'], offer['event_type']),
+            (trip.pk, booking.pk, passenger.pk, 'Passenger', 'OFFER'),
+        )
+        self.assertEqual((str(offer['original_fare']), str(offer['proposed_fare']), offer['status']),
+                         ('200.00', '150.50', 'PENDING'))
+        self.assertEqual(offer['created_at'], datetime(2026, 10, 1, 4, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual((orphan['booking_id'], orphan['actor_id'], orphan['actor_name']), (None, None, 'Deleted user'))
+        self.assertEqual((orphan['proposed_fare'], orphan['status']), (None, 'PENDING'))
+
+        apps = self._migrate(self.before)
+
+        restored = apps.get_model('lets_go', 'Trip').objects.get(pk=trip.pk).bargaining_history
+        self.assertEqual([(entry['passenger_id'], entry['proposed_fare']) for entry in restored],
+                         [(passenger.pk, 150.5), (None, None)])
@@ -16,6 +16,7 @@ urlpatterns = [
     path('users/<int:user_id>/vehicles/', views_authentication.user_vehicles, name='user_vehicles'),
     path('create_route/', views_rideposting.create_route, name='create_route'),
     path('calculate_fare/', views_rideposting.calculate_fare, name='calculate_fare'),
+    path('fares/quote/', views_rideposting.quote_fares_batch, name='quote_fares_batch'),
     
     # Image serving endpoints
     path('user_image/<int:user_id>/<str:image_field>/', views_authentication.user_image, name='user_image'),
@@ -31,11 +32,17 @@ urlpatterns = [
     # Ride Booking endpoints
     path('ride-booking/<str:trip_id>/', views_ridebooking.get_ride_booking_details, name='get_ride_booking_details'),
     path('ride-booking/<str:trip_id>/request/', views_rideposting.handle_ride_booking_request, name='handle_ride_booking_request'),
+    path('trips/<str:trip_id>/booking-requests/respond/', views_rideposting.respond_booking_requests, name='respond_booking_requests'),
+    path('trips/<str:trip_id>/negotiations/', views_rideposting.get_negotiation_history, name='get_negotiation_history'),
+    path('trips/<str:trip_id>/waitlist/', views_rideposting.trip_waitlist, name='trip_waitlist'),
+    path('trips/<str:trip_id>/waitlist/leave/', views_rideposting.leave_trip_waitlist, name='leave_trip_waitlist'),
     
     # Additional endpoints that might be needed
     path('routes/<int:route_id>/', views_rideposting.get_route_details, name='get_route_details'),
     path('routes/<int:route_id>/statistics/', views_rideposting.get_route_statistics, name='get_route_statistics'),
     path('routes/search/', views_rideposting.search_routes, name='search_routes'),
+    path('stops/nearby/', views_rideposting.nearby_stops, name='nearby_stops'),
+    path('stops/autocomplete/', views_rideposting.autocomplete_stops, name='autocomplete_stops'),
     path('trips/<int:trip_id>/available-seats/', views_rideposting.get_available_seats, name='get_available_seats'),
     path('bookings/', views_rideposting.create_booking, name='create_booking'),
     path('users/<int:user_id>/bookings/', views_rideposting.get_user_bookings, name='get_user_bookings'),
@@ -0,0 +1,79 @@
+"""
+Batch great-circle distances for route stops (legs, cumulative and all-pairs)
+
+Coordinates are converted to radians and their cosines computed once per
+stop, then every distance reuses them; results are packed float arrays.
+"""
+from array import array
+from itertools import accumulate
+from math import radians, cos, sin, asin, sqrt
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from .geo import EARTH_RADIUS_KM
+
+
+class StopCoordinates:
+    """Stop coordinates of one route prepared for batch distance computation"""
+
+    __slots__ = ('lat', 'lng', 'cos_lat', 'known')
+
+    def __init__(self, points: Iterable[Tuple[Optional[float], Optional[float]]]):
+        self.lat = array('d')
+        self.lng = array('d')
+        self.cos_lat = array('d')
+        self.known = []
+        for latitude, longitude in points:
+            known = latitude is not None and longitude is not None
+            lat = radians(float(latitude)) if known else 0.0
+            self.lat.append(lat)
+            self.lng.append(radians(float(longitude)) if known else 0.0)
+            self.cos_lat.append(cos(lat))
+            self.known.append(known)
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_route(cls, route) -> 'StopCoordinates':
+        """Load the ordered stop coordinates of a route in one query"""
+        return cls(route.route_stops.order_by('stop_order').values_list('latitude', 'longitude'))
+
+    def distance(self, i: int, j: int) -> float:
+        """Great-circle distance in km between stops i and j (0 if either lacks coordinates)"""
+        if not (self.known[i] and self.known[j]):
+            return 0.0
+        a = sin((self.lat[j] - self.lat[i]) / 2) ** 2 + \
+            self.cos_lat[i] * self.cos_lat[j] * sin((self.lng[j] - self.lng[i]) / 2) ** 2
+        return 2 * asin(min(1.0, sqrt(a))) * EARTH_RADIUS_KM
+
+
+def leg_distances(coords: StopCoordinates) -> array:
+    """Distance in km of each leg between consecutive stops"""
+    return array('d', (coords.distance(i, i + 1) for i in range(len(coords) - 1)))
+
+
+def cumulative_distances(legs: Sequence[float]) -> array:
+    """Distance in km from the first stop to each stop (starts with 0.0)"""
+    return array('d', accumulate(legs, initial=0.0))
+
+
+def along_route_matrix(cumulative: Sequence[float]) -> List[array]:
+    """
+    Along-route distance between every pair of stops
+
+    Row i holds cumulative[j] - cumulative[i] for every j; entries with j <= i
+    are zero since passengers only travel forwards.
+    """
+    n = len(cumulative)
+    rows = []
+    for i in range(n):
+        start = cumulative[i]
+        row = array('d', bytes(8 * (i + 1)))
+        row.extend(cumulative[j] - start for j in range(i + 1, n))
+        rows.append(row)
+    return rows
+
+
+def path_length_km(points: Iterable[Tuple[Optional[float], Optional[float]]]) -> float:
+    """Total length in km of a path given as (lat, lng) points"""
+    return sum(leg_distances(StopCoordinates(points)))
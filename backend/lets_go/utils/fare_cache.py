@@ -0,0 +1,90 @@
+"""
+Versioned, LRU-bounded cache of per-route fare matrices
+
+Each route has a version number (Route.fare_version) that is bumped in the
+database whenever its fares or stops change. Lookups read it with a
+primary-key query and compare it with the in-process entry's version, so the
+matrix itself is only loaded when the route's fares changed since this worker
+last built them, and every worker sees a bump as soon as it commits.
+
+An optional second tier (settings.FARE_MATRIX_SHARED_CACHE, a CACHES alias)
+stores built matrices so a cold worker can skip loading them as well.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+
+SHARED_KEY = 'fare_matrix:{route_id}:{version}'
+
+# Routes kept in each worker's memory
+DEFAULT_MAX_ROUTES = 256
+
+
+def get_fare_matrix_version(route_id: int) -> Optional[int]:
+    """Current fare matrix version of a route (None if the route does not exist)"""
+    from ..models import Route
+
+    return Route.objects.filter(pk=route_id).values_list('fare_version', flat=True).first()
+
+
+def bump_fare_matrix_version(route_id: Optional[int]):
+    """Invalidate every cached fare matrix of a route; commits with the caller's transaction"""
+    from ..models import Route
+
+    if route_id is None:
+        return
+    Route.objects.filter(pk=route_id).update(fare_version=F('fare_version') + 1)
+
+
+class FareMatrixCache:
+    """Process-wide LRU of fare matrices, each tagged with the version it was built at"""
+
+    def __init__(self, max_routes: int = DEFAULT_MAX_ROUTES):
+        self.max_routes = max_routes
+        self._entries: 'OrderedDict[int, Tuple[object, Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shared(self):
+        alias = getattr(settings, 'FARE_MATRIX_SHARED_CACHE', None)
+        return caches[alias] if alias else None
+
+    def get(self, route_id: int) -> Dict:
+        """
+        Fare matrix of a route, rebuilt only when its version moved
+
+        The returned mapping is shared between requests and must not be modified.
+        """
+        version = get_fare_matrix_version(route_id)
+        with self._lock:
+            entry = self._entries.get(route_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(route_id)
+                return entry[1]
+
+        shared = self._shared()
+        matrix = None
+        if shared is not None:
+            matrix = shared.get(SHARED_KEY.format(route_id=route_id, version=version))
+        if matrix is None:
+            from .fare_calculator import load_fare_matrix
+            matrix = load_fare_matrix(route_id)
+            if shared is not None:
+                shared.set(SHARED_KEY.format(route_id=route_id, version=version), matrix)
+
+        with self._lock:
+            self._entries[route_id] = (version, matrix)
+            self._entries.move_to_end(route_id)
+            while len(self._entries) > self.max_routes:
+                self._entries.popitem(last=False)
+        return matrix
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+fare_matrix_cache = FareMatrixCache(getattr(settings, 'FARE_MATRIX_CACHE_MAX_ROUTES', DEFAULT_MAX_ROUTES))
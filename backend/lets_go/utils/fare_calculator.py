@@ -1,51 +1,64 @@
 """
 Fare calculation utilities for the bus/shuttle service
 """
-from decimal import Decimal
 from datetime import datetime, time
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from django.utils import timezone
+from .fare_table import FareTable, build_fare_table
+from .money import Money, Rate
+from .pricing_rules import pricing_rules
 
-def is_peak_hour(current_time: time) -> bool:
+def is_peak_hour(current_time: Union[datetime, time], region: Optional[str] = None) -> bool:
     """
-    Determine if current time is peak hour
+    Determine if a time is peak hour
     
-    Peak hours are typically:
-    - Morning: 7:00 AM - 9:00 AM
-    - Evening: 5:00 PM - 7:00 PM
+    Uses the peak calendar of the published pricing rules (by default
+    [7:00, 9:00) and [17:00, 19:00) Asia/Karachi time, so 9:00 and 19:00
+    themselves are off-peak). Aware datetimes are
+    converted to the region's time zone; naive datetimes and times are taken
+    as local wall-clock time.
+    
+    Args:
+        current_time: Booking or departure time
+        region: Peak calendar region (defaults to the calendar's default region)
     """
-    morning_start = time(7, 0)  # 7:00 AM
-    morning_end = time(9, 0)    # 9:00 AM
-    evening_start = time(17, 0) # 5:00 PM
-    evening_end = time(19, 0)   # 7:00 PM
-    
-    return (
-        (morning_start <= current_time <= morning_end) or
-        (evening_start <= current_time <= evening_end)
-    )
+    return pricing_rules.current().peak_calendar.is_peak(current_time, region)
+
+def fare_matrix_region(fare_matrix) -> Optional[str]:
+    """Peak calendar region of the route a fare matrix belongs to"""
+    origin = getattr(fare_matrix, 'origin', None)
+    if not origin:
+        return None
+    return pricing_rules.current().peak_calendar.region_for_point(*origin)
 
 def calculate_distance_fare(
     from_stop_order: int,
     to_stop_order: int,
     fare_matrix: Dict[Tuple[int, int], Dict],
     is_peak_hour: bool = False
-) -> Decimal:
+) -> Money:
     """
     Calculate fare based on distance between stops
     
     Args:
         from_stop_order: Pickup stop order number
         to_stop_order: Drop-off stop order number
-        fare_matrix: Dictionary mapping (from_order, to_order) to fare data
+        fare_matrix: FareTable or dictionary mapping (from_order, to_order) to fare data
         is_peak_hour: Whether current time is peak hour
     
     Returns:
-        Calculated fare amount
+        Fare for one seat
     """
     if from_stop_order >= to_stop_order:
         raise ValueError("Pickup stop must come before drop-off stop")
     
-    # Look up fare in matrix
+    # Look up fare in matrix (direct array access for FareTable)
+    if isinstance(fare_matrix, FareTable):
+        fare = fare_matrix.fare(from_stop_order, to_stop_order, is_peak_hour)
+        if fare is None:
+            raise ValueError(f"No fare defined for route segment {from_stop_order} to {to_stop_order}")
+        return fare
+    
     fare_key = (from_stop_order, to_stop_order)
     if fare_key not in fare_matrix:
         raise ValueError(f"No fare defined for route segment {from_stop_order} to {to_stop_order}")
@@ -54,9 +67,9 @@ def calculate_distance_fare(
     
     # Return appropriate fare based on time
     if is_peak_hour:
-        return Decimal(str(fare_data['peak_fare']))
+        return Money.of(fare_data['peak_fare'])
     else:
-        return Decimal(str(fare_data['off_peak_fare']))
+        return Money.of(fare_data['off_peak_fare'])
 
 def calculate_booking_fare(
     from_stop_order: int,
@@ -80,14 +93,14 @@ def calculate_booking_fare(
         seat_discount: Discount per seat for multiple seats (0.0 to 1.0)
     
     Returns:
-        Dictionary with fare breakdown
+        Dictionary with fare breakdown; amounts are rounded half up to the
+        paisa, and the total is the per-seat fare times the seat count
     """
     if booking_time is None:
         booking_time = timezone.now()
     
-    # Determine if peak hour
-    current_time = booking_time.time()
-    peak_hour = is_peak_hour(current_time)
+    # Determine if peak hour in the route's local time
+    peak_hour = is_peak_hour(booking_time, fare_matrix_region(fare_matrix))
     
     # Calculate base fare for one seat
     base_fare = calculate_distance_fare(
@@ -98,30 +111,37 @@ def calculate_booking_fare(
     )
     
     # Apply base fare multiplier
-    adjusted_base_fare = base_fare * Decimal(str(base_fare_multiplier))
+    adjusted_base_fare = base_fare.apply(Rate.of(base_fare_multiplier))
     
     # Calculate seat discount
-    if number_of_seats > 1 and seat_discount > 0:
-        discount_per_seat = adjusted_base_fare * Decimal(str(seat_discount))
-        fare_per_seat = adjusted_base_fare - discount_per_seat
-    else:
-        fare_per_seat = adjusted_base_fare
+    discounted = number_of_seats > 1 and seat_discount > 0
+    discount_per_seat = adjusted_base_fare.apply(Rate.of(seat_discount)) if discounted else Money.ZERO
+    fare_per_seat = adjusted_base_fare - discount_per_seat
     
     # Calculate total fare
     total_fare = fare_per_seat * number_of_seats
     
+    if isinstance(fare_matrix, FareTable):
+        distance_km = fare_matrix.distance(from_stop_order, to_stop_order)
+        rule_version = fare_matrix.rule_version(from_stop_order, to_stop_order)
+    else:
+        fare_data = fare_matrix.get((from_stop_order, to_stop_order), {})
+        distance_km = fare_data.get('distance_km', 0)
+        rule_version = fare_data.get('pricing_rule_version', 0)
+    
     # Prepare breakdown
     breakdown = {
-        'base_fare_per_seat': float(base_fare),
-        'adjusted_base_fare_per_seat': float(adjusted_base_fare),
-        'fare_per_seat': float(fare_per_seat),
+        'base_fare_per_seat': base_fare.rupees,
+        'adjusted_base_fare_per_seat': adjusted_base_fare.rupees,
+        'fare_per_seat': fare_per_seat.rupees,
         'number_of_seats': number_of_seats,
-        'total_fare': float(total_fare),
+        'total_fare': total_fare.rupees,
         'is_peak_hour': peak_hour,
         'base_fare_multiplier': base_fare_multiplier,
-        'seat_discount_applied': seat_discount > 0 and number_of_seats > 1,
-        'discount_per_seat': float(adjusted_base_fare * Decimal(str(seat_discount))) if seat_discount > 0 and number_of_seats > 1 else 0.0,
-        'distance_km': fare_matrix.get((from_stop_order, to_stop_order), {}).get('distance_km', 0),
+        'seat_discount_applied': discounted,
+        'discount_per_seat': discount_per_seat.rupees,
+        'distance_km': distance_km,
+        'pricing_rule_version': rule_version,
         'calculation_time': booking_time.isoformat()
     }
     
@@ -131,32 +151,163 @@ def get_fare_matrix_for_route(route_id: int) -> Dict[Tuple[int, int], Dict]:
     """
     Get fare matrix for a specific route
     
+    Served from the versioned in-process cache; the database is only read
+    when the route's fares or stops changed since the last build.
+    
+    Args:
+        route_id: ID of the route
+    
+    Returns:
+        Read-only FareTable mapping (from_order, to_order) to fare data
+    """
+    from .fare_cache import fare_matrix_cache
+    
+    return fare_matrix_cache.get(route_id)
+
+def load_fare_matrix(route_id: int) -> FareTable:
+    """
+    Build the fare matrix for a route from the database
+    
     Args:
         route_id: ID of the route
     
     Returns:
-        Dictionary mapping (from_order, to_order) to fare data
+        FareTable mapping (from_order, to_order) to fare data
     """
-    from ..models import FareMatrix
+    from ..models import FareMatrix, RouteStop
     
-    fare_matrix = {}
-    fares = FareMatrix.objects.filter(
+    rows = list(FareMatrix.objects.filter(
         route_id=route_id,
         is_active=True
-    ).select_related('from_stop', 'to_stop')
-    
-    for fare in fares:
-        key = (fare.from_stop.stop_order, fare.to_stop.stop_order)
-        fare_matrix[key] = {
-            'base_fare': float(fare.base_fare),
-            'peak_fare': float(fare.peak_fare),
-            'off_peak_fare': float(fare.off_peak_fare),
-            'distance_km': float(fare.distance_km),
-            'from_stop_name': fare.from_stop.stop_name,
-            'to_stop_name': fare.to_stop.stop_name
-        }
+    ).values_list(
+        'from_stop__stop_order', 'to_stop__stop_order',
+        'distance_km', 'base_fare', 'peak_fare', 'off_peak_fare', 'pricing_rule_version'
+    ))
+    stops = list(
+        RouteStop.objects.filter(route_id=route_id).order_by('stop_order').values_list(
+            'stop_order', 'stop_name', 'latitude', 'longitude'
+        )
+    )
+    stop_names = {order: name for order, name, _, _ in stops}
+    origin = None
+    if stops and stops[0][2] is not None and stops[0][3] is not None:
+        origin = (float(stops[0][2]), float(stops[0][3]))
     
-    return fare_matrix
+    return build_fare_table(rows, stop_names, origin)
+
+def quote_fares(
+    quotes: List[Dict],
+    booking_time: Optional[datetime] = None,
+    base_fare_multiplier: float = 1.0,
+    seat_discount: float = 0.0
+) -> List[Dict[str, any]]:
+    """
+    Calculate fare breakdowns for many (route, from, to, seats) combinations
+    
+    The multiplier/discount conversions are resolved once per batch, each
+    route's fare matrix and each peak calendar region once per batch, and
+    quotes for the same segment share their per-seat arithmetic.
+    
+    Args:
+        quotes: Dictionaries with 'route_id' (Route pk), 'from_stop_order',
+            'to_stop_order' and optional 'number_of_seats' (default 1)
+        booking_time: Time of booking (for peak hour calculation)
+        base_fare_multiplier: Multiplier for base fare (for special pricing)
+        seat_discount: Discount per seat for multiple seats (0.0 to 1.0)
+    
+    Returns:
+        One dictionary per quote, in order: the request fields plus the same
+        breakdown calculate_booking_fare returns, or an 'error' key
+    """
+    if booking_time is None:
+        booking_time = timezone.now()
+    
+    calendar = pricing_rules.current().peak_calendar
+    peak_by_region = {}
+    calculation_time = booking_time.isoformat()
+    multiplier = Rate.of(base_fare_multiplier)
+    discount = Rate.of(seat_discount)
+    
+    matrices = {}
+    segments = {}
+    results = []
+    for quote in quotes:
+        route_id = quote.get('route_id')
+        result = {
+            'route_id': route_id,
+            'from_stop_order': quote.get('from_stop_order'),
+            'to_stop_order': quote.get('to_stop_order'),
+            'number_of_seats': quote.get('number_of_seats', 1),
+        }
+        results.append(result)
+        
+        try:
+            from_order = int(result['from_stop_order'])
+            to_order = int(result['to_stop_order'])
+            seats = int(result['number_of_seats'])
+        except (TypeError, ValueError):
+            result['error'] = 'from_stop_order, to_stop_order and number_of_seats must be integers'
+            continue
+        if seats < 1:
+            result['error'] = 'Number of seats must be greater than 0'
+            continue
+        
+        # Per-seat amounts depend only on the segment, so compute each one once
+        key = (route_id, from_order, to_order)
+        segment = segments.get(key)
+        if segment is None:
+            if route_id not in matrices:
+                fare_matrix = get_fare_matrix_for_route(route_id)
+                region = fare_matrix_region(fare_matrix)
+                if region not in peak_by_region:
+                    peak_by_region[region] = calendar.is_peak(booking_time, region)
+                matrices[route_id] = (fare_matrix, peak_by_region[region])
+            fare_matrix, peak_hour = matrices[route_id]
+            try:
+                base_fare = calculate_distance_fare(from_order, to_order, fare_matrix, peak_hour)
+            except ValueError as e:
+                segment = segments[key] = {'error': str(e)}
+            else:
+                adjusted_base_fare = base_fare.apply(multiplier)
+                if isinstance(fare_matrix, FareTable):
+                    distance_km = fare_matrix.distance(from_order, to_order)
+                    rule_version = fare_matrix.rule_version(from_order, to_order)
+                else:
+                    fare_data = fare_matrix.get((from_order, to_order), {})
+                    distance_km = fare_data.get('distance_km', 0)
+                    rule_version = fare_data.get('pricing_rule_version', 0)
+                segment = segments[key] = {
+                    'base_fare': base_fare,
+                    'adjusted_base_fare': adjusted_base_fare,
+                    'discount_per_seat': adjusted_base_fare.apply(discount),
+                    'distance_km': distance_km,
+                    'pricing_rule_version': rule_version,
+                    'is_peak_hour': peak_hour,
+                }
+        if 'error' in segment:
+            result['error'] = segment['error']
+            continue
+        
+        discounted = seats > 1 and seat_discount > 0
+        adjusted_base_fare = segment['adjusted_base_fare']
+        discount_per_seat = segment['discount_per_seat'] if discounted else Money.ZERO
+        fare_per_seat = adjusted_base_fare - discount_per_seat
+        result.update({
+            'base_fare_per_seat': segment['base_fare'].rupees,
+            'adjusted_base_fare_per_seat': adjusted_base_fare.rupees,
+            'fare_per_seat': fare_per_seat.rupees,
+            'number_of_seats': seats,
+            'total_fare': (fare_per_seat * seats).rupees,
+            'is_peak_hour': segment['is_peak_hour'],
+            'base_fare_multiplier': base_fare_multiplier,
+            'seat_discount_applied': discounted,
+            'discount_per_seat': discount_per_seat.rupees,
+            'distance_km': segment['distance_km'],
+            'pricing_rule_version': segment['pricing_rule_version'],
+            'calculation_time': calculation_time,
+        })
+    
+    return results
 
 def validate_fare_calculation(
     from_stop_order: int,
@@ -195,23 +346,15 @@ def get_available_seats_for_trip(trip_id: int) -> List[int]:
     Returns:
         List of available seat numbers
     """
-    from ..models import Trip, SeatAssignment
+    from ..models import Trip
+    from ..services.seats import load_seat_map, taken_mask, mask_seats, all_seats_mask
     
     try:
-        trip = Trip.objects.get(id=trip_id)
-        total_seats = trip.total_seats
-        
-        # Get occupied seats
-        occupied_seats = SeatAssignment.objects.filter(
-            trip_id=trip_id
-        ).values_list('seat_number', flat=True)
-        
-        # Return available seats
-        all_seats = set(range(1, total_seats + 1))
-        occupied_seats_set = set(occupied_seats)
-        available_seats = sorted(list(all_seats - occupied_seats_set))
+        trip = Trip.objects.only('id', 'route_id', 'total_seats', 'seat_map').get(id=trip_id)
         
-        return available_seats
+        # Seats free on every leg of the trip, from the per-leg seat map
+        masks = load_seat_map(trip)
+        return mask_seats(all_seats_mask(trip.total_seats) & ~taken_mask(masks, 1, len(masks) + 1))
     
     except Trip.DoesNotExist:
         return []
@@ -0,0 +1,159 @@
+"""
+Generate FareMatrix rows for every stop pair of a route from its geometry
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .distances import StopCoordinates, leg_distances, cumulative_distances, along_route_matrix
+from .money import Money, RATE_SCALE, div_half_up
+from .pricing_rules import DEFAULT_RULES, DEFAULT_RULES_VERSION, METRES_PER_KM, compile_rules
+
+# Segment pricing from the built-in rule set (standard four-wheeler on petrol);
+# generate_fare_matrix uses the published set instead
+DEFAULT_PRICING_RULES = compile_rules(DEFAULT_RULES_VERSION, DEFAULT_RULES).segment_rules()
+
+# FareMatrix.distance_km must be at least 0.1
+MIN_SEGMENT_M = 100
+
+FareRow = Tuple[int, int, Decimal, Decimal, Decimal, Decimal]
+
+
+def _distance_factor_ppm(distance_m: int, tiers) -> int:
+    for limit_m, factor_ppm in tiers:
+        if limit_m is None or distance_m <= limit_m:
+            return factor_ppm
+    return tiers[-1][1]
+
+
+def compute_segment_fares(cumulative_km: Sequence[float], rules: Optional[Dict] = None) -> List[FareRow]:
+    """
+    Price every forward stop pair from cumulative stop distances
+
+    Pure integer arithmetic (metres, paisa, parts per million) with no database
+    access, so it can run in worker processes and gives identical results
+    wherever it runs.
+
+    Args:
+        cumulative_km: Distance from the first stop to each stop, in stop order
+        rules: PricingRules.segment_rules() output (defaults to DEFAULT_PRICING_RULES)
+
+    Returns:
+        (from_index, to_index, distance_km, base_fare, peak_fare, off_peak_fare)
+        tuples with 0-based stop indexes
+    """
+    rules = rules or DEFAULT_PRICING_RULES
+    rate = rules['rate_per_km_paisa']
+    tiers = rules['distance_tiers_ppm']
+    peak = rules['peak_multiplier_ppm']
+    off_peak = rules['off_peak_multiplier_ppm']
+    minimum = rules['minimum_fare_paisa']
+    per_km_scale = METRES_PER_KM * RATE_SCALE
+
+    # Whole metres from the first stop, so pair distances are exact integer differences
+    pairs = along_route_matrix([round(km * METRES_PER_KM) for km in cumulative_km])
+    rows = []
+    n = len(pairs)
+    for i in range(n - 1):
+        row = pairs[i]
+        for j in range(i + 1, n):
+            distance = max(int(row[j]), MIN_SEGMENT_M)
+            base = max(div_half_up(rate * distance * _distance_factor_ppm(distance, tiers), per_km_scale), minimum)
+            rows.append((
+                i, j,
+                Decimal(div_half_up(distance, 10)).scaleb(-2),
+                Money(base).to_decimal(),
+                Money(max(div_half_up(base * peak, RATE_SCALE), minimum)).to_decimal(),
+                Money(max(div_half_up(base * off_peak, RATE_SCALE), minimum)).to_decimal(),
+            ))
+    return rows
+
+
+def stop_cumulative_km(stops: Sequence[Tuple]) -> List[float]:
+    """Cumulative distances for (pk, stop_order, latitude, longitude) rows in stop order"""
+    legs = leg_distances(StopCoordinates((lat, lng) for _, _, lat, lng in stops))
+    return list(cumulative_distances(legs))
+
+
+def current_segment_rules() -> Dict:
+    """Segment rules derived from the published pricing rule set"""
+    from .pricing_rules import pricing_rules
+
+    return pricing_rules.current().segment_rules()
+
+
+def save_segment_fares(route_id: int, stops: Sequence[Tuple], fares: Sequence[FareRow],
+                       rule_version: int = 0) -> int:
+    """
+    Upsert computed fares for a route in a single transaction
+
+    Args:
+        route_id: Route primary key
+        stops: (pk, stop_order, latitude, longitude) rows in stop order
+        fares: Output of compute_segment_fares for those stops
+        rule_version: Pricing rule set version the fares were computed with
+
+    Returns:
+        Number of FareMatrix rows written
+    """
+    from django.db import transaction
+    from ..models import FareMatrix
+    from .fare_cache import bump_fare_matrix_version
+
+    rows = [
+        FareMatrix(
+            route_id=route_id,
+            from_stop_id=stops[i][0],
+            to_stop_id=stops[j][0],
+            distance_km=distance,
+            base_fare=base,
+            peak_fare=peak,
+            off_peak_fare=off_peak,
+            pricing_rule_version=rule_version,
+            is_active=True,
+        )
+        for i, j, distance, base, peak, off_peak in fares
+    ]
+    with transaction.atomic():
+        FareMatrix.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['route', 'from_stop', 'to_stop'],
+            update_fields=['distance_km', 'base_fare', 'peak_fare', 'off_peak_fare',
+                           'pricing_rule_version', 'is_active', 'updated_at'],
+        )
+        # bulk_create skips FareMatrix.save, so invalidate cached matrices explicitly
+        bump_fare_matrix_version(route_id)
+    return len(rows)
+
+
+def load_route_stops(route_ids: Sequence[int]) -> Dict[int, List[Tuple]]:
+    """Active stops of several routes in one query, grouped by route and ordered"""
+    from ..models import RouteStop
+
+    stops = {route_id: [] for route_id in route_ids}
+    rows = RouteStop.objects.filter(
+        route_id__in=route_ids,
+        is_active=True,
+    ).order_by('route_id', 'stop_order').values_list('route_id', 'pk', 'stop_order', 'latitude', 'longitude')
+    for route_id, pk, stop_order, latitude, longitude in rows:
+        stops[route_id].append((pk, stop_order, latitude, longitude))
+    return stops
+
+
+def generate_fare_matrix(route, rules: Optional[Dict] = None) -> int:
+    """
+    Compute and store fares for every stop pair of a route
+
+    Args:
+        route: Route instance
+        rules: PricingRules.segment_rules() output (defaults to the published pricing rule set)
+
+    Returns:
+        Number of FareMatrix rows written
+    """
+    stops = load_route_stops([route.pk])[route.pk]
+    if len(stops) < 2:
+        return 0
+    rules = rules or current_segment_rules()
+    fares = compute_segment_fares(stop_cumulative_km(stops), rules)
+    return save_segment_fares(route.pk, stops, fares, rules.get('version', 0))
@@ -0,0 +1,157 @@
+"""
+Compact fare matrix: upper-triangular arrays indexed by stop order
+"""
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections.abc import Mapping
+
+from .money import Money, PAISA_PER_RUPEE
+
+Key = Tuple[int, int]
+
+
+class FareTable(Mapping):
+    """
+    Fares for every (from_stop_order, to_stop_order) pair of a route
+
+    Stores distances in a packed 'd' array and base, peak and off-peak fares
+    as integer paisa in packed 'q' arrays over the n(n-1)/2 forward pairs, plus a presence byte and the pricing rule
+    version each fare was generated with, instead of a dict per pair. Behaves as a read-only mapping from (from, to) to the same
+    fare dictionaries get_fare_matrix_for_route used to return (fares in
+    rupees); hot paths call fare() to get Money without building them.
+    """
+
+    __slots__ = ('stop_count', 'stop_names', 'origin', '_present', '_distance', '_base', '_peak', '_off_peak',
+                 '_rule_version')
+
+    FIELDS = ('distance_km', 'base_fare', 'peak_fare', 'off_peak_fare')
+
+    def __init__(self, stop_count: int, stop_names: Optional[Dict[int, str]] = None,
+                 origin: Optional[Tuple[float, float]] = None):
+        self.stop_count = stop_count
+        # First stop (latitude, longitude), used to pick the route's peak-hour region
+        self.origin = origin
+        names = stop_names or {}
+        self.stop_names = [names.get(order, '') for order in range(1, stop_count + 1)]
+        pairs = stop_count * (stop_count - 1) // 2
+        self._present = array('b', bytes(pairs))
+        self._distance = array('d', bytes(8 * pairs))
+        self._base = array('q', bytes(8 * pairs))
+        self._peak = array('q', bytes(8 * pairs))
+        self._off_peak = array('q', bytes(8 * pairs))
+        self._rule_version = array('L', [0]) * pairs
+
+    def _index(self, from_order: int, to_order: int) -> int:
+        """Offset of a forward pair in the triangular arrays, or -1 if out of range"""
+        n = self.stop_count
+        if not (1 <= from_order < to_order <= n):
+            return -1
+        i = from_order - 1
+        return i * n - i * (i + 1) // 2 + (to_order - from_order - 1)
+
+    def set(self, from_order: int, to_order: int, distance_km: float,
+            base_fare: Money, peak_fare: Money, off_peak_fare: Money, rule_version: int = 0):
+        index = self._index(from_order, to_order)
+        if index < 0:
+            raise ValueError(f"Invalid route segment {from_order} to {to_order}")
+        self._present[index] = 1
+        self._distance[index] = distance_km
+        self._base[index] = base_fare.paisa
+        self._peak[index] = peak_fare.paisa
+        self._off_peak[index] = off_peak_fare.paisa
+        self._rule_version[index] = rule_version
+
+    def has(self, from_order: int, to_order: int) -> bool:
+        index = self._index(from_order, to_order)
+        return index >= 0 and bool(self._present[index])
+
+    def fare(self, from_order: int, to_order: int, peak: bool) -> Optional[Money]:
+        """Peak or off-peak fare for one seat, or None if the pair has no fare"""
+        index = self._index(from_order, to_order)
+        if index < 0 or not self._present[index]:
+            return None
+        return Money(self._peak[index] if peak else self._off_peak[index])
+
+    def distance(self, from_order: int, to_order: int) -> float:
+        index = self._index(from_order, to_order)
+        if index < 0 or not self._present[index]:
+            return 0
+        return self._distance[index]
+
+    def rule_version(self, from_order: int, to_order: int) -> int:
+        """Pricing rule set version the pair's fare was generated with (0 = built-in defaults)"""
+        index = self._index(from_order, to_order)
+        if index < 0 or not self._present[index]:
+            return 0
+        return self._rule_version[index]
+
+    # Mapping interface, for code written against the old dict-of-dicts matrix
+
+    def __getitem__(self, key: Key) -> Dict:
+        from_order, to_order = key
+        index = self._index(from_order, to_order)
+        if index < 0 or not self._present[index]:
+            raise KeyError(key)
+        return {
+            'base_fare': self._base[index] / PAISA_PER_RUPEE,
+            'peak_fare': self._peak[index] / PAISA_PER_RUPEE,
+            'off_peak_fare': self._off_peak[index] / PAISA_PER_RUPEE,
+            'distance_km': self._distance[index],
+            'pricing_rule_version': self._rule_version[index],
+            'from_stop_name': self.stop_names[from_order - 1],
+            'to_stop_name': self.stop_names[to_order - 1],
+        }
+
+    def __contains__(self, key) -> bool:
+        try:
+            from_order, to_order = key
+        except (TypeError, ValueError):
+            return False
+        return self.has(from_order, to_order)
+
+    def __iter__(self) -> Iterator[Key]:
+        index = 0
+        for from_order in range(1, self.stop_count):
+            for to_order in range(from_order + 1, self.stop_count + 1):
+                if self._present[index]:
+                    yield (from_order, to_order)
+                index += 1
+
+    def __len__(self) -> int:
+        return sum(self._present)
+
+    def __repr__(self):
+        return f"<FareTable stops={self.stop_count} fares={len(self)}>"
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+
+def build_fare_table(rows: List[Tuple], stop_names: Dict[int, str],
+                     origin: Optional[Tuple[float, float]] = None) -> FareTable:
+    """
+    Build a FareTable from fare rows
+
+    Args:
+        rows: (from_order, to_order, distance_km, base_fare, peak_fare, off_peak_fare,
+            pricing_rule_version) tuples
+        stop_names: Mapping of stop order to stop name
+        origin: (latitude, longitude) of the first stop, if known
+
+    Returns:
+        Populated FareTable sized to the highest stop order seen
+    """
+    stop_count = max(
+        [order for row in rows for order in row[:2]] + list(stop_names.keys()),
+        default=0,
+    )
+    table = FareTable(stop_count, stop_names, origin)
+    for from_order, to_order, distance_km, base_fare, peak_fare, off_peak_fare, rule_version in rows:
+        if from_order < to_order:
+            table.set(from_order, to_order, float(distance_km), Money.of(base_fare),
+                      Money.of(peak_fare), Money.of(off_peak_fare), rule_version or 0)
+    return table
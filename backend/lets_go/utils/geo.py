@@ -0,0 +1,217 @@
+"""
+Geospatial helpers for route stops (geohash cells, bounding boxes, haversine)
+"""
+from math import radians, degrees, cos, sin, asin, sqrt, ceil
+from typing import Dict, List, Optional, Set, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+
+# Precision stored on RouteStop.geohash (~4.8m x 4.8m cells)
+GEOHASH_PRECISION = 9
+
+# Upper bound on the number of geohash cells used to cover a search box
+MAX_COVER_CELLS = 12
+
+_GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Great-circle distance between two points in kilometers
+    """
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    return 2 * asin(sqrt(a)) * EARTH_RADIUS_KM
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Encode a coordinate as a geohash string of the given precision
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Return (height, width) in degrees of a geohash cell at the given precision
+    """
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius_km
+    """
+    lat_delta = degrees(radius_km / EARTH_RADIUS_KM)
+    # Longitude degrees shrink towards the poles; guard against cos(90°) == 0
+    lat_cos = max(cos(radians(latitude)), 1e-6)
+    lng_delta = degrees(radius_km / (EARTH_RADIUS_KM * lat_cos))
+    return (
+        max(latitude - lat_delta, -90.0),
+        min(latitude + lat_delta, 90.0),
+        max(longitude - lng_delta, -180.0),
+        min(longitude + lng_delta, 180.0),
+    )
+
+
+def geohash_cover(min_lat: float, max_lat: float, min_lng: float, max_lng: float) -> Set[str]:
+    """
+    Return the set of geohash prefixes covering a bounding box
+
+    Picks the finest precision whose cells cover the box with at most
+    MAX_COVER_CELLS prefixes, so each prefix maps to an indexed LIKE 'prefix%' scan.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_height, cell_width = geohash_cell_size(precision)
+        lat_steps = int(ceil((max_lat - min_lat) / cell_height)) + 1
+        lng_steps = int(ceil((max_lng - min_lng) / cell_width)) + 1
+        if lat_steps * lng_steps > MAX_COVER_CELLS and precision > 1:
+            continue
+
+        cells = set()
+        for i in range(lat_steps + 1):
+            lat = min(min_lat + i * cell_height, max_lat)
+            for j in range(lng_steps + 1):
+                lng = min(min_lng + j * cell_width, max_lng)
+                cells.add(geohash_encode(lat, lng, precision))
+        return cells
+
+    return set()
+
+
+def find_nearby_stops(
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    limit: Optional[int] = None,
+    active_only: bool = True
+) -> List[Dict]:
+    """
+    Find route stops within radius_km of a point, nearest first
+
+    Candidates come from the geohash and latitude/longitude indexes; the exact
+    haversine check only runs on that candidate set.
+
+    Args:
+        latitude: Search point latitude
+        longitude: Search point longitude
+        radius_km: Search radius in kilometers
+        limit: Maximum number of stops to return (None for all matches)
+        active_only: Restrict to active stops on active routes
+
+    Returns:
+        List of stop dictionaries with a 'distance_km' key
+    """
+    from django.db.models import Q
+    from ..models import RouteStop
+
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+
+    cell_filter = Q()
+    for prefix in geohash_cover(min_lat, max_lat, min_lng, max_lng):
+        cell_filter |= Q(geohash__startswith=prefix)
+
+    candidates = RouteStop.objects.filter(
+        cell_filter,
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lng, max_lng),
+    )
+    if active_only:
+        candidates = candidates.filter(is_active=True, route__is_active=True)
+
+    matches = []
+    for stop in candidates.values(
+        'id', 'route_id', 'route__route_id', 'route__route_name',
+        'stop_name', 'stop_order', 'latitude', 'longitude', 'address'
+    ):
+        distance = haversine_km(latitude, longitude, float(stop['latitude']), float(stop['longitude']))
+        if distance <= radius_km:
+            stop['distance_km'] = distance
+            matches.append(stop)
+
+    matches.sort(key=lambda stop: stop['distance_km'])
+    if limit is not None:
+        matches = matches[:limit]
+    return matches
+
+
+def match_route_segments(
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    radius_km: float
+) -> Dict[int, Dict]:
+    """
+    Find routes with a stop near the origin followed by a later stop near the destination
+
+    Both ends are resolved with indexed candidate lookups (find_nearby_stops);
+    only the candidate stops are paired up per route.
+
+    Args:
+        origin: (latitude, longitude) of the passenger's pickup point
+        destination: (latitude, longitude) of the passenger's drop-off point
+        radius_km: Maximum walking distance to a stop in kilometers
+
+    Returns:
+        Dictionary mapping route pk to the best boarding/alighting stop pair
+    """
+    boarding_candidates = find_nearby_stops(origin[0], origin[1], radius_km)
+    if not boarding_candidates:
+        return {}
+    alighting_candidates = find_nearby_stops(destination[0], destination[1], radius_km)
+
+    boarding_by_route = {}
+    for stop in boarding_candidates:
+        boarding_by_route.setdefault(stop['route_id'], []).append(stop)
+
+    matches = {}
+    for alight in alighting_candidates:
+        for board in boarding_by_route.get(alight['route_id'], []):
+            # Pickup must come before drop-off along the route direction
+            if board['stop_order'] >= alight['stop_order']:
+                continue
+            walk_km = board['distance_km'] + alight['distance_km']
+            best = matches.get(alight['route_id'])
+            if best is None or walk_km < best['walk_distance_km']:
+                matches[alight['route_id']] = {
+                    'boarding_stop': board,
+                    'alighting_stop': alight,
+                    'walk_distance_km': walk_km,
+                }
+
+    return matches
@@ -0,0 +1,172 @@
+"""
+Idempotency-Key support for write endpoints
+
+A client that may retry a write (flaky mobile networks) sends a unique
+Idempotency-Key header. The first request with a key claims it by inserting
+an IdempotencyRecord; its response is stored and replayed for every retry
+with the same key until the record expires (24 hours by default). A retry
+that arrives while the first request is still running gets 409, and reusing
+a key with a different request body gets 422. Server errors are not stored,
+so the client can retry them with the same key. Keys are scoped to the
+endpoint and the calling user, so two clients that happen to pick the same
+key never see each other's responses.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+DEFAULT_IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+
+# A claim whose request never finished (e.g. the worker was killed) frees the key after this long
+IN_PROGRESS_TIMEOUT = timedelta(minutes=2)
+
+MAX_KEY_LENGTH = 255
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Body fields naming the caller, for clients without a session, in order of preference
+ACTOR_FIELDS = ('user_id', 'passenger_id', 'driver_id')
+
+
+def idempotency_ttl() -> timedelta:
+    """How long responses are replayed (settings.IDEMPOTENCY_KEY_TTL_SECONDS)"""
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', DEFAULT_IDEMPOTENCY_TTL_SECONDS))
+
+
+def request_fingerprint(request) -> str:
+    """SHA-256 of the method, path and body, to detect a key reused for a different request"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(b'\0')
+    digest.update(request.path.encode())
+    digest.update(b'\0')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def request_actor(request) -> str:
+    """The calling user: the session's user, else the user id the body names, else ''"""
+    session = getattr(request, 'session', None)
+    user_id = session.get('user_id') if session is not None else None
+    if user_id is None:
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            user_id = next((data[field] for field in ACTOR_FIELDS if data.get(field) not in (None, '')), None)
+    return '' if user_id is None else str(user_id)
+
+
+def request_scope(request) -> str:
+    """Path and calling user the key is scoped to"""
+    return f"{request.path}#user={request_actor(request)}"[:MAX_KEY_LENGTH]
+
+
+def _claim(key: str, scope: str, fingerprint: str) -> Tuple[Optional[object], bool]:
+    """
+    Insert an in-progress record for the key
+
+    Returns:
+        (record, True) if this request owns the key, else (existing record or None, False)
+    """
+    from ..models import IdempotencyRecord
+
+    now = timezone.now()
+    IdempotencyRecord.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+    try:
+        # Savepoint so a lost race does not break a transaction the caller may be in
+        with transaction.atomic():
+            record = IdempotencyRecord.objects.create(
+                key=key,
+                scope=scope,
+                request_hash=fingerprint,
+                expires_at=now + IN_PROGRESS_TIMEOUT,
+            )
+        return record, True
+    except IntegrityError:
+        return IdempotencyRecord.objects.filter(scope=scope, key=key).first(), False
+
+
+def _replay(record) -> HttpResponse:
+    response = HttpResponse(record.response_body, status=record.status_code, content_type=record.content_type)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _store(record, response):
+    from ..models import IdempotencyRecord
+
+    IdempotencyRecord.objects.filter(pk=record.pk).update(
+        status_code=response.status_code,
+        response_body=response.content.decode(response.charset),
+        content_type=response.get('Content-Type', ''),
+        expires_at=timezone.now() + idempotency_ttl(),
+    )
+
+
+def idempotent(view):
+    """
+    Make a write view safe to retry with an Idempotency-Key header
+
+    Requests without the header, and GET/HEAD/OPTIONS requests, run as before.
+    Keys are scoped to the request path and the calling user (request_actor),
+    so the same key may be used on different endpoints or by different users.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or request.method in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({
+                'success': False,
+                'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'
+            }, status=400)
+
+        fingerprint = request_fingerprint(request)
+        record, claimed = _claim(key, request_scope(request), fingerprint)
+        if not claimed:
+            if record is None or not record.is_complete:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'A request with this Idempotency-Key is still being processed'
+                }, status=409)
+            if record.request_hash != fingerprint:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'This Idempotency-Key was already used for a different request'
+                }, status=422)
+            return _replay(record)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500 or response.streaming:
+            # Not a final outcome; let the client retry with the same key
+            record.delete()
+        else:
+            _store(record, response)
+        return response
+
+    return wrapper
+
+
+def purge_expired_records(now=None) -> int:
+    """Delete idempotency records past their expiry; returns the number deleted"""
+    from ..models import IdempotencyRecord
+
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
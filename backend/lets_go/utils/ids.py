@@ -0,0 +1,99 @@
+"""
+Monotonic, k-sortable identifiers for bookings, trips and routes
+
+An ID is a one-letter prefix followed by 26 Crockford base32 characters: a
+48-bit millisecond timestamp and an 80-bit random tail (the ULID layout).
+IDs sort by creation time as plain strings, so they index well, and two
+workers collide only if they draw the same 80 random bits in the same
+millisecond. Within one process the tail is incremented instead of
+redrawn while the clock stands still, so IDs are strictly increasing even
+at thousands per millisecond.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+# Crockford base32: digits and letters without I, L, O, U, in ASCII order so strings sort like numbers
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+TIMESTAMP_BITS = 48
+RANDOM_BITS = 80
+ENCODED_LENGTH = 26
+
+BOOKING_PREFIX = 'B'
+TRIP_PREFIX = 'T'
+ROUTE_PREFIX = 'R'
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class SortableIdGenerator:
+    """Thread-safe generator of strictly increasing IDs within a process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def new(self, prefix: str = '') -> str:
+        """
+        Next ID with the given prefix
+
+        Args:
+            prefix: Type marker, e.g. 'B' for bookings
+
+        Returns:
+            prefix + 26 base32 characters, greater than every ID this generator returned before
+        """
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._last_random = secrets.randbits(RANDOM_BITS)
+            else:
+                # Same millisecond, or the clock stepped back: keep the last timestamp and count up
+                self._last_random += 1
+                if self._last_random >> RANDOM_BITS:
+                    self._last_ms += 1
+                    self._last_random = secrets.randbits(RANDOM_BITS)
+            value = (self._last_ms << RANDOM_BITS) | self._last_random
+        return prefix + _encode(value)
+
+
+id_generator = SortableIdGenerator()
+
+
+def new_booking_id() -> str:
+    return id_generator.new(BOOKING_PREFIX)
+
+
+def new_trip_id() -> str:
+    return id_generator.new(TRIP_PREFIX)
+
+
+def new_route_id() -> str:
+    return id_generator.new(ROUTE_PREFIX)
+
+
+def id_created_at(value: str) -> datetime:
+    """
+    Creation time embedded in a generated ID
+
+    Raises:
+        ValueError: If the value is not a prefixed 26-character sortable ID
+    """
+    encoded = value[-ENCODED_LENGTH:].upper()
+    if len(encoded) != ENCODED_LENGTH or any(char not in ALPHABET for char in encoded):
+        raise ValueError(f"{value!r} is not a sortable ID")
+    timestamp_ms = 0
+    for char in encoded[:10]:
+        timestamp_ms = timestamp_ms * 32 + ALPHABET.index(char)
+    # The first 10 characters hold 50 bits; the top 2 are always zero for a 48-bit timestamp
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=dt_timezone.utc)
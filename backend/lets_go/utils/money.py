@@ -0,0 +1,185 @@
+"""
+Integer money arithmetic for fares: amounts in paisa, rates in parts per million
+
+Amounts are converted from Decimal/str/float only at the I/O boundary
+(database rows, request JSON, rule tables) and back to rupees only when a
+breakdown is serialized. Every operation in between is integer arithmetic
+with one explicit rounding step, ROUND_HALF_UP (halves away from zero) to
+the nearest paisa, so the same inputs always produce the same totals.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Union
+
+PAISA_PER_RUPEE = 100
+
+# Rates (multipliers, discounts, km per unit of fuel) are integers scaled by this
+RATE_SCALE = 1_000_000
+
+_PAISA = Decimal('0.01')
+_RATE_QUANTUM = Decimal('0.000001')
+
+Number = Union[int, float, str, Decimal]
+
+
+def div_half_up(numerator: int, denominator: int) -> int:
+    """Integer division rounded half away from zero, matching Decimal ROUND_HALF_UP"""
+    if denominator == 0:
+        raise ZeroDivisionError('division by zero')
+    negative = (numerator < 0) != (denominator < 0)
+    quotient, remainder = divmod(abs(numerator), abs(denominator))
+    if 2 * remainder >= abs(denominator):
+        quotient += 1
+    return -quotient if negative else quotient
+
+
+class Rate:
+    """Dimensionless factor such as a multiplier or discount, stored in parts per million"""
+
+    __slots__ = ('ppm',)
+
+    def __init__(self, ppm: int):
+        object.__setattr__(self, 'ppm', int(ppm))
+
+    @classmethod
+    def of(cls, value: Number) -> 'Rate':
+        """Convert a boundary value (e.g. '1.30', 0.05) to a Rate"""
+        if isinstance(value, Rate):
+            return value
+        quantized = Decimal(str(value)).quantize(_RATE_QUANTUM, rounding=ROUND_HALF_UP)
+        return cls(int(quantized * RATE_SCALE))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Rate is immutable')
+
+    def complement(self) -> 'Rate':
+        """1 - rate, e.g. the share paid after a discount"""
+        return Rate(RATE_SCALE - self.ppm)
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.ppm) / RATE_SCALE
+
+    def __float__(self) -> float:
+        return self.ppm / RATE_SCALE
+
+    def percent(self) -> float:
+        return self.ppm / (RATE_SCALE // 100)
+
+    def __eq__(self, other):
+        return isinstance(other, Rate) and self.ppm == other.ppm
+
+    def __hash__(self):
+        return hash(('Rate', self.ppm))
+
+    def __str__(self):
+        return str(self.to_decimal().normalize())
+
+    def __repr__(self):
+        return f"Rate({self})"
+
+    def __reduce__(self):
+        return (Rate, (self.ppm,))
+
+
+Rate.ONE = Rate(RATE_SCALE)
+Rate.ZERO = Rate(0)
+
+
+class Money:
+    """Amount in Pakistani rupees, stored as an integer number of paisa"""
+
+    __slots__ = ('paisa',)
+
+    def __init__(self, paisa: int = 0):
+        object.__setattr__(self, 'paisa', int(paisa))
+
+    @classmethod
+    def of(cls, rupees: Number) -> 'Money':
+        """Convert a boundary value in rupees (DecimalField, JSON number, rule string) to Money"""
+        if isinstance(rupees, Money):
+            return rupees
+        quantized = Decimal(str(rupees)).quantize(_PAISA, rounding=ROUND_HALF_UP)
+        return cls(int(quantized * PAISA_PER_RUPEE))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Money is immutable')
+
+    def apply(self, *rates: Rate, numerator: int = 1, denominator: int = 1) -> 'Money':
+        """
+        Multiply by rates and an integer ratio with a single rounding step
+
+        Args:
+            rates: Factors applied in full precision
+            numerator: Integer multiplier, e.g. a distance in metres
+            denominator: Integer divisor, e.g. 1000 metres per km
+
+        Returns:
+            Product rounded half up to the nearest paisa
+        """
+        top = self.paisa * numerator
+        bottom = denominator
+        for rate in rates:
+            top *= rate.ppm
+            bottom *= RATE_SCALE
+        return Money(div_half_up(top, bottom))
+
+    def __add__(self, other: 'Money') -> 'Money':
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.paisa + other.paisa)
+
+    def __sub__(self, other: 'Money') -> 'Money':
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.paisa - other.paisa)
+
+    def __mul__(self, count: int) -> 'Money':
+        if not isinstance(count, int) or isinstance(count, bool):
+            return NotImplemented
+        return Money(self.paisa * count)
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> 'Money':
+        return Money(-self.paisa)
+
+    def __bool__(self) -> bool:
+        return self.paisa != 0
+
+    def __eq__(self, other):
+        return isinstance(other, Money) and self.paisa == other.paisa
+
+    def __lt__(self, other: 'Money') -> bool:
+        return self.paisa < other.paisa
+
+    def __le__(self, other: 'Money') -> bool:
+        return self.paisa <= other.paisa
+
+    def __gt__(self, other: 'Money') -> bool:
+        return self.paisa > other.paisa
+
+    def __ge__(self, other: 'Money') -> bool:
+        return self.paisa >= other.paisa
+
+    def __hash__(self):
+        return hash(('Money', self.paisa))
+
+    def to_decimal(self) -> Decimal:
+        """Rupees with two decimal places, for DecimalFields"""
+        return Decimal(self.paisa).scaleb(-2)
+
+    @property
+    def rupees(self) -> float:
+        """Rupees as a float, for JSON breakdowns"""
+        return self.paisa / PAISA_PER_RUPEE
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f"Money({self})"
+
+    def __reduce__(self):
+        return (Money, (self.paisa,))
+
+
+Money.ZERO = Money(0)
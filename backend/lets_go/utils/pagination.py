@@ -0,0 +1,140 @@
+"""
+Keyset (cursor) pagination for list endpoints
+"""
+import base64
+import json
+from typing import List, Optional, Sequence, Tuple
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed cursor or limit parameter"""
+
+
+def parse_limit(value: Optional[str], default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    """
+    Parse a page size query parameter
+
+    Args:
+        value: Raw 'limit' parameter (None or empty for the default)
+        default: Page size used when no limit is given
+        maximum: Largest page size a client may request
+
+    Returns:
+        Page size between 1 and maximum
+    """
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('limit must be an integer')
+    if limit < 1 or limit > maximum:
+        raise PaginationError(f'limit must be between 1 and {maximum}')
+    return limit
+
+
+def _split(field: str) -> Tuple[str, bool]:
+    """Return (field name, descending) for an ordering term like '-booked_at'"""
+    if field.startswith('-'):
+        return field[1:], True
+    return field, False
+
+
+def _model_field(model, name: str):
+    if name == 'pk':
+        return model._meta.pk
+    return model._meta.get_field(name)
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode the ordering values of the last row on a page as an opaque token"""
+    payload = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+    raw = json.dumps(payload, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, model, ordering: Sequence[str]) -> List:
+    """
+    Decode a cursor produced by encode_cursor back into typed ordering values
+
+    Raises:
+        PaginationError: If the cursor is malformed or does not match the ordering
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(payload, list) or len(payload) != len(ordering):
+        raise PaginationError('Invalid cursor')
+
+    values = []
+    for field, value in zip(ordering, payload):
+        name, _ = _split(field)
+        try:
+            values.append(_model_field(model, name).to_python(value))
+        except Exception:
+            raise PaginationError('Invalid cursor')
+    return values
+
+
+def keyset_filter(ordering: Sequence[str], values: Sequence) -> Q:
+    """
+    Build the filter selecting rows strictly after values in the given ordering
+
+    For ordering (a, -b, c) this is:
+    a > va OR (a = va AND b < vb) OR (a = va AND b = vb AND c > vc)
+    """
+    condition = Q()
+    equal_prefix = Q()
+    for field, value in zip(ordering, values):
+        name, descending = _split(field)
+        lookup = 'lt' if descending else 'gt'
+        condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+        equal_prefix &= Q(**{name: value})
+    return condition
+
+
+def paginate_keyset(queryset, ordering: Sequence[str], cursor: Optional[str] = None,
+                    limit: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one page of a queryset ordered by indexed columns
+
+    The last ordering term must be unique (normally 'pk') so the order is total
+    and pages neither skip nor repeat rows when new rows are inserted.
+
+    Args:
+        queryset: Filtered queryset to page through
+        ordering: Ordering terms, e.g. ['trip_date', 'departure_time', 'pk']
+        cursor: 'cursor' query parameter from the previous page, if any
+        limit: 'limit' query parameter, if any
+
+    Returns:
+        Tuple of (rows on this page, cursor for the next page or None)
+
+    Raises:
+        PaginationError: If the cursor or limit parameter is invalid
+    """
+    page_size = parse_limit(limit)
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(keyset_filter(ordering, values))
+
+    # One extra row tells us whether another page exists
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    next_cursor = encode_cursor([
+        last.pk if name == 'pk' else getattr(last, _model_field(queryset.model, name).attname)
+        for name, _ in map(_split, ordering)
+    ])
+    return rows, next_cursor
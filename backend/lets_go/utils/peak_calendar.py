@@ -0,0 +1,173 @@
+"""
+Peak-hour calendar: per-region local windows, weekends and holidays
+
+The calendar is part of the pricing rule set ('peak_calendar' key). Each
+region compiles its weekday, weekend and holiday windows into 1440-byte
+per-minute bitmaps, so a lookup is a time zone conversion plus one index.
+
+Two behaviours differ from the fixed windows this replaced. Windows are
+half-open, so with the defaults 09:00 and 19:00 are no longer peak (08:59 and
+18:59 are the last peak minutes). And aware datetimes, such as
+timezone.now() under TIME_ZONE = 'UTC', are converted to the region's time
+zone first (Asia/Karachi by default) instead of being compared as UTC clock
+times.
+"""
+import math
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Union
+from zoneinfo import ZoneInfo
+
+from django.utils import timezone
+
+from .geo import haversine_km
+
+MINUTES_PER_DAY = 24 * 60
+
+# Windows are [start, end) in local wall-clock time; an end at or before the start wraps past midnight
+DEFAULT_PEAK_CALENDAR = {
+    'default_region': 'PK',
+    'regions': {
+        'PK': {
+            'timezone': 'Asia/Karachi',
+            # date.weekday() numbers, Monday = 0
+            'weekend_days': [6],
+            'weekday': [['07:00', '09:00'], ['17:00', '19:00']],
+            'weekend': [['07:00', '09:00'], ['17:00', '19:00']],
+            # 'YYYY-MM-DD' (one date) or 'MM-DD' (every year) -> windows; [] means no peak that day
+            'holidays': {},
+        },
+    },
+}
+
+Moment = Union[datetime, time]
+
+
+def _minute_of_day(value: str) -> int:
+    hours, minutes = value.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time of day {value!r}")
+    return hours * 60 + minutes
+
+
+def windows_bitmap(windows: Sequence[Sequence[str]]) -> bytes:
+    """Per-minute bitmap (one byte per minute of the day) of ['HH:MM', 'HH:MM'] windows"""
+    bits = bytearray(MINUTES_PER_DAY)
+    for start, end in windows:
+        start, end = _minute_of_day(start), _minute_of_day(end)
+        if end > start:
+            bits[start:end] = b'\x01' * (end - start)
+        else:
+            bits[start:] = b'\x01' * (MINUTES_PER_DAY - start)
+            bits[:end] = b'\x01' * end
+    return bytes(bits)
+
+
+class RegionCalendar:
+    """Compiled peak windows of one region"""
+
+    __slots__ = ('name', 'tz', 'center', 'radius_km', 'weekend_days',
+                 'weekday_bits', 'weekend_bits', 'dated_bits', 'recurring_bits')
+
+    def __init__(self, name: str, config: Mapping):
+        self.name = name
+        self.tz = ZoneInfo(config['timezone'])
+        center = config.get('center')
+        self.center = (float(center[0]), float(center[1])) if center else None
+        self.radius_km = float(config.get('radius_km') or 0)
+        self.weekend_days = frozenset(int(day) for day in config.get('weekend_days', ()))
+        self.weekday_bits = windows_bitmap(config.get('weekday', ()))
+        self.weekend_bits = windows_bitmap(config.get('weekend', config.get('weekday', ())))
+        self.dated_bits = {}
+        self.recurring_bits = {}
+        for key, windows in (config.get('holidays') or {}).items():
+            parts = [int(part) for part in key.split('-')]
+            if len(parts) == 3:
+                self.dated_bits[date(*parts)] = windows_bitmap(windows)
+            elif len(parts) == 2:
+                date(2000, *parts)  # validate month/day, leap day included
+                self.recurring_bits[tuple(parts)] = windows_bitmap(windows)
+            else:
+                raise ValueError(f"Invalid holiday {key!r}; use YYYY-MM-DD or MM-DD")
+
+    def bitmap_for(self, day: date) -> bytes:
+        """Per-minute peak bitmap in effect on a local date"""
+        bits = self.dated_bits.get(day)
+        if bits is None:
+            bits = self.recurring_bits.get((day.month, day.day))
+        if bits is None:
+            bits = self.weekend_bits if day.weekday() in self.weekend_days else self.weekday_bits
+        return bits
+
+    def localize(self, moment: Moment) -> datetime:
+        """Local wall-clock datetime for an aware datetime, naive datetime (already local) or time (today)"""
+        if isinstance(moment, datetime):
+            if timezone.is_aware(moment):
+                return moment.astimezone(self.tz)
+            return moment
+        return datetime.combine(timezone.now().astimezone(self.tz).date(), moment)
+
+
+class PeakCalendar:
+    """Compiled calendar of every region, held by PricingRules"""
+
+    __slots__ = ('regions', 'default_region')
+
+    def __init__(self, config: Optional[Mapping] = None):
+        config = config or DEFAULT_PEAK_CALENDAR
+        self.regions: Dict[str, RegionCalendar] = {
+            name: RegionCalendar(name, region) for name, region in config['regions'].items()
+        }
+        self.default_region = config.get('default_region') or next(iter(self.regions))
+        if self.default_region not in self.regions:
+            raise ValueError(f"default_region {self.default_region!r} is not a configured region")
+
+    def region(self, name: Optional[str] = None) -> RegionCalendar:
+        return self.regions.get(name or self.default_region) or self.regions[self.default_region]
+
+    def region_for_point(self, latitude, longitude) -> str:
+        """Nearest region whose center is within its radius of the point, else the default region"""
+        if latitude is None or longitude is None:
+            return self.default_region
+        best, best_distance = self.default_region, math.inf
+        for name, region in self.regions.items():
+            if region.center is None:
+                continue
+            distance = haversine_km(float(latitude), float(longitude), *region.center)
+            if distance <= region.radius_km and distance < best_distance:
+                best, best_distance = name, distance
+        return best
+
+    def region_for_route(self, route) -> str:
+        """Region of a route from its bounding box center (see Route.set_polyline)"""
+        if route is None or route.bbox_min_lat is None or route.bbox_min_lng is None:
+            return self.default_region
+        return self.region_for_point(
+            (route.bbox_min_lat + route.bbox_max_lat) / 2,
+            (route.bbox_min_lng + route.bbox_max_lng) / 2,
+        )
+
+    def is_peak(self, moment: Moment, region: Optional[str] = None) -> bool:
+        """Whether a departure or booking time falls in a peak window of the region"""
+        calendar = self.region(region)
+        local = calendar.localize(moment)
+        return calendar.bitmap_for(local.date())[local.hour * 60 + local.minute] == 1
+
+    def peak_flags(self, moments: Iterable[Moment], region: Optional[str] = None) -> List[bool]:
+        """
+        Evaluate many times at once for one region
+
+        Bitmaps are resolved once per local date in the batch, so bulk repricing
+        costs one time zone conversion and one index per item.
+        """
+        calendar = self.region(region)
+        by_date = {}
+        flags = []
+        for moment in moments:
+            local = calendar.localize(moment)
+            day = local.date()
+            bits = by_date.get(day)
+            if bits is None:
+                bits = by_date[day] = calendar.bitmap_for(day)
+            flags.append(bits[local.hour * 60 + local.minute] == 1)
+        return flags
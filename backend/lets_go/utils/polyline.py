@@ -0,0 +1,291 @@
+"""
+Route polylines: compact encoding, simplification and point-to-corridor matching
+"""
+from functools import lru_cache
+from math import radians, cos, sqrt
+from typing import List, Optional, Sequence, Tuple
+
+from .geo import EARTH_RADIUS_KM
+from .distances import StopCoordinates, leg_distances, cumulative_distances
+
+# Coordinates are stored with 5 decimal places (~1.1m), as in the Google polyline format
+POLYLINE_PRECISION = 5
+
+# Points closer than this to the simplified line are dropped before storing
+SIMPLIFY_TOLERANCE_KM = 0.01
+
+# Segments per cached bounding box used to skip far-away parts of a polyline
+CHUNK_SEGMENTS = 16
+
+_KM_PER_DEGREE = radians(1) * EARTH_RADIUS_KM
+
+Point = Tuple[float, float]
+
+
+def normalize_points(raw_points: Sequence) -> List[Point]:
+    """
+    Convert request coordinates to (lat, lng) tuples
+
+    Accepts {'lat': .., 'lng': ..} dictionaries or [lat, lng] pairs and skips
+    entries without both values.
+    """
+    points = []
+    for item in raw_points or []:
+        if isinstance(item, dict):
+            lat, lng = item.get('lat'), item.get('lng')
+        else:
+            lat, lng = (list(item) + [None, None])[:2]
+        if lat is None or lng is None:
+            continue
+        points.append((float(lat), float(lng)))
+    return points
+
+
+def encode_polyline(points: Sequence[Point], precision: int = POLYLINE_PRECISION) -> str:
+    """Encode (lat, lng) points using the Google encoded polyline algorithm"""
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        ilat, ilng = int(round(lat * factor)), int(round(lng * factor))
+        for delta in (ilat - prev_lat, ilng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lng = ilat, ilng
+    return ''.join(chunks)
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> List[Point]:
+    """Decode a string produced by encode_polyline back into (lat, lng) points"""
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+def simplify_polyline(points: Sequence[Point], tolerance_km: float = SIMPLIFY_TOLERANCE_KM) -> List[Point]:
+    """
+    Drop points that lie within tolerance_km of the line through their neighbours
+    (Douglas-Peucker on a local equirectangular projection)
+    """
+    if len(points) < 3:
+        return list(points)
+
+    lat0 = sum(lat for lat, _ in points) / len(points)
+    lng_scale = cos(radians(lat0))
+    xy = [(lng * lng_scale * _KM_PER_DEGREE, lat * _KM_PER_DEGREE) for lat, lng in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        best_index, best_distance = None, tolerance_km
+        for i in range(first + 1, last):
+            distance, _ = _project(xy[i], xy[first], xy[last])
+            if distance > best_distance:
+                best_index, best_distance = i, distance
+        if best_index is not None:
+            keep[best_index] = True
+            stack.append((first, best_index))
+            stack.append((best_index, last))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def polyline_bounds(points: Sequence[Point]) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lng, max_lng) of a list of points"""
+    lats = [lat for lat, _ in points]
+    lngs = [lng for _, lng in points]
+    return min(lats), max(lats), min(lngs), max(lngs)
+
+
+def _project(p, a, b) -> Tuple[float, float]:
+    """Distance from p to segment ab and the fraction t of ab where the foot lies"""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        t = 0.0
+    else:
+        t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length_sq))
+    fx, fy = a[0] + t * dx - p[0], a[1] + t * dy - p[1]
+    return sqrt(fx * fx + fy * fy), t
+
+
+@lru_cache(maxsize=4096)
+def decoded_corridor(encoded: str) -> Tuple[Tuple[Point, ...], Tuple[float, ...], Tuple]:
+    """
+    Decode a stored polyline with the cumulative distance to each vertex and
+    the bounding box of every run of CHUNK_SEGMENTS segments
+
+    Cached per encoded string, so repeated searches over the same routes skip
+    decoding and the precomputation.
+    """
+    points = tuple(decode_polyline(encoded))
+    cumulative = cumulative_distances(leg_distances(StopCoordinates(points)))
+
+    chunks = []
+    for start in range(0, len(points) - 1, CHUNK_SEGMENTS):
+        end = min(start + CHUNK_SEGMENTS, len(points) - 1)
+        chunks.append((start, end) + polyline_bounds(points[start:end + 1]))
+    return points, tuple(cumulative), tuple(chunks)
+
+
+def corridor_projections(
+    encoded: str,
+    latitude: float,
+    longitude: float,
+    radius_km: float
+) -> List[Tuple[float, float]]:
+    """
+    Find every place where a polyline passes within radius_km of a point
+
+    Chunks of segments, then single segments, whose bounding box is further than
+    radius_km in latitude or longitude are rejected before any projection is computed.
+
+    Args:
+        encoded: Encoded route polyline
+        latitude: Query point latitude
+        longitude: Query point longitude
+        radius_km: Maximum distance from the road
+
+    Returns:
+        List of (distance_km, along_km) per matching segment, in route order
+    """
+    points, cumulative, chunks = decoded_corridor(encoded)
+    if len(points) < 2:
+        return []
+
+    lng_scale = max(cos(radians(latitude)), 1e-6)
+    lat_delta = radius_km / _KM_PER_DEGREE
+    lng_delta = lat_delta / lng_scale
+    south, north = latitude - lat_delta, latitude + lat_delta
+    west, east = longitude - lng_delta, longitude + lng_delta
+    origin = (0.0, 0.0)
+
+    matches = []
+    for start, end, min_lat, max_lat, min_lng, max_lng in chunks:
+        if max_lat < south or min_lat > north or max_lng < west or min_lng > east:
+            continue
+        for i in range(start, end):
+            (lat1, lng1), (lat2, lng2) = points[i], points[i + 1]
+            if (lat1 < south and lat2 < south) or (lat1 > north and lat2 > north) or \
+                    (lng1 < west and lng2 < west) or (lng1 > east and lng2 > east):
+                continue
+
+            # Local equirectangular projection centred on the query point
+            a = ((lng1 - longitude) * lng_scale * _KM_PER_DEGREE, (lat1 - latitude) * _KM_PER_DEGREE)
+            b = ((lng2 - longitude) * lng_scale * _KM_PER_DEGREE, (lat2 - latitude) * _KM_PER_DEGREE)
+            distance, t = _project(origin, a, b)
+            if distance <= radius_km:
+                along = cumulative[i] + t * (cumulative[i + 1] - cumulative[i])
+                matches.append((distance, along))
+    return matches
+
+
+def match_corridor(
+    encoded: str,
+    origin: Point,
+    destination: Point,
+    radius_km: float
+) -> Optional[dict]:
+    """
+    Check that a route passes near the origin and later near the destination
+
+    Args:
+        encoded: Encoded route polyline
+        origin: (latitude, longitude) of the pickup point
+        destination: (latitude, longitude) of the drop-off point
+        radius_km: Maximum distance from the road at either end
+
+    Returns:
+        Best pickup/drop-off projection pair, or None if the route does not match
+    """
+    pickups = corridor_projections(encoded, origin[0], origin[1], radius_km)
+    if not pickups:
+        return None
+    dropoffs = corridor_projections(encoded, destination[0], destination[1], radius_km)
+    if not dropoffs:
+        return None
+
+    # Both lists are in route order; pair each drop-off with the closest earlier pickup
+    best = None
+    best_pickup = None
+    pickup_index = 0
+    for dropoff_distance, dropoff_along in dropoffs:
+        while pickup_index < len(pickups) and pickups[pickup_index][1] < dropoff_along:
+            if best_pickup is None or pickups[pickup_index][0] < best_pickup[0]:
+                best_pickup = pickups[pickup_index]
+            pickup_index += 1
+        if best_pickup is None:
+            continue
+        total = best_pickup[0] + dropoff_distance
+        if best is None or total < best['walk_distance_km']:
+            best = {
+                'pickup_distance_km': best_pickup[0],
+                'pickup_along_km': best_pickup[1],
+                'dropoff_distance_km': dropoff_distance,
+                'dropoff_along_km': dropoff_along,
+                'walk_distance_km': total,
+            }
+    return best
+
+
+def match_route_corridors(
+    origin: Point,
+    destination: Point,
+    radius_km: float
+) -> dict:
+    """
+    Find active routes whose road passes near the origin and then the destination
+
+    Routes are prefiltered in the database by their stored bounding box, expanded
+    by radius_km, which must contain both points; only those polylines are scanned.
+
+    Args:
+        origin: (latitude, longitude) of the passenger's pickup point
+        destination: (latitude, longitude) of the passenger's drop-off point
+        radius_km: Maximum distance from the road in kilometers
+
+    Returns:
+        Dictionary mapping route pk to the match returned by match_corridor
+    """
+    from .geo import bounding_box
+    from ..models import Route
+
+    o_min_lat, o_max_lat, o_min_lng, o_max_lng = bounding_box(origin[0], origin[1], radius_km)
+    d_min_lat, d_max_lat, d_min_lng, d_max_lng = bounding_box(destination[0], destination[1], radius_km)
+
+    candidates = Route.objects.filter(
+        is_active=True,
+        bbox_min_lat__lte=min(o_max_lat, d_max_lat),
+        bbox_max_lat__gte=max(o_min_lat, d_min_lat),
+        bbox_min_lng__lte=min(o_max_lng, d_max_lng),
+        bbox_max_lng__gte=max(o_min_lng, d_min_lng),
+    ).exclude(polyline='').values_list('pk', 'polyline')
+
+    matches = {}
+    for route_pk, encoded in candidates.iterator():
+        match = match_corridor(encoded, origin, destination, radius_km)
+        if match is not None:
+            matches[route_pk] = match
+    return matches
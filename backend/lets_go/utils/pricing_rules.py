@@ -0,0 +1,234 @@
+"""
+Pricing rule tables: defaults, compilation and the hot-swappable active set
+
+Rule sets are stored as JSON in PricingRuleSet. The published one is compiled
+once per worker into an immutable PricingRules object (integer Money and
+Rate values, read-only mappings) and replaced as a whole when a new version
+is published, so quotes never build rule tables per request and never see a
+half-updated set. Workers notice a publish by re-reading the key of the
+active row (pk, version, published_at) at most every few seconds.
+"""
+import threading
+import time
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+from django.conf import settings
+
+from .money import Money, Rate
+from .peak_calendar import DEFAULT_PEAK_CALENDAR, PeakCalendar
+
+# Seconds a worker uses its compiled set before checking the active row again
+# (settings.PRICING_RULES_CHECK_SECONDS)
+DEFAULT_RULES_CHECK_SECONDS = 5
+
+# Version reported when no rule set has been published yet
+DEFAULT_RULES_VERSION = 0
+
+METRES_PER_KM = 1000
+
+DEFAULT_RULES = {
+    # PKR per km by fuel type
+    'base_rates': {'Petrol': '22.00', 'Diesel': '20.00', 'CNG': '16.00', 'Electric': '14.00', 'Hybrid': '18.00'},
+    'default_fuel_type': 'Petrol',
+    # Multiplier by vehicle type (TW two-wheeler, FW four-wheeler)
+    'vehicle_multipliers': {'TW': '0.7', 'FW': '1.0'},
+    'peak_multiplier': '1.30',
+    # Per-region peak windows; see utils.peak_calendar
+    'peak_calendar': DEFAULT_PEAK_CALENDAR,
+    # (minimum seats, factor), largest threshold first
+    'seat_factors': [[8, '1.20'], [5, '1.10']],
+    # (maximum km, factor); null maximum applies above every threshold
+    'distance_bands': [[5, '1.25'], [15, '1.0'], [30, '0.92'], [None, '0.85']],
+    'minimum_fares': {'TW': '100.00', 'FW': '150.00'},
+    'default_minimum_fare': '120.00',
+    # Discount by number of seats booked together
+    'bulk_discounts': {'1': '0.0', '2': '0.05', '3': '0.08', '4': '0.12', '5': '0.15'},
+    'default_bulk_discount': '0.18',
+    # km per litre / kg / kWh, and PKR per unit
+    'fuel_efficiency': {'Petrol': '12.0', 'Diesel': '15.0', 'CNG': '18.0', 'Electric': '8.0', 'Hybrid': '14.0'},
+    'fuel_costs': {'Petrol': '275.0', 'Diesel': '285.0', 'CNG': '230.0', 'Electric': '25.0', 'Hybrid': '275.0'},
+    'default_fuel_efficiency': '12.0',
+    'default_fuel_cost': '275.0',
+    # Route fare matrix generation (per stop pair, vehicle independent)
+    'segment_vehicle_type': 'FW',
+    'off_peak_multiplier': '1.00',
+}
+
+
+def _money_map(table: Mapping) -> Mapping[str, Money]:
+    return MappingProxyType({str(key): Money.of(value) for key, value in table.items()})
+
+
+def _rate_map(table: Mapping) -> Mapping[str, Rate]:
+    return MappingProxyType({str(key): Rate.of(value) for key, value in table.items()})
+
+
+class PricingRules:
+    """Compiled, read-only pricing rule set (amounts as Money, factors as Rate)"""
+
+    __slots__ = (
+        'version', 'base_rates', 'default_fuel_type', 'vehicle_multipliers', 'peak_multiplier', 'peak_calendar',
+        'seat_factors', 'distance_bands', 'minimum_fares', 'default_minimum_fare',
+        'bulk_discounts', 'default_bulk_discount', 'fuel_efficiency', 'fuel_costs',
+        'default_fuel_efficiency', 'default_fuel_cost', 'segment_vehicle_type', 'off_peak_multiplier',
+    )
+
+    def __init__(self, version: int, rules: Mapping):
+        merged = dict(DEFAULT_RULES)
+        merged.update(rules or {})
+        values = {
+            'version': int(version),
+            'base_rates': _money_map(merged['base_rates']),
+            'default_fuel_type': str(merged['default_fuel_type']),
+            'vehicle_multipliers': _rate_map(merged['vehicle_multipliers']),
+            'peak_multiplier': Rate.of(merged['peak_multiplier']),
+            'peak_calendar': PeakCalendar(merged['peak_calendar']),
+            'seat_factors': tuple(
+                (int(seats), Rate.of(factor))
+                for seats, factor in sorted(merged['seat_factors'], key=lambda band: -int(band[0]))
+            ),
+            # Band limits in metres, so lookups compare integers
+            'distance_bands': tuple(
+                (None if limit is None else int(Decimal(str(limit)) * METRES_PER_KM), Rate.of(factor))
+                for limit, factor in merged['distance_bands']
+            ),
+            'minimum_fares': _money_map(merged['minimum_fares']),
+            'default_minimum_fare': Money.of(merged['default_minimum_fare']),
+            'bulk_discounts': MappingProxyType({
+                int(seats): Rate.of(discount) for seats, discount in merged['bulk_discounts'].items()
+            }),
+            'default_bulk_discount': Rate.of(merged['default_bulk_discount']),
+            'fuel_efficiency': _rate_map(merged['fuel_efficiency']),
+            'fuel_costs': _money_map(merged['fuel_costs']),
+            'default_fuel_efficiency': Rate.of(merged['default_fuel_efficiency']),
+            'default_fuel_cost': Money.of(merged['default_fuel_cost']),
+            'segment_vehicle_type': str(merged['segment_vehicle_type']),
+            'off_peak_multiplier': Rate.of(merged['off_peak_multiplier']),
+        }
+        if values['default_fuel_type'] not in values['base_rates']:
+            raise ValueError(f"base_rates has no rate for default fuel type {values['default_fuel_type']}")
+        if not values['distance_bands'] or values['distance_bands'][-1][0] is not None:
+            raise ValueError('distance_bands must end with an open-ended [null, factor] band')
+        if any(efficiency.ppm <= 0 for efficiency in values['fuel_efficiency'].values()) or \
+                values['default_fuel_efficiency'].ppm <= 0:
+            raise ValueError('fuel_efficiency values must be positive')
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PricingRules is immutable; publish a new PricingRuleSet instead')
+
+    def __repr__(self):
+        return f"<PricingRules v{self.version}>"
+
+    def base_rate(self, fuel_type: Optional[str]) -> Money:
+        """Fare per km before multipliers"""
+        return self.base_rates.get(fuel_type or self.default_fuel_type, self.base_rates[self.default_fuel_type])
+
+    def vehicle_multiplier(self, vehicle_type: Optional[str]) -> Rate:
+        return self.vehicle_multipliers.get(vehicle_type, Rate.ONE)
+
+    def seat_factor(self, seats: Optional[int]) -> Rate:
+        for minimum_seats, factor in self.seat_factors:
+            if seats and seats >= minimum_seats:
+                return factor
+        return Rate.ONE
+
+    def distance_factor(self, distance_m: int) -> Rate:
+        for limit, factor in self.distance_bands:
+            if limit is None or distance_m <= limit:
+                return factor
+        return self.distance_bands[-1][1]
+
+    def minimum_fare(self, vehicle_type: Optional[str]) -> Money:
+        return self.minimum_fares.get(vehicle_type, self.default_minimum_fare)
+
+    def bulk_discount(self, seats: int) -> Rate:
+        return self.bulk_discounts.get(seats, self.default_bulk_discount)
+
+    def fuel_efficiency_for(self, fuel_type: str) -> Rate:
+        """km per litre / kg / kWh"""
+        return self.fuel_efficiency.get(fuel_type, self.default_fuel_efficiency)
+
+    def fuel_cost_for(self, fuel_type: str) -> Money:
+        """Price per litre / kg / kWh"""
+        return self.fuel_costs.get(fuel_type, self.default_fuel_cost)
+
+    def segment_rules(self) -> Dict:
+        """Integer rules for fare_generator.compute_segment_fares (picklable for worker processes)"""
+        vehicle_type = self.segment_vehicle_type
+        return {
+            'version': self.version,
+            'rate_per_km_paisa': self.base_rate(self.default_fuel_type).apply(self.vehicle_multiplier(vehicle_type)).paisa,
+            'distance_tiers_ppm': [(limit, factor.ppm) for limit, factor in self.distance_bands],
+            'peak_multiplier_ppm': self.peak_multiplier.ppm,
+            'off_peak_multiplier_ppm': self.off_peak_multiplier.ppm,
+            'minimum_fare_paisa': self.minimum_fare(vehicle_type).paisa,
+        }
+
+
+def compile_rules(version: int, rules: Mapping) -> PricingRules:
+    """Validate and compile a rule set; raises KeyError/TypeError/ValueError if malformed"""
+    if not isinstance(rules, Mapping):
+        raise TypeError('rules must be a JSON object')
+    return PricingRules(version, rules)
+
+
+def mark_pricing_rules_changed():
+    """Make this worker check the published rule set on its next quote; others follow within the check interval"""
+    pricing_rules.expire()
+
+
+def rules_check_interval() -> float:
+    return getattr(settings, 'PRICING_RULES_CHECK_SECONDS', DEFAULT_RULES_CHECK_SECONDS)
+
+
+class PricingRuleRegistry:
+    """Holds the compiled active rule set and swaps it when a new one is published"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (key of the active row, compiled rules, monotonic time of the last check)
+        self._state: Tuple[object, Optional[PricingRules], float] = (None, None, 0.0)
+
+    def _active_key(self):
+        """(pk, version, published_at) of the published set, or None; one indexed query"""
+        from ..models import PricingRuleSet
+
+        return PricingRuleSet.objects.filter(is_active=True).values_list('pk', 'version', 'published_at').first()
+
+    def _load(self) -> PricingRules:
+        from ..models import PricingRuleSet
+
+        active = PricingRuleSet.objects.filter(is_active=True).values_list('version', 'rules').first()
+        if active is None:
+            return compile_rules(DEFAULT_RULES_VERSION, DEFAULT_RULES)
+        return compile_rules(*active)
+
+    def current(self) -> PricingRules:
+        """The published rule set, recompiled only after a publish"""
+        interval = rules_check_interval()
+        seen_key, rules, checked_at = self._state
+        if rules is not None and time.monotonic() - checked_at < interval:
+            return rules
+        with self._lock:
+            seen_key, rules, checked_at = self._state
+            if rules is not None and time.monotonic() - checked_at < interval:
+                return rules
+            key = self._active_key()
+            if rules is None or key != seen_key:
+                rules = self._load()
+            # Single tuple assignment: readers see the old or the new set, never a mix
+            self._state = (key, rules, time.monotonic())
+            return rules
+
+    def expire(self):
+        """Check the active row on the next call instead of waiting for the interval"""
+        with self._lock:
+            seen_key, rules, _ = self._state
+            self._state = (seen_key, rules, 0.0)
+
+
+pricing_rules = PricingRuleRegistry()
@@ -0,0 +1,200 @@
+"""
+Stop name normalization and in-process prefix index for autocomplete
+"""
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set
+
+from django.conf import settings
+
+# Seconds a worker trusts its trie before comparing it with the database again
+# (settings.STOP_INDEX_CHECK_SECONDS)
+DEFAULT_STOP_INDEX_CHECK_SECONDS = 5
+
+# Above this many matching names, callers fall back to an indexed prefix query
+MAX_MATCHED_NAMES = 500
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_stop_name(name: Optional[str]) -> str:
+    """
+    Fold a stop name to lowercase ASCII words for matching
+
+    'Faizabad  Interchange', 'faizābād interchange' and 'FAIZABAD-INTERCHANGE'
+    all normalize to 'faizabad interchange'.
+    """
+    if not name:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', stripped.casefold()).strip()
+
+
+class StopNameTrie:
+    """Prefix trie over the words of normalized stop names"""
+
+    _NAMES = '$'
+
+    def __init__(self):
+        self.root: Dict = {}
+        self.display_names: Dict[str, str] = {}
+
+    def __len__(self):
+        return len(self.display_names)
+
+    def add(self, normalized: str, display_name: str):
+        """Index every word of a normalized name so any word prefix matches it"""
+        if not normalized or normalized in self.display_names:
+            return
+        self.display_names[normalized] = display_name
+        for word in set(normalized.split()):
+            node = self.root
+            for ch in word:
+                node = node.setdefault(ch, {})
+            node.setdefault(self._NAMES, set()).add(normalized)
+
+    def _names_under(self, word_prefix: str, limit: Optional[int]) -> Set[str]:
+        node = self.root
+        for ch in word_prefix:
+            node = node.get(ch)
+            if node is None:
+                return set()
+
+        names = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for key, child in current.items():
+                if key == self._NAMES:
+                    names.update(child)
+                    if limit is not None and len(names) >= limit:
+                        return names
+                else:
+                    stack.append(child)
+        return names
+
+    def match(self, query: str, limit: Optional[int] = None) -> Set[str]:
+        """
+        Return normalized names where every query word prefixes some word of the name
+        """
+        words = normalize_stop_name(query).split()
+        if not words:
+            return set()
+
+        # Start from the most selective (longest) word to keep intersections small
+        words.sort(key=len, reverse=True)
+        matches = self._names_under(words[0], None if len(words) > 1 else limit)
+        for word in words[1:]:
+            if not matches:
+                break
+            matches &= self._names_under(word, None)
+        if limit is not None and len(matches) > limit:
+            matches = set(sorted(matches)[:limit])
+        return matches
+
+
+class StopNameIndex:
+    """
+    Process-wide stop name trie, built lazily and rebuilt when the stops change
+
+    Every few seconds at most, a worker compares the stop count and the latest
+    stop and route updated_at with those its trie was built from, so writes by
+    any worker are picked up without a shared cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trie: Optional[StopNameTrie] = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _current_version(self):
+        """(stop count, latest stop change, latest route change) in one aggregate query"""
+        from django.db.models import Count, Max
+        from ..models import RouteStop
+
+        row = RouteStop.objects.aggregate(
+            stops=Count('pk'),
+            stop_changed=Max('updated_at'),
+            route_changed=Max('route__updated_at'),
+        )
+        return row['stops'], row['stop_changed'], row['route_changed']
+
+    def _build(self) -> StopNameTrie:
+        from ..models import RouteStop
+
+        trie = StopNameTrie()
+        rows = RouteStop.objects.filter(
+            is_active=True,
+            route__is_active=True,
+        ).values_list('search_name', 'stop_name').distinct()
+        for normalized, display_name in rows.iterator():
+            trie.add(normalized, display_name)
+        return trie
+
+    def trie(self) -> StopNameTrie:
+        interval = getattr(settings, 'STOP_INDEX_CHECK_SECONDS', DEFAULT_STOP_INDEX_CHECK_SECONDS)
+        with self._lock:
+            if self._trie is not None and time.monotonic() - self._checked_at < interval:
+                return self._trie
+            version = self._current_version()
+            if self._trie is None or self._version != version:
+                self._trie = self._build()
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._trie
+
+    def expire(self):
+        """Compare with the database on the next lookup, e.g. after this worker wrote a stop"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def autocomplete(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        trie = self.trie()
+        names = sorted(trie.match(query, limit=limit))
+        return [{'name': trie.display_names[name], 'normalized': name} for name in names]
+
+    def match(self, query: str) -> Optional[Set[str]]:
+        """
+        Normalized names matching a search query, or None if there are too many
+        for an IN filter and callers should match in the database instead
+        """
+        names = self.trie().match(query, limit=MAX_MATCHED_NAMES + 1)
+        if len(names) > MAX_MATCHED_NAMES:
+            return None
+        return names
+
+
+stop_name_index = StopNameIndex()
+
+
+def word_prefix_regex(query: str) -> str:
+    """
+    Regex matching normalized names in which every query word starts some word
+
+    The same rule as StopNameTrie.match, for the database: one lookahead per
+    word, each anchored at the start of the name or after a space.
+    """
+    words = normalize_stop_name(query).split()
+    return '^' + ''.join(f'(?=(.* )?{re.escape(word)})' for word in words)
+
+
+def stop_name_filter(field_path: str, query: str) -> Dict:
+    """
+    Build queryset filter kwargs matching query against a search_name column
+
+    Args:
+        field_path: Lookup path to the search_name field, e.g. 'route_stops__search_name'
+        query: Raw text typed by the user
+
+    Returns:
+        Filter kwargs using an indexed IN lookup, or for very common words
+        (over MAX_MATCHED_NAMES names) a regex with the same word-prefix rule
+    """
+    names = stop_name_index.match(query)
+    if names is None:
+        return {f'{field_path}__regex': word_prefix_regex(query)}
+    return {f'{field_path}__in': names}
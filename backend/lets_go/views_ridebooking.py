@@ -5,6 +5,8 @@ from datetime import datetime, timedelta, time
 from decimal import Decimal
 import json
 from .models import UsersData, Vehicle, Trip, Route, RouteStop, TripStopBreakdown, Booking
+from .services.seats import segment_free_seats, SeatReservationError
+from .utils.idempotency import idempotent
 
 @csrf_exempt
 def get_ride_booking_details(request, trip_id):
@@ -304,6 +306,7 @@ def get_ride_booking_details(request, trip_id):
     }, status=405)
 
 @csrf_exempt
+@idempotent
 def request_ride_booking(request, trip_id):
     """Request a ride booking"""
     if request.method == 'POST':
@@ -333,11 +336,12 @@ def request_ride_booking(request, trip_id):
                     'error': 'Trip is not available for booking'
                 }, status=400)
             
-            # Check seat availability
-            if trip.available_seats < number_of_seats:
+            # Check seat availability on the requested legs
+            free_seats = segment_free_seats(trip, int(from_stop_order), int(to_stop_order))
+            if free_seats < number_of_seats:
                 return JsonResponse({
                     'success': False,
-                    'error': f'Only {trip.available_seats} seats available'
+                    'error': f'Only {free_seats} seats available'
                 }, status=400)
             
             # Get passenger
@@ -368,9 +372,7 @@ def request_ride_booking(request, trip_id):
                 payment_status='PENDING'
             )
             
-            # Update available seats
-            trip.available_seats -= number_of_seats
-            trip.save()
+            # Seats were occupied on the booked legs by Booking.save
             
             return JsonResponse({
                 'success': True,
@@ -390,6 +392,13 @@ def request_ride_booking(request, trip_id):
                 'success': False,
                 'error': 'Passenger not found'
             }, status=404)
+        except SeatReservationError as e:
+            # Another passenger took the seats between the availability check and the booking
+            return JsonResponse({
+                'success': False,
+                'error': e.message,
+                'available_seats': e.available
+            }, status=409)
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -1,12 +1,36 @@
 from django.http import JsonResponse, HttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
+from django.db import transaction, IntegrityError
+from django.db.models import Count, Prefetch, Q
 from django.utils import timezone
-from datetime import datetime, timedelta, time
+from datetime import datetime, time
 from decimal import Decimal
 import json
-import random
-from .models import UsersData, Vehicle, Trip, Route, RouteStop, TripStopBreakdown, Booking
-from .utils.fare_calculator import is_peak_hour, get_fare_matrix_for_route, calculate_booking_fare
+import logging
+from .models import UsersData, Vehicle, Trip, Route, RouteStop, TripStopBreakdown, Booking, TripSearchIndex, NegotiationEvent, WaitlistEntry
+from .utils.fare_calculator import get_fare_matrix_for_route, calculate_booking_fare, quote_fares
+from .utils.geo import find_nearby_stops, match_route_segments
+from .utils.distances import StopCoordinates, leg_distances, path_length_km
+from .utils.fare_generator import generate_fare_matrix
+from .utils.pricing_rules import pricing_rules, METRES_PER_KM
+from .utils.money import Rate, RATE_SCALE
+from .utils.polyline import match_route_corridors
+from .utils.stop_search import stop_name_index, stop_name_filter
+from .utils.pagination import paginate_keyset, PaginationError
+from .services.seats import segment_free_seats, reset_trip_seats, SeatReservationError, load_seat_map, taken_mask, mask_seats, all_seats_mask
+from .services.seat_holds import place_hold, expired_hold_masks
+from .services.booking_requests import respond_to_booking_requests, MAX_BOOKING_DECISIONS
+from .services.waitlist import join_waitlist, leave_waitlist, waitlist_position
+from .utils.idempotency import idempotent
+from .utils.ids import new_booking_id
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on quotes per fares/quote/ request
+MAX_FARE_QUOTES = 2000
+
+# Keyset ordering for trip listings; matches the TripSearchIndex (trip_date, departure_time) index
+TRIP_PAGE_ORDERING = ['trip_date', 'departure_time', 'pk']
 
 def calculate_pakistan_fare(route, vehicle, departure_time, total_seats=1):
     """
@@ -19,161 +43,87 @@ def calculate_pakistan_fare(route, vehicle, departure_time, total_seats=1):
     - Peak hour surcharges
     - Vehicle type premiums
     """
-    print("=== CALCULATE_PAKISTAN_FARE DEBUG ===")
-    print(f"Route: {route.route_name}")
-    print(f"Vehicle: {vehicle.model_number}")
-    print(f"Departure time: {departure_time}")
-    print(f"Total seats: {total_seats}")
-    
-    # 1. Calculate route distance
-    print("Getting route stops...")
-    stops = route.route_stops.all().order_by('stop_order')
-    print(f"Found {stops.count()} stops")
-    
-    if stops.count() < 2:
-        print("Insufficient stops, returning default fare")
+    # 1. Calculate route distance (all legs in one pass)
+    coords = StopCoordinates.from_route(route)
+    if len(coords) < 2:
+        logger.warning(f"Route {route.route_id} has {len(coords)} stops; returning the default fare")
         return {'base_fare': 100.0, 'calculation_breakdown': {'error': 'Insufficient stops'}}
     
-    print("Calculating total distance...")
-    total_distance = 0
-    for i in range(len(stops) - 1):
-        current_stop = stops[i]
-        next_stop = stops[i + 1]
-        print(f"Calculating distance from stop {i+1} to {i+2}")
-        print(f"  Stop {i+1}: lat={current_stop.latitude}, lng={current_stop.longitude}")
-        print(f"  Stop {i+2}: lat={next_stop.latitude}, lng={next_stop.longitude}")
-        
-        try:
-            distance = _calculate_distance(
-                float(current_stop.latitude or 0), 
-                float(current_stop.longitude or 0),
-                float(next_stop.latitude or 0), 
-                float(next_stop.longitude or 0)
-            )
-            print(f"  Distance: {distance} km")
-            total_distance += distance
-        except Exception as e:
-            print(f"  Error calculating distance: {e}")
-            distance = 0
-            total_distance += distance
-    
-    print(f"Total distance: {total_distance} km")
+    total_distance = sum(leg_distances(coords))
+    logger.debug(f"Fare for route {route.route_id}, vehicle {vehicle.pk}, {total_seats} seats at {departure_time}: "
+                 f"{len(coords)} stops, {total_distance:.2f} km")
     
-    # 2. Pakistan-specific base rates (PKR per km) - Updated for 2025
-    base_rates = {
-        'Petrol': Decimal('22.00'),    # 22 PKR/km for petrol vehicles
-        'Diesel': Decimal('20.00'),    # 20 PKR/km for diesel (more efficient)
-        'CNG': Decimal('16.00'),       # 16 PKR/km for CNG (cheaper fuel)
-        'Electric': Decimal('14.00'),  # 14 PKR/km for electric (lowest operating cost)
-        'Hybrid': Decimal('18.00'),    # 18 PKR/km for hybrid
-    }
+    # 2-10. Rate tables come from the published pricing rule set; amounts are
+    # integer paisa (Money) and factors integer ppm (Rate) from here on
+    rules = pricing_rules.current()
+    distance_m = round(total_distance * METRES_PER_KM)
     
     # Get base rate based on fuel type
-    fuel_type = vehicle.fuel_type or 'Petrol'
-    base_rate_per_km = base_rates.get(fuel_type, base_rates['Petrol'])
+    fuel_type = vehicle.fuel_type or rules.default_fuel_type
+    base_rate_per_km = rules.base_rate(fuel_type)
     
-    # 3. Vehicle type multiplier (Pakistan market)
-    vehicle_multipliers = {
-        'TW': Decimal('0.7'),   # Two-wheelers: 30% cheaper
-        'FW': Decimal('1.0'),   # Four-wheelers: standard rate
-    }
-    vehicle_multiplier = vehicle_multipliers.get(vehicle.vehicle_type, Decimal('1.0'))
+    # Vehicle type multiplier
+    vehicle_multiplier = rules.vehicle_multiplier(vehicle.vehicle_type)
     
-    # 4. Peak hour multiplier (Pakistan traffic patterns)
-    time_multiplier = Decimal('1.0')
-    if is_peak_hour(departure_time):
-        time_multiplier = Decimal('1.30')  # 30% higher during peak hours
+    # Peak hour multiplier, in the local time and calendar of the route's region
+    calendar = rules.peak_calendar
+    peak = calendar.is_peak(departure_time, calendar.region_for_route(route))
+    time_multiplier = rules.peak_multiplier if peak else Rate.ONE
     
-    # 5. Seat capacity factor (Pakistan market)
-    seat_factor = Decimal('1.0')
-    if vehicle.seats:
-        if vehicle.seats >= 8:
-            seat_factor = Decimal('1.20')  # 20% higher for large vehicles
-        elif vehicle.seats >= 5:
-            seat_factor = Decimal('1.10')  # 10% higher for medium vehicles
+    # Seat capacity factor
+    seat_factor = rules.seat_factor(vehicle.seats)
     
-    # 6. Distance-based pricing (Pakistan market)
-    distance_factor = Decimal('1.0')
-    if total_distance <= 5:
-        distance_factor = Decimal('1.25')   # 25% higher for short trips
-    elif total_distance <= 15:
-        distance_factor = Decimal('1.0')    # Standard rate
-    elif total_distance <= 30:
-        distance_factor = Decimal('0.92')   # 8% discount for medium trips
-    else:
-        distance_factor = Decimal('0.85')   # 15% discount for long trips
+    # Distance-based pricing
+    distance_factor = rules.distance_factor(distance_m)
     
-    # 7. Calculate base fare
-    base_fare = (
-        base_rate_per_km * 
-        Decimal(str(total_distance)) * 
-        vehicle_multiplier * 
-        time_multiplier * 
-        seat_factor * 
-        distance_factor
+    # Calculate base fare (one rounding step to the paisa)
+    base_fare = base_rate_per_km.apply(
+        vehicle_multiplier,
+        time_multiplier,
+        seat_factor,
+        distance_factor,
+        numerator=distance_m,
+        denominator=METRES_PER_KM,
     )
     
-    # 8. Pakistan-specific minimum fares
-    min_fares = {
-        'TW': Decimal('100.00'),   # 100 PKR minimum for two-wheelers
-        'FW': Decimal('150.00'),   # 150 PKR minimum for four-wheelers
-    }
-    min_fare = min_fares.get(vehicle.vehicle_type, Decimal('120.00'))
+    # Minimum fares
+    min_fare = rules.minimum_fare(vehicle.vehicle_type)
     base_fare = max(base_fare, min_fare)
     
-    # 9. Bulk booking discounts (Pakistan market)
-    bulk_discounts = {
-        1: Decimal('0.0'),    # No discount for single seat
-        2: Decimal('0.05'),   # 5% discount for 2 seats
-        3: Decimal('0.08'),   # 8% discount for 3 seats
-        4: Decimal('0.12'),   # 12% discount for 4 seats
-        5: Decimal('0.15'),   # 15% discount for 5 seats
-    }
-    discount = bulk_discounts.get(total_seats, Decimal('0.18'))  # 18% for 6+ seats
+    # Bulk booking discounts
+    discount = rules.bulk_discount(total_seats)
     
-    final_fare = base_fare * (Decimal('1.0') - discount)
+    final_fare = base_fare.apply(discount.complement())
     
-    # 10. Fuel cost calculation for transparency
-    fuel_efficiency = {
-        'Petrol': Decimal('12.0'),   # 12 km/liter average
-        'Diesel': Decimal('15.0'),   # 15 km/liter average
-        'CNG': Decimal('18.0'),      # 18 km/kg average
-        'Electric': Decimal('8.0'),  # 8 km/kWh average
-        'Hybrid': Decimal('14.0'),   # 14 km/liter average
-    }
-    
-    efficiency = fuel_efficiency.get(fuel_type, Decimal('12.0'))
-    fuel_consumed = Decimal(str(total_distance)) / efficiency
-    
-    fuel_costs = {
-        'Petrol': Decimal('275.0'),   # PKR/liter
-        'Diesel': Decimal('285.0'),   # PKR/liter
-        'CNG': Decimal('230.0'),      # PKR/kg
-        'Electric': Decimal('25.0'),  # PKR/kWh
-        'Hybrid': Decimal('275.0'),   # PKR/liter (petrol component)
-    }
-    
-    fuel_cost = fuel_consumed * fuel_costs.get(fuel_type, Decimal('275.0'))
+    # Fuel cost calculation for transparency: distance / (km per unit) x price per unit
+    efficiency = rules.fuel_efficiency_for(fuel_type)
+    fuel_consumed = distance_m / METRES_PER_KM / float(efficiency)
+    fuel_cost = rules.fuel_cost_for(fuel_type).apply(
+        numerator=distance_m * RATE_SCALE,
+        denominator=METRES_PER_KM * efficiency.ppm,
+    )
+    profit = final_fare - fuel_cost
     
     return {
-        'base_fare': float(final_fare),
+        'base_fare': final_fare.rupees,
         'calculation_breakdown': {
             'total_distance_km': float(total_distance),
-            'base_rate_per_km': float(base_rate_per_km),
+            'base_rate_per_km': base_rate_per_km.rupees,
             'vehicle_multiplier': float(vehicle_multiplier),
             'time_multiplier': float(time_multiplier),
             'seat_factor': float(seat_factor),
             'distance_factor': float(distance_factor),
-            'is_peak_hour': is_peak_hour(departure_time),
-            'bulk_discount': float(discount * 100),  # Percentage
-            'min_fare_applied': float(final_fare) < float(base_fare),
+            'is_peak_hour': peak,
+            'bulk_discount': discount.percent(),  # Percentage
+            'min_fare_applied': final_fare < base_fare,
             'fuel_type': fuel_type,
-            'fuel_consumed': float(fuel_consumed),
-            'fuel_cost': float(fuel_cost),
+            'fuel_consumed': fuel_consumed,
+            'fuel_cost': fuel_cost.rupees,
             'fuel_efficiency_km_per_unit': float(efficiency),
-            'profit_margin': float(final_fare - fuel_cost),
-            'profit_percentage': float(((final_fare - fuel_cost) / final_fare) * 100) if final_fare > 0 else 0,
-            'calculation_formula': f"Base Rate ({base_rate_per_km} PKR/km) × Distance ({total_distance:.1f}km) × Vehicle ({vehicle_multiplier}) × Time ({time_multiplier}) × Seats ({seat_factor}) × Distance Factor ({distance_factor}) × Discount ({1-discount})"
+            'profit_margin': profit.rupees,
+            'profit_percentage': profit.paisa * 100 / final_fare.paisa if final_fare.paisa > 0 else 0,
+            'pricing_rule_version': rules.version,
+            'calculation_formula': f"Base Rate ({base_rate_per_km} PKR/km) × Distance ({total_distance:.1f}km) × Vehicle ({vehicle_multiplier}) × Time ({time_multiplier}) × Seats ({seat_factor}) × Distance Factor ({distance_factor}) × Discount ({discount.complement()})"
         }
     }
 
@@ -199,6 +149,11 @@ def calculate_fare(request):
             # Parse time
             dep_hour, dep_minute = map(int, departure_time_str.split(':'))
             departure_time = time(dep_hour, dep_minute)
+            # With a trip date, weekend and holiday peak windows apply
+            if data.get('trip_date'):
+                departure_time = datetime.combine(
+                    datetime.strptime(data['trip_date'], '%Y-%m-%d').date(), departure_time
+                )
             
             # Get route and vehicle
             route = Route.objects.get(route_id=route_id)
@@ -223,6 +178,105 @@ def calculate_fare(request):
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
 @csrf_exempt
+def quote_fares_batch(request):
+    """
+    Quote fares for many stop pairs and seat counts in one call
+    
+    Body: {"trip_id": "...", "number_of_seats": 1} for every priced stop pair of
+    a trip, and/or {"quotes": [{"trip_id" or "route_id", "from_stop_order",
+    "to_stop_order", "number_of_seats"}, ...]}.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+            if not isinstance(data, dict):
+                return JsonResponse({'success': False, 'error': 'Request body must be a JSON object'}, status=400)
+            items = data.get('quotes') or []
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'quotes must be a list of objects with from_stop_order, to_stop_order and number_of_seats'
+                }, status=400)
+            all_pairs_trip = data.get('trip_id')
+
+            # Resolve trip and route codes to route keys with one query each
+            trip_codes = {item.get('trip_id') for item in items if item.get('trip_id')}
+            if all_pairs_trip:
+                trip_codes.add(all_pairs_trip)
+            route_codes = {item.get('route_id') for item in items if item.get('route_id') and not item.get('trip_id')}
+            trip_rows = Trip.objects.filter(trip_id__in=trip_codes).values_list('trip_id', 'route_id', 'total_seats') if trip_codes else []
+            trip_routes = {code: route_pk for code, route_pk, _ in trip_rows}
+            trip_seats = {code: total_seats for code, _, total_seats in trip_rows}
+            route_keys = dict(Route.objects.filter(route_id__in=route_codes).values_list('route_id', 'id')) if route_codes else {}
+            
+            if all_pairs_trip:
+                if all_pairs_trip not in trip_routes:
+                    return JsonResponse({'success': False, 'error': 'Trip not found'}, status=404)
+                try:
+                    seats = int(data.get('number_of_seats', 1))
+                except (TypeError, ValueError):
+                    return JsonResponse({'success': False, 'error': 'number_of_seats must be an integer'}, status=400)
+                if not 1 <= seats <= trip_seats[all_pairs_trip]:
+                    return JsonResponse({
+                        'success': False,
+                        'error': f'number_of_seats must be between 1 and {trip_seats[all_pairs_trip]}'
+                    }, status=400)
+                for from_order, to_order in get_fare_matrix_for_route(trip_routes[all_pairs_trip]):
+                    items.append({
+                        'trip_id': all_pairs_trip,
+                        'from_stop_order': from_order,
+                        'to_stop_order': to_order,
+                        'number_of_seats': seats,
+                    })
+            
+            if not items:
+                return JsonResponse({'success': False, 'error': 'Provide trip_id or a non-empty quotes list'}, status=400)
+            if len(items) > MAX_FARE_QUOTES:
+                return JsonResponse({'success': False, 'error': f'At most {MAX_FARE_QUOTES} quotes per request'}, status=400)
+            
+            requests_by_route = []
+            for item in items:
+                if item.get('trip_id'):
+                    route_pk = trip_routes.get(item['trip_id'])
+                else:
+                    route_pk = route_keys.get(item.get('route_id'))
+                requests_by_route.append({
+                    'route_id': route_pk,
+                    'from_stop_order': item.get('from_stop_order'),
+                    'to_stop_order': item.get('to_stop_order'),
+                    'number_of_seats': item.get('number_of_seats', 1),
+                })
+            
+            known = [req for req in requests_by_route if req['route_id'] is not None]
+            quoted = iter(quote_fares(known, booking_time=timezone.now()))
+            
+            results = []
+            for item, req in zip(items, requests_by_route):
+                result = next(quoted) if req['route_id'] is not None else dict(req, error='Trip or route not found')
+                result = dict(result)
+                # Echo the caller's identifiers rather than internal keys
+                result.pop('route_id', None)
+                if item.get('trip_id'):
+                    result['trip_id'] = item['trip_id']
+                    total_seats = trip_seats.get(item['trip_id'])
+                    if 'error' not in result and total_seats is not None and result['number_of_seats'] > total_seats:
+                        result = {key: result[key] for key in ('trip_id', 'from_stop_order', 'to_stop_order', 'number_of_seats')}
+                        result['error'] = f'Trip has only {total_seats} seats'
+                else:
+                    result['route_id'] = item.get('route_id')
+                results.append(result)
+            
+            return JsonResponse({'success': True, 'quotes': results})
+        
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Invalid request method'}, status=400)
+
+@csrf_exempt
+@idempotent
 def create_trip(request):
     """Create a new trip with enhanced fare calculation"""
     if request.method == 'POST':
@@ -305,7 +359,7 @@ def create_trip(request):
                 print(f"Using custom price from frontend: {custom_price}")
                 # Use custom price but still calculate for reference
                 try:
-                    fare_data = calculate_pakistan_fare(route, vehicle, departure_datetime, total_seats)
+                    fare_data = calculate_pakistan_fare(route, vehicle, datetime.combine(trip_date, departure_datetime), total_seats)
                     # Override the calculated fare with custom price
                     fare_data['base_fare'] = float(custom_price)
                     print(f"Custom fare applied: {custom_price}")
@@ -320,7 +374,7 @@ def create_trip(request):
             else:
                 print("=== CALCULATING FARE ===")
                 try:
-                    fare_data = calculate_pakistan_fare(route, vehicle, departure_datetime, total_seats)
+                    fare_data = calculate_pakistan_fare(route, vehicle, datetime.combine(trip_date, departure_datetime), total_seats)
                     print(f"Fare calculation completed: {fare_data}")
                 except Exception as e:
                     print(f"Error calculating fare: {e}")
@@ -363,7 +417,6 @@ def create_trip(request):
                 
                 print("Creating trip object...")
                 trip = Trip.objects.create(
-                    trip_id=f"T{random.randint(100, 999)}-{datetime.now().strftime('%Y-%m-%d-%H:%M')}",
                     route=route,
                     vehicle=vehicle,
                     driver=driver,
@@ -493,6 +546,7 @@ def create_trip(request):
     }, status=405)
 
 @csrf_exempt
+@idempotent
 def handle_ride_booking_request(request, trip_id):
     """Handle ride booking requests with bargaining functionality"""
     if request.method == 'POST':
@@ -539,11 +593,19 @@ def handle_ride_booking_request(request, trip_id):
                     'error': 'Invalid stop selection'
                 }, status=400)
             
-            # Check if enough seats are available
-            if trip.available_seats < number_of_seats:
+            if from_stop.stop_order >= to_stop.stop_order:
                 return JsonResponse({
                     'success': False,
-                    'error': f'Only {trip.available_seats} seats available'
+                    'error': 'Pickup stop must come before drop-off stop'
+                }, status=400)
+            
+            # Check if enough seats are free on every leg of the requested segment
+            free_seats = segment_free_seats(trip, from_stop.stop_order, to_stop.stop_order)
+            if free_seats < number_of_seats:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Only {free_seats} seats available',
+                    'can_join_waitlist': True
                 }, status=400)
             
             # Check gender preference
@@ -558,7 +620,7 @@ def handle_ride_booking_request(request, trip_id):
                 from .utils.fare_calculator import get_fare_matrix_for_route, calculate_booking_fare
                 
                 # Get fare matrix for the route
-                fare_matrix = get_fare_matrix_for_route(trip.route.id)
+                fare_matrix = get_fare_matrix_for_route(trip.route_id)
                 
                 # Calculate fare for the selected stops
                 fare_breakdown = calculate_booking_fare(
@@ -585,50 +647,54 @@ def handle_ride_booking_request(request, trip_id):
                 original_fare = calculated_fare
                 final_fare = calculated_fare
             
-            # Create booking with bargaining information
-            booking = Booking.objects.create(
-                booking_id=f"B{random.randint(100, 999)}-{datetime.now().strftime('%Y-%m-%d-%H:%M')}-{passenger_id}",
-                trip=trip,
-                passenger=passenger,
-                from_stop=from_stop,
-                to_stop=to_stop,
-                number_of_seats=number_of_seats,
-                total_fare=final_fare,
-                original_fare=original_fare,
-                passenger_offer=proposed_fare,
-                booking_status='PENDING',  # Explicitly set to PENDING for driver approval
-                bargaining_status='PENDING' if is_negotiated else 'NO_NEGOTIATION',
-                negotiation_notes=special_requests,
-            )
-            
-            # Note: Available seats will be reduced when driver confirms the booking
-            # trip.available_seats -= number_of_seats  # Removed - only deduct when confirmed
-            # trip.save()  # Removed - no need to save trip here
-            
-            # Add to bargaining history if negotiated
-            if is_negotiated:
-                bargaining_entry = {
-                    'timestamp': datetime.now().isoformat(),
-                    'passenger_id': passenger_id,
-                    'passenger_name': passenger.name,
-                    'original_fare': float(original_fare),
-                    'proposed_fare': float(proposed_fare),
-                    'status': 'PENDING'
-                }
+            # Create booking with bargaining information; its seats are held until the driver responds
+            with transaction.atomic():
+                booking = Booking.objects.create(
+                    trip=trip,
+                    passenger=passenger,
+                    from_stop=from_stop,
+                    to_stop=to_stop,
+                    number_of_seats=number_of_seats,
+                    total_fare=final_fare,
+                    original_fare=original_fare,
+                    passenger_offer=proposed_fare,
+                    booking_status='PENDING',  # Explicitly set to PENDING for driver approval
+                    bargaining_status='PENDING' if is_negotiated else 'NO_NEGOTIATION',
+                    negotiation_notes=special_requests,
+                )
+                hold = place_hold(booking)
                 
-                if not trip.bargaining_history:
-                    trip.bargaining_history = []
-                trip.bargaining_history.append(bargaining_entry)
-                trip.save()
+                # Record the offer with a single insert; the Trip row is not touched
+                if is_negotiated:
+                    NegotiationEvent.objects.create(
+                        trip=trip,
+                        booking=booking,
+                        actor=passenger,
+                        actor_name=passenger.name,
+                        event_type='OFFER',
+                        original_fare=original_fare,
+                        proposed_fare=proposed_fare,
+                        status='PENDING',
+                        note=special_requests or None,
+                    )
             
             return JsonResponse({
                 'success': True, 
                 'message': 'Ride booking request submitted successfully',
                 'booking_id': booking.booking_id,
                 'bargaining_status': booking.bargaining_status,
-                'total_fare': float(booking.total_fare)
+                'total_fare': float(booking.total_fare),
+                'hold_expires_at': hold.expires_at.isoformat()
             }, status=201)
             
+        except SeatReservationError as e:
+            # Another request held or booked the seats after the availability check
+            return JsonResponse({
+                'success': False,
+                'error': e.message,
+                'available_seats': e.available,
+                'can_join_waitlist': True
+            }, status=409)
         except json.JSONDecodeError:
             return JsonResponse({
                 'success': False,
@@ -645,23 +711,275 @@ def handle_ride_booking_request(request, trip_id):
         'error': 'Only POST method allowed'
     }, status=405)
 
+@csrf_exempt
+@idempotent
+def respond_booking_requests(request, trip_id):
+    """Approve or reject several pending booking requests of a trip at once"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            driver_id = data.get('driver_id')
+            decisions = data.get('decisions')
+            
+            if not isinstance(decisions, list) or not decisions:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'decisions must be a non-empty list of {booking_id, decision}'
+                }, status=400)
+            if len(decisions) > MAX_BOOKING_DECISIONS:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'At most {MAX_BOOKING_DECISIONS} decisions per request'
+                }, status=400)
+            if not all(isinstance(item, dict) for item in decisions):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Each decision must be an object with booking_id and decision'
+                }, status=400)
+            
+            try:
+                trip = Trip.objects.get(trip_id=trip_id)
+            except Trip.DoesNotExist:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Trip not found'
+                }, status=404)
+            
+            if str(trip.driver_id) != str(driver_id):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Only the driver of this trip can respond to its booking requests'
+                }, status=403)
+            
+            results = respond_to_booking_requests(trip, decisions)
+            
+            return JsonResponse({
+                'success': True,
+                'results': results,
+                'confirmed_count': sum(1 for result in results if result['status'] == 'confirmed'),
+                'rejected_count': sum(1 for result in results if result['status'] == 'rejected'),
+                'available_seats': trip.available_seats
+            })
+            
+        except json.JSONDecodeError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid JSON data'
+            }, status=400)
+        except SeatReservationError as e:
+            # Seats changed too quickly to apply the batch; nothing was written
+            return JsonResponse({
+                'success': False,
+                'error': e.message
+            }, status=409)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Failed to respond to booking requests: {str(e)}'
+            }, status=500)
+    
+    return JsonResponse({
+        'success': False,
+        'error': 'Only POST method is allowed'
+    }, status=405)
+
+@csrf_exempt
+def get_negotiation_history(request, trip_id):
+    """Fare negotiation events of a trip, newest first, one page at a time"""
+    if request.method == 'GET':
+        try:
+            trip = Trip.objects.only('id').get(trip_id=trip_id)
+        except Trip.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Trip not found'}, status=404)
+        
+        events = NegotiationEvent.objects.filter(trip=trip).select_related('booking')
+        booking_id = request.GET.get('booking_id')
+        if booking_id:
+            events = events.filter(booking__booking_id=booking_id)
+        
+        try:
+            # Served by the (trip, created_at) and (trip, booking, created_at) indexes
+            rows, next_cursor = paginate_keyset(
+                events,
+                ['-created_at', '-pk'],
+                cursor=request.GET.get('cursor'),
+                limit=request.GET.get('limit'),
+            )
+        except PaginationError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        
+        history = [{
+            'id': event.pk,
+            'booking_id': event.booking.booking_id if event.booking else None,
+            'actor_id': event.actor_id,
+            'actor_name': event.actor_name,
+            'event_type': event.event_type,
+            'original_fare': float(event.original_fare) if event.original_fare is not None else None,
+            'proposed_fare': float(event.proposed_fare) if event.proposed_fare is not None else None,
+            'status': event.status,
+            'note': event.note,
+            'created_at': event.created_at.isoformat(),
+        } for event in rows]
+        
+        return JsonResponse({'success': True, 'events': history, 'next_cursor': next_cursor})
+    
+    return JsonResponse({'error': 'Invalid request method'}, status=400)
+
+def _waitlist_entry_data(entry):
+    return {
+        'waitlist_id': entry.pk,
+        'status': entry.status,
+        'position': waitlist_position(entry),
+        'number_of_seats': entry.number_of_seats,
+        'from_stop_order': entry.from_stop.stop_order,
+        'to_stop_order': entry.to_stop.stop_order,
+        'total_fare': float(entry.total_fare),
+        'booking_id': entry.booking.booking_id if entry.booking else None,
+        'joined_at': entry.created_at.isoformat(),
+        'promoted_at': entry.promoted_at.isoformat() if entry.promoted_at else None,
+    }
+
+@csrf_exempt
+@idempotent
+def trip_waitlist(request, trip_id):
+    """Join a trip's waitlist (POST) or look up a passenger's place on it (GET ?passenger_id=)"""
+    try:
+        trip = Trip.objects.get(trip_id=trip_id)
+    except Trip.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Trip not found'}, status=404)
+    
+    if request.method == 'GET':
+        try:
+            passenger_id = int(request.GET.get('passenger_id', ''))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'passenger_id must be an integer'}, status=400)
+        entry = WaitlistEntry.objects.filter(
+            trip=trip, passenger_id=passenger_id
+        ).select_related('from_stop', 'to_stop', 'booking').order_by('-created_at', '-pk').first()
+        if entry is None:
+            return JsonResponse({'success': False, 'error': 'Passenger is not on the waitlist'}, status=404)
+        return JsonResponse({'success': True, 'waitlist': _waitlist_entry_data(entry)})
+    
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            number_of_seats = int(data.get('number_of_seats', 1))
+            if number_of_seats < 1 or number_of_seats > trip.total_seats:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'number_of_seats must be between 1 and {trip.total_seats}'
+                }, status=400)
+            
+            if trip.trip_status != 'SCHEDULED':
+                return JsonResponse({'success': False, 'error': 'Only scheduled trips have a waitlist'}, status=400)
+            
+            try:
+                passenger = UsersData.objects.get(id=data.get('passenger_id'))
+            except UsersData.DoesNotExist:
+                return JsonResponse({'success': False, 'error': 'Passenger not found'}, status=404)
+            
+            try:
+                from_stop = RouteStop.objects.get(route=trip.route, stop_order=data.get('from_stop_order'))
+                to_stop = RouteStop.objects.get(route=trip.route, stop_order=data.get('to_stop_order'))
+            except RouteStop.DoesNotExist:
+                return JsonResponse({'success': False, 'error': 'Invalid stop selection'}, status=400)
+            
+            if from_stop.stop_order >= to_stop.stop_order:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Pickup stop must come before drop-off stop'
+                }, status=400)
+            
+            if trip.gender_preference != 'Any' and passenger.gender != trip.gender_preference:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'This trip is for {trip.gender_preference} passengers only'
+                }, status=400)
+            
+            # Quote the fare now; a promoted entry is offered at this price
+            try:
+                fare_breakdown = calculate_booking_fare(
+                    from_stop_order=from_stop.stop_order,
+                    to_stop_order=to_stop.stop_order,
+                    number_of_seats=number_of_seats,
+                    fare_matrix=get_fare_matrix_for_route(trip.route_id),
+                    booking_time=timezone.now()
+                )
+                total_fare = fare_breakdown['total_fare']
+            except Exception as e:
+                print(f"Error calculating fare: {e}")
+                total_fare = float(trip.base_fare) * number_of_seats
+            
+            try:
+                entry = join_waitlist(trip, passenger, from_stop, to_stop, number_of_seats, total_fare)
+            except IntegrityError:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Passenger is already on the waitlist for this trip'
+                }, status=409)
+            
+            return JsonResponse({
+                'success': True,
+                'message': ('Seats were free; your booking request was submitted' if entry.status == 'PROMOTED'
+                            else 'Added to the waitlist'),
+                'waitlist': _waitlist_entry_data(entry)
+            }, status=201)
+        
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'number_of_seats must be an integer'}, status=400)
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': f'Failed to join waitlist: {str(e)}'}, status=500)
+    
+    return JsonResponse({'error': 'Invalid request method'}, status=400)
+
+@csrf_exempt
+@idempotent
+def leave_trip_waitlist(request, trip_id):
+    """Take a passenger off a trip's waitlist"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+        try:
+            passenger_id = int(data.get('passenger_id'))
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'passenger_id must be an integer'}, status=400)
+        
+        entry = WaitlistEntry.objects.filter(
+            trip__trip_id=trip_id, passenger_id=passenger_id, status='WAITING'
+        ).first()
+        if entry is None or not leave_waitlist(entry):
+            return JsonResponse({'success': False, 'error': 'Passenger is not on the waitlist'}, status=404)
+        return JsonResponse({'success': True, 'message': 'Left the waitlist'})
+    
+    return JsonResponse({'error': 'Invalid request method'}, status=400)
+
 @csrf_exempt
 def all_trips(request):
     if request.method == 'GET':
-        trips = Trip.objects.filter(trip_status='SCHEDULED')
+        try:
+            # Names come from the search row; breakdowns for the whole page arrive in one ordered query
+            rows, next_cursor = paginate_keyset(
+                TripSearchIndex.objects.filter(trip_status='SCHEDULED').select_related('trip').prefetch_related(
+                    Prefetch('trip__stop_breakdowns', queryset=TripStopBreakdown.objects.order_by('from_stop_order'),
+                             to_attr='ordered_breakdowns')
+                ),
+                TRIP_PAGE_ORDERING,
+                cursor=request.GET.get('cursor'),
+                limit=request.GET.get('limit'),
+            )
+        except PaginationError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         trip_list = []
-        for trip in trips:
-            # Get route details
-            route = trip.route
-            # Get driver details
-            driver = trip.driver
-            # Get vehicle details
-            vehicle = trip.vehicle
+        for row in rows:
+            trip = row.trip
             
             # Get stop breakdown data
-            stop_breakdowns = trip.stop_breakdowns.all().order_by('from_stop_order')
             breakdown_list = []
-            for breakdown in stop_breakdowns:
+            for breakdown in trip.ordered_breakdowns:
                 breakdown_list.append({
                     'from_stop_order': breakdown.from_stop_order,
                     'to_stop_order': breakdown.to_stop_order,
@@ -684,10 +1002,10 @@ def all_trips(request):
             trip_list.append({
                 'trip_id': trip.trip_id,
                 'departure_time': f"{trip.trip_date}T{trip.departure_time}",
-                'origin': route.first_stop.stop_name if route.first_stop else route.route_name,
-                'destination': route.last_stop.stop_name if route.last_stop else route.route_name,
-                'driver_name': driver.name,
-                'vehicle_model': f"{vehicle.company_name} {vehicle.model_number}" if vehicle else 'Unknown Vehicle',
+                'origin': row.origin_name,
+                'destination': row.destination_name,
+                'driver_name': row.driver_name,
+                'vehicle_model': row.vehicle_model,
                 'available_seats': trip.available_seats,
                 'price_per_seat': float(trip.base_fare),
                 'gender_preference': trip.gender_preference,  # Use the dedicated field
@@ -701,10 +1019,11 @@ def all_trips(request):
                 'fare_calculation': trip.fare_calculation,
                 'stop_breakdown': breakdown_list,
             })
-        return JsonResponse({'success': True, 'trips': trip_list})
+        return JsonResponse({'success': True, 'trips': trip_list, 'next_cursor': next_cursor})
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
 @csrf_exempt
+@idempotent
 def create_route(request):
     if request.method == 'POST':
         try:
@@ -724,13 +1043,8 @@ def create_route(request):
             destination_name = location_names[-1] if len(location_names) > 1 else "Destination"
             route_name = f"{origin_name} to {destination_name}"
             
-            # Generate unique route ID
-            import uuid
-            route_id = f"R{str(uuid.uuid4())[:8].upper()}"
-            
-            # Create the route
+            # Create the route (route_id defaults to a time-sortable generated ID)
             route = Route.objects.create(
-                route_id=route_id,
                 route_name=route_name,
                 route_description=f"Route from {origin_name} to {destination_name}",
                 is_active=True
@@ -750,21 +1064,18 @@ def create_route(request):
                 )
             
             # Calculate total distance (simplified - sum of distances between consecutive points)
-            total_distance = 0
-            for i in range(len(coordinates) - 1):
-                from_coord = coordinates[i]
-                to_coord = coordinates[i + 1]
-                distance = _calculate_distance(
-                    from_coord.get('lat'), from_coord.get('lng'),
-                    to_coord.get('lat'), to_coord.get('lng')
-                )
-                total_distance += distance
+            total_distance = path_length_km((coord.get('lat'), coord.get('lng')) for coord in coordinates)
             
             # Update route with calculated distance
             route.total_distance_km = round(total_distance, 2)
             route.estimated_duration_minutes = int(total_distance * 2)  # Rough estimate: 2 min per km
+            # Keep the road geometry for corridor search; fall back to straight lines between stops
+            route.set_polyline(route_points if len(route_points) >= 2 else coordinates)
             route.save()
             
+            # Price every stop pair so bookings use the fare matrix instead of the base fare fallback
+            generate_fare_matrix(route)
+            
             return JsonResponse({
                 'success': True,
                 'route': {
@@ -809,34 +1120,6 @@ def calculate_estimated_arrival(departure_time, route):
     
     return time(arrival_hour, arrival_minute)
 
-def _calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    print(f"  _calculate_distance called with: lat1={lat1}, lon1={lon1}, lat2={lat2}, lon2={lon2}")
-    
-    try:
-        from math import radians, cos, sin, asin, sqrt
-        
-        # Convert to radians
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        print(f"  Converted to radians: lat1={lat1}, lon1={lon1}, lat2={lat2}, lon2={lon2}")
-        
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        
-        # Radius of earth in kilometers
-        r = 6371
-        
-        distance = c * r
-        print(f"  Calculated distance: {distance} km")
-        return distance
-    except Exception as e:
-        print(f"  Error in _calculate_distance: {e}")
-        return 0
-
-
 @csrf_exempt
 def get_trip_breakdown(request, trip_id):
     """Get detailed breakdown for a specific trip"""
@@ -897,35 +1180,17 @@ def map_trip_status_to_frontend(trip_status):
     }
     return status_mapping.get(trip_status, 'unknown')
 
-def update_trip_status_automatically(trip):
-    """Automatically update trip status based on date/time"""
-    now = timezone.now()
-    trip_datetime = timezone.make_aware(
-        datetime.combine(trip.trip_date, trip.departure_time)
-    )
-    
-    # If trip is in the past and not completed/cancelled, mark as completed
-    if now > trip_datetime and trip.trip_status == 'SCHEDULED':
-        trip.trip_status = 'COMPLETED'
-        trip.completed_at = now
-        trip.save()
-    # If trip is currently happening (within 2 hours of departure), mark as in progress
-    elif (trip_datetime - timedelta(hours=2)) <= now <= (trip_datetime + timedelta(hours=8)) and trip.trip_status == 'SCHEDULED':
-        trip.trip_status = 'IN_PROGRESS'
-        trip.started_at = now
-        trip.save()
-    
-    return trip
-
 def can_edit_trip(trip):
     """Check if trip can be edited"""
     # Can't edit completed, in-progress, or cancelled trips
     if trip.trip_status in ['COMPLETED', 'IN_PROGRESS', 'CANCELLED']:
         return False
     
-    # Can't edit if there are confirmed bookings
-    confirmed_bookings = trip.trip_bookings.filter(booking_status='CONFIRMED')
-    if confirmed_bookings.exists():
+    # Can't edit if there are confirmed bookings (list views annotate the count)
+    confirmed_count = getattr(trip, 'confirmed_booking_count', None)
+    if confirmed_count is None:
+        confirmed_count = trip.trip_bookings.filter(booking_status='CONFIRMED').exists()
+    if confirmed_count:
         return False
     
     return True
@@ -936,8 +1201,11 @@ def can_delete_trip(trip):
     if trip.trip_status in ['COMPLETED', 'IN_PROGRESS', 'CANCELLED']:
         return False
     
-    # Can't delete if there are any bookings
-    if trip.trip_bookings.exists():
+    # Can't delete if there are any bookings (list views annotate the count)
+    booking_total = getattr(trip, 'booking_total', None)
+    if booking_total is None:
+        booking_total = trip.trip_bookings.exists()
+    if booking_total:
         return False
     
     return True
@@ -958,21 +1226,32 @@ def get_user_rides(request, user_id):
             # Verify user exists
             user = UsersData.objects.get(id=user_id)
             
-            # Get all trips created by this user
-            trips = Trip.objects.filter(driver=user).order_by('-created_at')
+            # Trips created by this user, newest first, one page at a time
+            # Related rows for the whole page are fetched up front: one query each for stops and breakdowns
+            trips, next_cursor = paginate_keyset(
+                Trip.objects.filter(driver=user).select_related('route', 'vehicle').prefetch_related(
+                    Prefetch('route__route_stops', queryset=RouteStop.objects.order_by('stop_order'),
+                             to_attr='ordered_stops'),
+                    Prefetch('stop_breakdowns', queryset=TripStopBreakdown.objects.order_by('from_stop_order'),
+                             to_attr='ordered_breakdowns'),
+                ).annotate(
+                    booking_total=Count('trip_bookings'),
+                    confirmed_booking_count=Count('trip_bookings', filter=Q(trip_bookings__booking_status='CONFIRMED')),
+                ),
+                ['-created_at', '-pk'],
+                cursor=request.GET.get('cursor'),
+                limit=request.GET.get('limit'),
+            )
             
             rides_list = []
             for trip in trips:
-                # Update status automatically
-                trip = update_trip_status_automatically(trip)
-                
                 # Get route details with stops
                 route = trip.route
-                route_stops = route.route_stops.all().order_by('stop_order')
+                route_stops = route.ordered_stops
                 route_names = [stop.stop_name for stop in route_stops]
                 
                 # Get booking count
-                booking_count = trip.trip_bookings.filter(booking_status='CONFIRMED').count()
+                booking_count = trip.confirmed_booking_count
                 
                 # Get vehicle details
                 vehicle_data = None
@@ -1001,7 +1280,7 @@ def get_user_rides(request, user_id):
                 
                 # Get stop breakdown for detailed pricing
                 stop_breakdown = []
-                for breakdown in trip.stop_breakdowns.all().order_by('from_stop_order'):
+                for breakdown in trip.ordered_breakdowns:
                     stop_breakdown.append({
                         'from_stop_name': breakdown.from_stop_name,
                         'to_stop_name': breakdown.to_stop_name,
@@ -1076,8 +1355,11 @@ def get_user_rides(request, user_id):
                 'success': True,
                 'rides': rides_list,
                 'total_rides': len(rides_list),
+                'next_cursor': next_cursor,
             })
             
+        except PaginationError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         except UsersData.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'User not found'}, status=404)
         except Exception as e:
@@ -1093,9 +1375,6 @@ def get_trip_details(request, trip_id):
         try:
             trip = Trip.objects.get(trip_id=trip_id)
             
-            # Update status automatically
-            trip = update_trip_status_automatically(trip)
-            
             # Get route details
             route = trip.route
             route_stops = route.route_stops.all().order_by('stop_order')
@@ -1200,6 +1479,7 @@ def get_trip_details(request, trip_id):
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
 @csrf_exempt
+@idempotent
 def update_trip(request, trip_id):
     """Update trip details"""
     if request.method == 'PUT':
@@ -1225,7 +1505,6 @@ def update_trip(request, trip_id):
             
             if 'total_seats' in data:
                 trip.total_seats = data['total_seats']
-                trip.available_seats = data['total_seats']  # Reset available seats
             
             if 'base_fare' in data:
                 trip.base_fare = Decimal(str(data['base_fare']))
@@ -1270,6 +1549,10 @@ def update_trip(request, trip_id):
             
             trip.save()
             
+            # Seat columns are only written through services.seats; the trip has no bookings here
+            if 'total_seats' in data:
+                reset_trip_seats(trip, trip.total_seats)
+            
             return JsonResponse({
                 'success': True,
                 'message': 'Trip updated successfully',
@@ -1284,6 +1567,7 @@ def update_trip(request, trip_id):
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
 @csrf_exempt
+@idempotent
 def delete_trip(request, trip_id):
     """Delete a trip"""
     if request.method == 'DELETE':
@@ -1313,6 +1597,7 @@ def delete_trip(request, trip_id):
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
 @csrf_exempt
+@idempotent
 def cancel_trip(request, trip_id):
     """Cancel a trip"""
     if request.method == 'POST':
@@ -1329,11 +1614,8 @@ def cancel_trip(request, trip_id):
                     'error': 'Trip cannot be cancelled. It may already be cancelled or completed.'
                 }, status=400)
             
-            # Cancel the trip
-            trip.trip_status = 'CANCELLED'
-            trip.cancellation_reason = reason
-            trip.cancelled_at = timezone.now()
-            trip.save()
+            # Cancel the trip; also releases its seat holds and closes its waitlist
+            trip.cancel_trip(reason)
             
             # Cancel all confirmed bookings
             confirmed_bookings = trip.trip_bookings.filter(booking_status='CONFIRMED')
@@ -1426,9 +1708,9 @@ def search_routes(request):
             
             # Apply filters
             if from_location:
-                routes = routes.filter(route_stops__stop_name__icontains=from_location)
+                routes = routes.filter(**stop_name_filter('route_stops__search_name', from_location))
             if to_location:
-                routes = routes.filter(route_stops__stop_name__icontains=to_location)
+                routes = routes.filter(**stop_name_filter('route_stops__search_name', to_location))
             
             routes_data = []
             for route in routes.distinct():
@@ -1446,28 +1728,115 @@ def search_routes(request):
     
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
+@csrf_exempt
+def nearby_stops(request):
+    """Get the nearest active stops around a coordinate"""
+    if request.method == 'GET':
+        try:
+            lat = request.GET.get('lat')
+            lng = request.GET.get('lng')
+            if lat is None or lng is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Missing required parameters: lat, lng'
+                }, status=400)
+
+            try:
+                latitude = float(lat)
+                longitude = float(lng)
+                radius_km = float(request.GET.get('radius', 2))
+                limit = int(request.GET.get('limit', 10))
+            except ValueError:
+                return JsonResponse({'success': False, 'error': 'Invalid numeric parameter'}, status=400)
+
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                return JsonResponse({'success': False, 'error': 'Coordinates out of range'}, status=400)
+            if radius_km <= 0 or radius_km > 50:
+                return JsonResponse({'success': False, 'error': 'Radius must be between 0 and 50 km'}, status=400)
+            limit = max(1, min(limit, 50))
+
+            stops = find_nearby_stops(latitude, longitude, radius_km, limit=limit)
+            stops_data = [
+                {
+                    'id': stop['id'],
+                    'route_id': stop['route__route_id'],
+                    'route_name': stop['route__route_name'],
+                    'stop_name': stop['stop_name'],
+                    'stop_order': stop['stop_order'],
+                    'latitude': float(stop['latitude']),
+                    'longitude': float(stop['longitude']),
+                    'address': stop['address'],
+                    'distance_km': round(stop['distance_km'], 3),
+                }
+                for stop in stops
+            ]
+
+            return JsonResponse({'success': True, 'stops': stops_data})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+    return JsonResponse({'error': 'Invalid request method'}, status=400)
+
+@csrf_exempt
+def autocomplete_stops(request):
+    """Suggest stop names matching what the user has typed so far"""
+    if request.method == 'GET':
+        try:
+            query = request.GET.get('q', '')
+            try:
+                limit = max(1, min(int(request.GET.get('limit', 10)), 50))
+            except ValueError:
+                return JsonResponse({'success': False, 'error': 'Invalid limit'}, status=400)
+            
+            suggestions = stop_name_index.autocomplete(query, limit=limit) if query.strip() else []
+            return JsonResponse({'success': True, 'suggestions': suggestions})
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Invalid request method'}, status=400)
+
 @csrf_exempt
 def get_available_seats(request, trip_id):
     """Get available seats for a trip"""
     if request.method == 'GET':
         try:
-            trip = Trip.objects.get(id=trip_id)
-            booked_seats = []
-            
-            # Get booked seats
-            for booking in trip.trip_bookings.filter(booking_status='CONFIRMED'):
-                booked_seats.extend(booking.seat_numbers)
-            
-            # Generate available seats
-            all_seats = list(range(1, trip.total_seats + 1))
-            available_seats = [seat for seat in all_seats if seat not in booked_seats]
-            
-            return JsonResponse({
+            trip = Trip.objects.only('id', 'route_id', 'total_seats', 'seat_map').get(id=trip_id)
+            # Seats of expired holds show as free; releasing them is left to the
+            # booking paths and the release_seat_holds command
+            masks = load_seat_map(trip)
+            expired = expired_hold_masks(trip, len(masks))
+            masks = [mask & ~held for mask, held in zip(masks, expired)]
+            
+            # A seat is available if it is free on every leg, booked if it is taken on any
+            booked_mask = taken_mask(masks, 1, len(masks) + 1)
+            booked_seats = mask_seats(booked_mask)
+            available_seats = mask_seats(all_seats_mask(trip.total_seats) & ~booked_mask)
+            
+            response = {
                 'success': True,
                 'available_seats': available_seats,
                 'total_seats': trip.total_seats,
                 'booked_seats': booked_seats,
-            })
+            }
+            
+            # Optional segment query: seats free on every leg between two stops
+            from_stop_order = request.GET.get('from_stop_order')
+            to_stop_order = request.GET.get('to_stop_order')
+            if from_stop_order or to_stop_order:
+                try:
+                    from_stop_order = int(from_stop_order)
+                    to_stop_order = int(to_stop_order)
+                except (TypeError, ValueError):
+                    return JsonResponse({'success': False, 'error': 'from_stop_order and to_stop_order must be integers'}, status=400)
+                if from_stop_order < 1 or from_stop_order >= to_stop_order:
+                    return JsonResponse({'success': False, 'error': 'Pickup stop must come before drop-off stop'}, status=400)
+                if to_stop_order > len(masks) + 1:
+                    return JsonResponse({'success': False, 'error': 'Drop-off stop is not on this route'}, status=400)
+                free_mask = all_seats_mask(trip.total_seats) & ~taken_mask(masks, from_stop_order, to_stop_order)
+                response['segment_available_seats'] = mask_seats(free_mask)
+                response['segment_free_seats'] = len(response['segment_available_seats'])
+            
+            return JsonResponse(response)
         except Trip.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Trip not found'}, status=404)
         except Exception as e:
@@ -1476,6 +1845,7 @@ def get_available_seats(request, trip_id):
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
 @csrf_exempt
+@idempotent
 def create_booking(request):
     """Create a booking"""
     if request.method == 'POST':
@@ -1484,7 +1854,7 @@ def create_booking(request):
             
             # This is a placeholder - implement actual booking logic
             booking_data = {
-                'booking_id': f"B{random.randint(100, 999)}-{datetime.now().strftime('%Y-%m-%d-%H%M')}",
+                'booking_id': new_booking_id(),
                 'success': True,
                 'message': 'Booking created successfully',
             }
@@ -1516,12 +1886,18 @@ def get_user_bookings(request, user_id):
                 'to_stop'
             ).prefetch_related(
                 'trip__route__route_stops'
-            ).order_by('-booked_at')
+            )
+            bookings_page, next_cursor = paginate_keyset(
+                bookings_queryset,
+                ['-booked_at', 'pk'],
+                cursor=request.GET.get('cursor'),
+                limit=request.GET.get('limit'),
+            )
             
-            print(f"DEBUG: Found {bookings_queryset.count()} bookings in database")
+            print(f"DEBUG: Found {len(bookings_page)} bookings on this page")
             
             bookings = []
-            for booking in bookings_queryset:
+            for booking in bookings_page:
                 try:
                     print(f"DEBUG: Processing booking {booking.booking_id}")
                     
@@ -1650,8 +2026,10 @@ def get_user_bookings(request, user_id):
                     continue
             
             print(f"DEBUG: Returning {len(bookings)} bookings to frontend")
-            return JsonResponse({'success': True, 'bookings': bookings})
+            return JsonResponse({'success': True, 'bookings': bookings, 'next_cursor': next_cursor})
             
+        except PaginationError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         except UsersData.DoesNotExist:
             print(f"DEBUG: User with id {user_id} not found")
             return JsonResponse({'success': False, 'error': 'User not found'}, status=404)
@@ -1665,7 +2043,7 @@ def get_user_bookings(request, user_id):
 
 @csrf_exempt
 def search_rides(request):
-    """Search rides"""
+    """Search rides by stop name or by origin/destination coordinates"""
     if request.method == 'GET':
         try:
             from_location = request.GET.get('from')
@@ -1674,43 +2052,108 @@ def search_rides(request):
             min_seats = request.GET.get('min_seats')
             max_price = request.GET.get('max_price')
             gender_preference = request.GET.get('gender_preference')
-            
-            trips = Trip.objects.filter(trip_status='SCHEDULED')
+            origin_lat = request.GET.get('origin_lat')
+            origin_lng = request.GET.get('origin_lng')
+            dest_lat = request.GET.get('dest_lat')
+            dest_lng = request.GET.get('dest_lng')
+            mode = request.GET.get('mode', 'stops')
+            if mode not in ('stops', 'corridor'):
+                return JsonResponse({'success': False, 'error': "mode must be 'stops' or 'corridor'"}, status=400)
+            
+            rows = TripSearchIndex.objects.filter(trip_status='SCHEDULED')
+            
+            # Coordinate search: stop (or road, in corridor mode) near origin, later one near destination
+            segment_matches = None
+            corridor_matches = None
+            coordinates = [origin_lat, origin_lng, dest_lat, dest_lng]
+            if any(coordinates):
+                if not all(coordinates):
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'origin_lat, origin_lng, dest_lat and dest_lng must be provided together'
+                    }, status=400)
+                try:
+                    origin = (float(origin_lat), float(origin_lng))
+                    destination = (float(dest_lat), float(dest_lng))
+                    radius_km = float(request.GET.get('radius', 2))
+                except ValueError:
+                    return JsonResponse({'success': False, 'error': 'Invalid coordinate parameters'}, status=400)
+                if radius_km <= 0 or radius_km > 50:
+                    return JsonResponse({'success': False, 'error': 'Radius must be between 0 and 50 km'}, status=400)
+                
+                if mode == 'corridor':
+                    corridor_matches = match_route_corridors(origin, destination, radius_km)
+                    rows = rows.filter(route_id__in=list(corridor_matches.keys()))
+                else:
+                    segment_matches = match_route_segments(origin, destination, radius_km)
+                    rows = rows.filter(route_id__in=list(segment_matches.keys()))
             
             # Apply filters
             if from_location:
-                trips = trips.filter(route__route_stops__stop_name__icontains=from_location)
+                rows = rows.filter(**stop_name_filter('route__route_stops__search_name', from_location))
             if to_location:
-                trips = trips.filter(route__route_stops__stop_name__icontains=to_location)
+                rows = rows.filter(**stop_name_filter('route__route_stops__search_name', to_location))
             if date:
-                trips = trips.filter(trip_date=date)
+                rows = rows.filter(trip_date=date)
             if min_seats:
-                trips = trips.filter(available_seats__gte=int(min_seats))
+                rows = rows.filter(available_seats__gte=int(min_seats))
             if max_price:
-                trips = trips.filter(base_fare__lte=Decimal(max_price))
+                rows = rows.filter(price_per_seat__lte=Decimal(max_price))
+            if from_location or to_location:
+                rows = rows.distinct()
+            
+            try:
+                rows, next_cursor = paginate_keyset(
+                    rows,
+                    TRIP_PAGE_ORDERING,
+                    cursor=request.GET.get('cursor'),
+                    limit=request.GET.get('limit'),
+                )
+            except PaginationError as e:
+                return JsonResponse({'success': False, 'error': str(e)}, status=400)
             
             rides_data = []
-            for trip in trips.distinct():
-                rides_data.append({
-                    'trip_id': trip.trip_id,
-                    'trip_date': trip.trip_date.isoformat(),
-                    'departure_time': trip.departure_time.strftime('%H:%M'),
-                    'origin': trip.route.first_stop.stop_name if trip.route.first_stop else trip.route.route_name,
-                    'destination': trip.route.last_stop.stop_name if trip.route.last_stop else trip.route.route_name,
-                    'driver_name': trip.driver.name,
-                    'vehicle_model': f"{trip.vehicle.company_name} {trip.vehicle.model_number}" if trip.vehicle else 'Unknown Vehicle',
-                    'available_seats': trip.available_seats,
-                    'price_per_seat': float(trip.base_fare),
-                    'total_seats': trip.total_seats,
-                })
+            for row in rows:
+                ride = {
+                    'trip_id': row.trip_code,
+                    'trip_date': row.trip_date.isoformat(),
+                    'departure_time': row.departure_time.strftime('%H:%M'),
+                    'origin': row.origin_name,
+                    'destination': row.destination_name,
+                    'driver_name': row.driver_name,
+                    'vehicle_model': row.vehicle_model,
+                    'available_seats': row.available_seats,
+                    'price_per_seat': float(row.price_per_seat),
+                    'total_seats': row.total_seats,
+                }
+                if segment_matches is not None:
+                    match = segment_matches[row.route_id]
+                    ride.update({
+                        'boarding_stop_order': match['boarding_stop']['stop_order'],
+                        'boarding_stop_name': match['boarding_stop']['stop_name'],
+                        'boarding_distance_km': round(match['boarding_stop']['distance_km'], 3),
+                        'alighting_stop_order': match['alighting_stop']['stop_order'],
+                        'alighting_stop_name': match['alighting_stop']['stop_name'],
+                        'alighting_distance_km': round(match['alighting_stop']['distance_km'], 3),
+                    })
+                if corridor_matches is not None:
+                    match = corridor_matches[row.route_id]
+                    ride.update({
+                        'pickup_distance_km': round(match['pickup_distance_km'], 3),
+                        'pickup_along_route_km': round(match['pickup_along_km'], 3),
+                        'dropoff_distance_km': round(match['dropoff_distance_km'], 3),
+                        'dropoff_along_route_km': round(match['dropoff_along_km'], 3),
+                    })
+                rides_data.append(ride)
             
-            return JsonResponse({'success': True, 'rides': rides_data})
+            return JsonResponse({'success': True, 'rides': rides_data, 'next_cursor': next_cursor})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
     
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
 @csrf_exempt
+@idempotent
 def cancel_ride(request, ride_id):
     """Cancel a ride"""
     if request.method == 'DELETE':